@@ -1,35 +1,36 @@
-import itertools
 import json
-import math
 from time import time
-from typing import Collection, List
+from typing import Collection, List, Optional, Tuple
 
-from compsoc.evaluate import get_rule_utility
+import numpy as np
 from compsoc.profile import Profile
-from tqdm import tqdm
+from scipy.optimize import linear_sum_assignment
+
+from evaluation.utility_evaluator import calc_candidate_position_utilities
+from utils.profile_arrays import get_profile_arrays
+
+SCORES_COMPARISON_TOLERANCE = 1e-9
 
 
 def brute_force_eval(pairs: Collection[dict], topn: int):
+    """
+    Finds the best `top` and `topn` orderings of the profile's candidates, like walking all of their permutations
+    (in `itertools.permutations` order, keeping the first best one) would. Since the utilities are sums of
+    per-position terms, only the `topn`-prefixes are searched, with branch and bound pruning.
+    """
     profile = _construct_profile(pairs)
+    candidates = list(profile.candidates)
+    profile_arrays = get_profile_arrays(profile)
+    candidate_indices = [profile_arrays.candidate_index(c) for c in candidates]
+    top_utilities, position_utilities = calc_candidate_position_utilities(profile_arrays, topn)
+    top_utilities, position_utilities = top_utilities[candidate_indices], position_utilities[candidate_indices]
+
+    best_top_candidate = int(np.argmax(top_utilities))
+    best_top_permutation = _complete_permutation(candidates, [best_top_candidate])
+    best_top_permutation_score = float(top_utilities[best_top_candidate])
 
-    all_permutations = itertools.permutations(profile.candidates)
-    best_top_permutation_score = -float('inf')
-    best_top_permutation = None
-    best_topn_permutation_score = -float('inf')
-    best_topn_permutation = None
-    for permutation in tqdm(all_permutations, total=math.factorial(len(profile.candidates))):
-        rule_func = _build_dummy_rule_for_ranking(ranking=permutation)
-        results = get_rule_utility(
-            profile=profile,
-            rule=rule_func,
-            topn=topn
-        )
-        if results['top'] > best_top_permutation_score:
-            best_top_permutation_score = results['top']
-            best_top_permutation = permutation
-        if results['topn'] > best_topn_permutation_score:
-            best_topn_permutation_score = results['topn']
-            best_topn_permutation = permutation
+    best_topn_prefix, best_topn_permutation_score = _search_best_prefix(position_utilities)
+    best_topn_permutation = _complete_permutation(candidates, best_topn_prefix)
 
     _store_and_print_results(
         best_top_permutation, best_top_permutation_score, best_topn_permutation, best_topn_permutation_score
@@ -45,6 +46,65 @@ def _construct_profile(pairs):
     return profile
 
 
+def _complete_permutation(candidates: List[int], prefix: List[int]) -> Tuple[int, ...]:
+    # the first permutation (in `itertools.permutations` order) that starts with the given prefix of indices
+    rest = [i for i in range(len(candidates)) if i not in prefix]
+    return tuple(candidates[i] for i in [*prefix, *rest])
+
+
+def _search_best_prefix(position_utilities: np.ndarray) -> Tuple[List[int], float]:
+    """
+    A depth-first branch and bound over the `topn`-prefixes, in lexicographic order. The best score is an assignment
+    of candidates to positions, and every child is bounded by its score plus the best assignment of the other unused
+    candidates to the rest of the positions - so the bounds are exact, and the search only walks into children that
+    reach the best score, backtracking only on rounding ties.
+    """
+    number_candidates, topn = position_utilities.shape
+    best_score = _calc_best_completion_score(position_utilities, np.ones(number_candidates, dtype=bool), 0)
+
+    def search(prefix: List[int], score: float) -> Optional[Tuple[List[int], float]]:
+        position = len(prefix)
+        if position == topn:
+            return (list(prefix), score) if not _is_worse_score(score, best_score) else None
+
+        unused_candidates = np.setdiff1d(np.arange(number_candidates), prefix)
+        children_scores = score + position_utilities[unused_candidates, position]
+        children_bounds = children_scores + _calc_children_bounds(position_utilities, unused_candidates, position)
+        for child_candidate, child_score, child_bound in zip(unused_candidates, children_scores, children_bounds):
+            if _is_worse_score(child_bound, best_score):
+                continue
+            result = search([*prefix, int(child_candidate)], float(child_score))
+            if result is not None:
+                return result
+        return None
+
+    return search([], 0.0)
+
+
+def _calc_children_bounds(position_utilities: np.ndarray, unused_candidates: np.ndarray, position: int) -> np.ndarray:
+    # for every unused candidate - the best score of the positions after `position` without it
+    is_unused = np.zeros(len(position_utilities), dtype=bool)
+    is_unused[unused_candidates] = True
+    bounds = np.empty(len(unused_candidates))
+    for i, candidate in enumerate(unused_candidates):
+        is_unused[candidate] = False
+        bounds[i] = _calc_best_completion_score(position_utilities, is_unused, position + 1)
+        is_unused[candidate] = True
+    return bounds
+
+
+def _calc_best_completion_score(position_utilities: np.ndarray, is_unused: np.ndarray, position: int) -> float:
+    rest_position_utilities = position_utilities[is_unused, position:]
+    if rest_position_utilities.size == 0:
+        return 0.0
+    candidates_indices, positions_indices = linear_sum_assignment(rest_position_utilities, maximize=True)
+    return float(rest_position_utilities[candidates_indices, positions_indices].sum())
+
+
+def _is_worse_score(score: float, other_score: float) -> bool:
+    return score < other_score - SCORES_COMPARISON_TOLERANCE * max(1.0, abs(other_score))
+
+
 def _store_and_print_results(
     best_top_permutation, best_top_permutation_score, best_topn_permutation, best_topn_permutation_score
 ):
@@ -60,14 +120,6 @@ def _store_and_print_results(
         f.write(best_permutations_details_json)
 
 
-def _build_dummy_rule_for_ranking(ranking: List[int]):
-    def dummy_rule(profile: Profile, candidate: int) -> int:
-        candidate_score = -(ranking.index(candidate) + 1)
-        return candidate_score
-
-    return dummy_rule
-
-
 if __name__ == '__main__':
     brute_force_eval(
         pairs=[
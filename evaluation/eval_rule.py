@@ -1,12 +1,11 @@
 from contextlib import contextmanager
-from typing import Callable, Optional, Literal, Any
+from typing import Callable, List, Optional
 
 import pandas as pd
-from compsoc.evaluate import get_rule_utility
 from compsoc.profile import Profile
-from compsoc.voter_model import generate_random_votes, generate_distorted_from_normal_profile, get_profile_from_model
 from tqdm import tqdm
 
+from evaluation.utility_evaluator import calc_rule_utility
 from rules.borda_veto_hybrid_rule import borda_veto_hybrid_rule
 from rules.random_rule import random_rule
 from rules.copeland_rule import copeland_rule
@@ -17,9 +16,14 @@ from rules.simpson_rule import simpson_rule
 from rules.stv_rule import stv_rule
 from rules.stv_rule_elishay import stv_rule_elishay
 from rules.veto_rule import veto_rule
-from utils.random_utils import set_global_random_seed
+from utils.random_utils import spawn_rng
+from utils.profile_store import ProfileKey, ProfileStore
+from utils.voter_models import (
+    DEFAULT_VOTER_MODELS_GENERATOR, VoterModelName, VoterModelsGenerator, generate_compsoc_profile_arrays,
+    generate_profiles_batch, to_profile
+)
 
-voter_model_names = Literal['random'] | Literal['gaussian'] | Literal['multinomial_dirichlet']
+voter_model_names = VoterModelName
 
 
 def eval_rule(
@@ -33,23 +37,29 @@ def eval_rule(
     random_seed: Optional[int] = None,
     print_results: bool = False,
     show_progress_bar: bool = False,
-    verbose: bool = False
+    verbose: bool = False,
+    voter_models_generator: VoterModelsGenerator = DEFAULT_VOTER_MODELS_GENERATOR
 ):
-    if random_seed is not None:
-        set_global_random_seed(random_seed)
-
+    dataset_setup = dict(
+        voters_model=voters_model,
+        number_voters=number_voters,
+        number_candidates=number_candidates,
+        distortion_ratio=distortion_ratio
+    )
     iterations_results = []
     pbar_base_message = "eval iterations progress"
+    profiles = generate_eval_profiles(
+        **dataset_setup, iterations_count=eval_iterations_count, random_seed=random_seed,
+        voter_models_generator=voter_models_generator
+    )
     with _open_progress_bar_if_needed(show_progress_bar, total=eval_iterations_count, desc=pbar_base_message) as pbar:
-        for i in range(eval_iterations_count):
-            profile = generate_eval_profile(
-                voters_model, number_voters, number_candidates, distortion_ratio
-            )
-            iteration_results = get_rule_utility(
+        for i, profile in enumerate(profiles):
+            iteration_results = calc_rule_utility(
                 profile=profile,
                 rule=rule_func,
                 topn=topn,
-                verbose=verbose
+                verbose=verbose,
+                rng=spawn_rng(random_seed, dataset_setup, i, rule_func.__name__) if random_seed is not None else None
             )
             iterations_results.append({'eval_iter_index': i, 'score': iteration_results['topn']})
             if pbar:
@@ -65,28 +75,59 @@ def eval_rule(
 
 
 def generate_eval_profile(
-    voters_model: voter_model_names, number_voters: int, number_candidates: int, distortion_ratio: float
+    voters_model: voter_model_names,
+    number_voters: int,
+    number_candidates: int,
+    distortion_ratio: float,
+    random_seed: Optional[int] = None,
+    voter_models_generator: VoterModelsGenerator = DEFAULT_VOTER_MODELS_GENERATOR
 ) -> Profile:
-    # multinomial_dirichlet has a bug that happens in some probability
-    allowed_retries_count = 2 if voters_model == 'multinomial_dirichlet' else 0
-    profile = _call_with_retries(
-        lambda: get_profile_from_model(number_candidates, number_voters, voters_model=voters_model, verbose=False),
-        allowed_retries_count
-    )
-
-    distorted_profile = generate_distorted_from_normal_profile(profile, distortion_ratio)
-    return distorted_profile
+    return generate_eval_profiles(
+        voters_model, number_voters, number_candidates, distortion_ratio, 1, random_seed=random_seed,
+        voter_models_generator=voter_models_generator
+    )[0]
 
 
-def _call_with_retries(func: Callable[[], Any], allowed_retries_count: int) -> Any:
-    executions_count = 0
-    while True:
-        executions_count += 1
-        try:
-            return func()
-        except:
-            if executions_count >= allowed_retries_count + 1:
-                raise
+def generate_eval_profiles(
+    voters_model: voter_model_names,
+    number_voters: int,
+    number_candidates: int,
+    distortion_ratio: float,
+    iterations_count: int,
+    random_seed: Optional[int] = None,
+    first_iteration: int = 0,
+    voter_models_generator: VoterModelsGenerator = DEFAULT_VOTER_MODELS_GENERATOR,
+    profile_store: Optional[ProfileStore] = None
+) -> List[Profile]:
+    # seeded profiles are reproducible (by their iteration), so they're served from (and added to) the on-disk
+    # profile store (the default one, unless `profile_store` is given)
+    if random_seed is None and voter_models_generator == 'native':
+        return generate_profiles_batch(voters_model, number_voters, number_candidates, distortion_ratio, iterations_count)
+    if random_seed is None:
+        return [
+            to_profile(
+                generate_compsoc_profile_arrays(voters_model, number_voters, number_candidates, distortion_ratio),
+                distorted=distortion_ratio > 0
+            )
+            for _ in range(iterations_count)
+        ]
+
+    profile_store = profile_store if profile_store is not None else ProfileStore()
+    return [
+        to_profile(
+            profile_store.load_or_generate(ProfileKey(
+                voters_model=voters_model,
+                number_voters=number_voters,
+                number_candidates=number_candidates,
+                distortion_ratio=distortion_ratio,
+                random_seed=random_seed,
+                iteration=iteration,
+                voter_models_generator=voter_models_generator
+            )),
+            distorted=distortion_ratio > 0
+        )
+        for iteration in range(first_iteration, first_iteration + iterations_count)
+    ]
 
 
 @contextmanager
@@ -0,0 +1,42 @@
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+from compsoc.profile import Profile
+from scipy.optimize import linear_sum_assignment
+
+from evaluation.rankings import Ranking
+from evaluation.utility_evaluator import calc_candidate_position_utilities
+from utils.profile_arrays import get_profile_arrays
+from utils.profile_cache import cached_per_profile
+
+ORACLE_RULE_NAME = 'oracle'
+
+
+def calc_oracle_ranking(profile: Profile, topn: int) -> Ranking:
+    """
+    The ranking of the candidates of a profile in the order with the best achievable "topn" utility. Since the
+    utility is a sum of per-position terms, that order is a maximum-weight assignment of candidates to the first
+    `topn` positions. The order depends on `topn`, so the oracle is a pseudo-rule that isn't called per candidate
+    like a real rule.
+    """
+    return calc_oracle_ranking_and_utility(profile, topn)[0]
+
+
+@cached_per_profile()
+def calc_oracle_ranking_and_utility(profile: Profile, topn: int) -> Tuple[Ranking, float]:
+    profile_arrays = get_profile_arrays(profile)
+    _, position_utilities = calc_candidate_position_utilities(profile_arrays, topn)
+    candidates_indices, positions_indices = linear_sum_assignment(position_utilities, maximize=True)
+
+    prefix_indices = candidates_indices[np.argsort(positions_indices)]
+    rest_indices = np.setdiff1d(np.arange(profile_arrays.number_candidates), prefix_indices)
+    ranking = tuple(int(c) for c in profile_arrays.candidates[np.concatenate([prefix_indices, rest_indices])])
+    oracle_utility = float(position_utilities[candidates_indices, positions_indices].sum())
+    return ranking, oracle_utility
+
+
+def calc_oracle_topn_utilities(profile: Profile, topns: Iterable[int]) -> Dict[int, float]:
+    return {
+        topn: calc_oracle_ranking_and_utility(profile, topn)[1]
+        for topn in topns
+    }
@@ -0,0 +1,30 @@
+from typing import Callable, Optional, Sequence, Tuple
+
+import numpy as np
+from compsoc.profile import Profile
+
+from rules.score_all_rule import score_all_candidates
+
+Ranking = Tuple[int, ...]
+
+
+def calc_rule_ranking(
+    profile: Profile, rule: Callable[[Profile, int], float], rng: Optional[np.random.Generator] = None
+) -> Ranking:
+    # like compsoc, candidates are sorted by their score (stably, so ties keep the order of `profile.candidates`)
+    candidate_to_score = score_all_candidates(rule, profile, rng)
+    ranked_candidates = sorted(profile.candidates, key=lambda c: candidate_to_score[c], reverse=True)
+    return tuple(ranked_candidates)
+
+
+def build_ranking_rule(ranking: Sequence[int]) -> Callable[[Profile, int], int]:
+    candidate_to_score = {
+        candidate: -(i + 1)
+        for i, candidate in enumerate(ranking)
+    }
+
+    def ranking_rule(profile: Profile, candidate: int) -> int:
+        return candidate_to_score[candidate]
+
+    return ranking_rule
+
@@ -0,0 +1,131 @@
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+from compsoc.evaluate import voter_subjective_utility_for_elected_candidate
+from compsoc.profile import Profile
+
+from evaluation.rankings import calc_rule_ranking
+from utils.profile_arrays import ProfileArrays, get_profile_arrays
+
+UTILITY_EVALUATION_CHUNK_ELEMENTS_COUNT = 2 ** 22
+
+
+@dataclass(frozen=True)
+class UtilityGains:
+    """
+    compsoc's per-voter utility is a sum of one term per elected candidate, which only depends on the length of the
+    voter's ballot, the position of that candidate in it and its index in the elected ranking. Position
+    `number_candidates` stands for a candidate that is missing from the (distorted) ballot.
+    * `top_gains[ballot_length, position]` - the "top" utility of electing such a candidate first.
+    * `topn_gains[ballot_length, position, elected_index]` - its term in the "topn" utility.
+    """
+    top_gains: np.ndarray
+    topn_gains: np.ndarray
+
+
+@lru_cache(maxsize=None)
+def get_utility_gains(number_candidates: int) -> UtilityGains:
+    # the gains are tabulated by probing compsoc's own voter utility function, so they follow its exact semantics
+    candidates = list(range(number_candidates))
+    missing_position = number_candidates
+    top_gains = np.zeros((number_candidates + 1, number_candidates + 1))
+    topn_gains = np.zeros((number_candidates + 1, number_candidates + 1, number_candidates))
+
+    for ballot_length in range(1, number_candidates + 1):
+        vote = candidates[:ballot_length]
+        probed_positions = list(range(ballot_length)) + ([missing_position] if ballot_length < number_candidates else [])
+        for position in probed_positions:
+            probed_candidate = candidates[position] if position != missing_position else candidates[-1]
+            other_candidates = [c for c in candidates if c != probed_candidate]
+            for elected_index in range(number_candidates):
+                elected = other_candidates[:elected_index] + [probed_candidate] + other_candidates[elected_index:]
+                utility_for_top, utility_with_probed = voter_subjective_utility_for_elected_candidate(
+                    vote=vote, elected=elected, topn=elected_index + 1
+                )
+                utility_without_probed = 0 if elected_index == 0 else voter_subjective_utility_for_elected_candidate(
+                    vote=vote, elected=elected, topn=elected_index
+                )[1]
+                topn_gains[ballot_length, position, elected_index] = utility_with_probed - utility_without_probed
+                if elected_index == 0:
+                    top_gains[ballot_length, position] = utility_for_top
+
+    return UtilityGains(top_gains=top_gains, topn_gains=topn_gains)
+
+
+def calc_rankings_utilities(
+    profile_arrays: ProfileArrays, rankings: np.ndarray, topn: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Evaluates many rankings (a K x C array of candidate indices) of the same profile in one pass.
+    Returns the "top" and "topn" utilities of every ranking, as compsoc's `get_rule_utility` defines them.
+    """
+    rankings = np.atleast_2d(rankings)
+    number_candidates = profile_arrays.number_candidates
+    utility_gains = get_utility_gains(number_candidates)
+    ballot_lengths, gain_positions = _get_gain_indices(profile_arrays)
+    frequencies = profile_arrays.frequencies.astype(np.float64)
+
+    top_gains = utility_gains.top_gains[ballot_lengths[:, None], gain_positions[:, rankings[:, 0]]]
+    top_utilities = frequencies @ top_gains
+
+    topn_utilities = np.zeros(len(rankings))
+    elected_indices = np.arange(topn)
+    rankings_chunk_size = max(UTILITY_EVALUATION_CHUNK_ELEMENTS_COUNT // max(len(ballot_lengths) * topn, 1), 1)
+    for chunk_start in range(0, len(rankings), rankings_chunk_size):
+        rankings_chunk = rankings[chunk_start:chunk_start + rankings_chunk_size, :topn]
+        elected_gains = utility_gains.topn_gains[
+            ballot_lengths[:, None, None], gain_positions[:, rankings_chunk], elected_indices
+        ]
+        topn_utilities[chunk_start:chunk_start + len(rankings_chunk)] = frequencies @ elected_gains.sum(axis=2)
+
+    return top_utilities, topn_utilities
+
+
+def calc_candidate_position_utilities(profile_arrays: ProfileArrays, topn: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Since the utilities are separable, the utility of a ranking is a sum over its first `topn` positions.
+    Returns `top_utilities[c]` - the "top" utility of ranking candidate `c` first, and
+    `position_utilities[c, k]` - the term of the "topn" utility of ranking candidate `c` at position `k`.
+    """
+    number_candidates = profile_arrays.number_candidates
+    utility_gains = get_utility_gains(number_candidates)
+    ballot_lengths, gain_positions = _get_gain_indices(profile_arrays)
+    frequencies = profile_arrays.frequencies.astype(np.float64)
+
+    top_utilities = frequencies @ utility_gains.top_gains[ballot_lengths[:, None], gain_positions]
+    position_utilities = np.column_stack([
+        frequencies @ utility_gains.topn_gains[ballot_lengths[:, None], gain_positions, elected_index]
+        for elected_index in range(topn)
+    ])
+    return top_utilities, position_utilities
+
+
+def calc_candidate_rankings_utilities(
+    profile: Profile, rankings: Sequence[Sequence[int]], topn: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    profile_arrays = get_profile_arrays(profile)
+    ranking_indices = np.searchsorted(profile_arrays.candidates, np.array(rankings, dtype=np.int64).reshape(len(rankings), -1))
+    return calc_rankings_utilities(profile_arrays, ranking_indices, topn)
+
+
+def calc_rule_utility(
+    profile: Profile,
+    rule: Callable[[Profile, int], float],
+    topn: int,
+    verbose: bool = False,
+    rng: Optional[np.random.Generator] = None
+) -> Dict[str, float]:
+    # a drop-in replacement for compsoc's `get_rule_utility` (`rng` is only used by randomized rules)
+    ranking = calc_rule_ranking(profile, rule, rng)
+    top_utilities, topn_utilities = calc_candidate_rankings_utilities(profile, [ranking], topn)
+    return {'top': float(top_utilities[0]), 'topn': float(topn_utilities[0])}
+
+
+def _get_gain_indices(profile_arrays: ProfileArrays) -> Tuple[np.ndarray, np.ndarray]:
+    ballot_lengths = profile_arrays.ballot_lengths.astype(np.int64)
+    gain_positions = np.where(
+        profile_arrays.present_mask, profile_arrays.positions, profile_arrays.number_candidates
+    ).astype(np.int64)
+    return ballot_lengths, gain_positions
@@ -0,0 +1,126 @@
+import json
+from typing import Callable, Collection, Dict, List, Optional
+
+import pandas as pd
+
+from experiments.experiment_results_storage import (
+    LEGACY_RESULTS_FILE_NAME, RESULTS_DATASET_FOLDER_NAME, ResultsFilter, filter_results_df, load_results_df,
+    load_trails_costs_df, partitions_to_filters, to_compact_dtypes
+)
+from experiments.last_comp_stage_rules_comparison import get_experiment_results_folder_path, new_experiment_id
+
+EXPERIMENT_VIEW_FILE_NAME = 'experiment_view.json'
+
+# (the results folder of a base experiment, columns=..., filters=...) -> a table of the experiment
+LoadBaseExperimentDfFunc = Callable[..., pd.DataFrame]
+
+
+def create_experiment_view(
+    source_experiment_ids: Collection[str],
+    filters: Optional[List[ResultsFilter]] = None,
+    column_to_values_replacement: Optional[Dict[str, dict]] = None
+) -> str:
+    """
+    Creates a derived experiment, which is only the definition of a view of other (base or derived) experiments:
+    the union of their results, with the values of some columns replaced (e.g.
+    `{'rule_name': {'stv_rule_elishay': 'stv'}}`), and then only the rows that pass all the filters (e.g.
+    `[('rule_name', '!=', 'borda_veto_hybrid_rule')]`). The view is resolved whenever its results are loaded.
+    """
+    for source_experiment_id in source_experiment_ids:
+        if not is_experiment_in_catalog(source_experiment_id):
+            raise ValueError(f"unknown experiment: '{source_experiment_id}'")
+
+    experiment_id = new_experiment_id()
+    experiment_results_folder_path = get_experiment_results_folder_path(experiment_id)
+    experiment_results_folder_path.mkdir(parents=False, exist_ok=False)
+    with open(experiment_results_folder_path / EXPERIMENT_VIEW_FILE_NAME, 'w') as f:
+        json.dump(dict(
+            source_experiment_ids=list(source_experiment_ids),
+            filters=[list(results_filter) for results_filter in filters or []],
+            column_to_values_replacement=column_to_values_replacement or {}
+        ), f, indent=4)
+    return experiment_id
+
+
+def load_experiment_results_df(
+    experiment_id: str,
+    columns: Optional[Collection[str]] = None,
+    partitions: Optional[Dict[str, Collection]] = None,
+    filters: Optional[List[ResultsFilter]] = None
+) -> pd.DataFrame:
+    """
+    Loads the results of either a base experiment or a derived one - see `load_results_df` for the params.
+    """
+    columns = list(columns) if columns is not None else None
+    filters = [*partitions_to_filters(partitions), *(filters or [])]
+    return _load_experiment_df(experiment_id, columns, filters, load_results_df).reset_index(drop=True)
+
+
+def load_experiment_trails_costs_df(
+    experiment_id: str,
+    columns: Optional[Collection[str]] = None,
+    partitions: Optional[Dict[str, Collection]] = None,
+    filters: Optional[List[ResultsFilter]] = None
+) -> pd.DataFrame:
+    """
+    Loads the trails costs of either a base experiment that ran with instrumented trails, or a derived one of such
+    experiments - see `load_trails_costs_df` for the params.
+    """
+    columns = list(columns) if columns is not None else None
+    filters = [*partitions_to_filters(partitions), *(filters or [])]
+    return _load_experiment_df(experiment_id, columns, filters, load_trails_costs_df).reset_index(drop=True)
+
+
+def is_experiment_in_catalog(experiment_id: str) -> bool:
+    experiment_results_folder_path = get_experiment_results_folder_path(experiment_id)
+    return any(
+        (experiment_results_folder_path / file_name).exists()
+        for file_name in (EXPERIMENT_VIEW_FILE_NAME, RESULTS_DATASET_FOLDER_NAME, LEGACY_RESULTS_FILE_NAME)
+    )
+
+
+def _load_experiment_df(
+    experiment_id: str,
+    columns: Optional[List[str]],
+    filters: List[ResultsFilter],
+    load_base_experiment_df: LoadBaseExperimentDfFunc
+) -> pd.DataFrame:
+    if not is_experiment_in_catalog(experiment_id):
+        raise ValueError(f"unknown experiment: '{experiment_id}'")
+    experiment_results_folder_path = get_experiment_results_folder_path(experiment_id)
+    experiment_view_file_path = experiment_results_folder_path / EXPERIMENT_VIEW_FILE_NAME
+    if not experiment_view_file_path.exists():
+        return load_base_experiment_df(experiment_results_folder_path, columns=columns, filters=filters)
+
+    with open(experiment_view_file_path) as f:
+        experiment_view = json.load(f)
+    column_to_values_replacement = experiment_view['column_to_values_replacement']
+
+    # the filters on columns whose values the view doesn't replace are pushed down to its sources, and the rest are
+    # applied to the replaced values
+    all_filters = [*(tuple(results_filter) for results_filter in experiment_view['filters']), *filters]
+    pushed_down_filters = [
+        results_filter for results_filter in all_filters if results_filter[0] not in column_to_values_replacement
+    ]
+    remaining_filters = [
+        results_filter for results_filter in all_filters if results_filter[0] in column_to_values_replacement
+    ]
+    sources_columns = None if columns is None else list(dict.fromkeys([
+        *columns, *(column for column, _, _ in remaining_filters)
+    ]))
+    experiment_results_df = pd.concat([
+        _load_experiment_df(source_experiment_id, sources_columns, pushed_down_filters, load_base_experiment_df)
+        for source_experiment_id in experiment_view['source_experiment_ids']
+    ], ignore_index=True)
+
+    experiment_results_df = experiment_results_df.assign(**{
+        column: experiment_results_df[column].astype(object).replace(values_replacement)
+        for column, values_replacement in column_to_values_replacement.items()
+        if column in experiment_results_df.columns
+    })
+    experiment_results_df = filter_results_df(experiment_results_df, remaining_filters)
+    if columns is not None:
+        experiment_results_df = experiment_results_df[[
+            column for column in columns if column in experiment_results_df.columns
+        ]]
+    return to_compact_dtypes(experiment_results_df)
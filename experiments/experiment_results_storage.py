@@ -0,0 +1,133 @@
+import operator
+import shutil
+from pathlib import Path
+from typing import Any, Collection, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+RESULTS_DATASET_FOLDER_NAME = 'results.parquet'
+LEGACY_RESULTS_FILE_NAME = 'results.csv'
+# the costs of the trails of an instrumented experiment (see `TrailsInstrumentation`)
+TRAILS_COSTS_FILE_NAME = 'trails_costs.parquet'
+RESULTS_PARTITION_COLUMNS = ('voters_model', 'number_candidates')
+# the setup params that are compared to literals (distortion_ratio, topn_perc) are kept float64, so that e.g.
+# `df['distortion_ratio'] == 0.1` still holds
+RESULTS_COLUMN_TO_COMPACT_DTYPE = {
+    'voters_model': 'category',
+    'rule_name': 'category',
+    'number_voters': 'int32',
+    'number_candidates': 'int16',
+    'topn_actual': 'int16',
+    'eval_iter_index': 'int32',
+    'score': 'float32',
+    'regret': 'float32',
+    'stop_reason': 'category',
+    'stage': 'category',
+}
+# a (column, op, value) condition, in the format of the Parquet reader's filters
+ResultsFilter = Tuple[str, str, Any]
+RESULTS_FILTER_OP_TO_FUNC = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    'in': lambda column_values, values: column_values.isin(values),
+    'not in': lambda column_values, values: ~column_values.isin(values),
+}
+
+
+def store_results_df(experiment_results_folder_path: Path, results_df: pd.DataFrame):
+    """
+    Stores the results as a Parquet dataset that is partitioned by `RESULTS_PARTITION_COLUMNS` (replacing the
+    dataset that the folder may already have).
+    """
+    results_dataset_path = experiment_results_folder_path / RESULTS_DATASET_FOLDER_NAME
+    shutil.rmtree(results_dataset_path, ignore_errors=True)
+    to_compact_dtypes(results_df).to_parquet(
+        results_dataset_path, partition_cols=list(RESULTS_PARTITION_COLUMNS), index=False
+    )
+
+
+def load_results_df(
+    experiment_results_folder_path: Path,
+    columns: Optional[Collection[str]] = None,
+    partitions: Optional[Dict[str, Collection]] = None,
+    filters: Optional[List[ResultsFilter]] = None
+) -> pd.DataFrame:
+    """
+    Loads only the given columns (all of them by default), of only the rows whose partition columns are in the
+    given values (e.g. `partitions={'voters_model': ['gaussian']}`) and that pass all the given filters (e.g.
+    `filters=[('distortion_ratio', '>=', 0.8)]`). The filters are pushed down to the Parquet reader, so every other
+    partition is not read at all, and row groups are skipped by their statistics.
+    Experiments that were stored before the results were kept in Parquet are read from their CSV.
+    """
+    columns = list(columns) if columns is not None else None
+    filters = [*partitions_to_filters(partitions), *(filters or [])]
+    results_dataset_path = experiment_results_folder_path / RESULTS_DATASET_FOLDER_NAME
+    if results_dataset_path.exists():
+        results_df = pd.read_parquet(results_dataset_path, columns=columns, filters=filters or None)
+    else:
+        # older experiments may not have some of the columns (e.g. 'regret'), which are just skipped
+        loaded_columns = None if columns is None else {*columns, *(column for column, _, _ in filters)}
+        results_df = pd.read_csv(
+            experiment_results_folder_path / LEGACY_RESULTS_FILE_NAME,
+            usecols=(lambda column: column in loaded_columns) if loaded_columns is not None else None
+        )
+        results_df = filter_results_df(results_df, filters)
+
+    # a loaded dataset has its partition columns last
+    columns_order = columns if columns is not None else [
+        *[column for column in RESULTS_PARTITION_COLUMNS if column in results_df.columns],
+        *[column for column in results_df.columns if column not in RESULTS_PARTITION_COLUMNS]
+    ]
+    columns_order = [column for column in columns_order if column in results_df.columns]
+    return to_compact_dtypes(results_df[columns_order]).reset_index(drop=True)
+
+
+def store_trails_costs_df(experiment_results_folder_path: Path, trails_costs_df: pd.DataFrame):
+    to_compact_dtypes(trails_costs_df).to_parquet(experiment_results_folder_path / TRAILS_COSTS_FILE_NAME, index=False)
+
+
+def load_trails_costs_df(
+    experiment_results_folder_path: Path,
+    columns: Optional[Collection[str]] = None,
+    filters: Optional[List[ResultsFilter]] = None
+) -> pd.DataFrame:
+    """
+    Like `load_results_df`, but the filters on columns that the costs don't have (e.g. 'topn_perc', since the costs of
+    a rule's ranking are shared by all its topn percentages) are ignored, and so is a missing column.
+    """
+    trails_costs_file_path = experiment_results_folder_path / TRAILS_COSTS_FILE_NAME
+    if not trails_costs_file_path.exists():
+        raise ValueError("the experiment has no trails costs (it didn't run with instrumented trails)")
+    # the costs are small enough to be read whole
+    trails_costs_df = pd.read_parquet(trails_costs_file_path)
+    trails_costs_df = filter_results_df(trails_costs_df, [
+        results_filter for results_filter in filters or [] if results_filter[0] in trails_costs_df.columns
+    ])
+    if columns is not None:
+        trails_costs_df = trails_costs_df[[column for column in columns if column in trails_costs_df.columns]]
+    return to_compact_dtypes(trails_costs_df).reset_index(drop=True)
+
+
+def partitions_to_filters(partitions: Optional[Dict[str, Collection]]) -> List[ResultsFilter]:
+    return [(column, 'in', list(values)) for column, values in (partitions or {}).items()]
+
+
+def filter_results_df(results_df: pd.DataFrame, filters: List[ResultsFilter]) -> pd.DataFrame:
+    for column, op, value in filters:
+        results_df = results_df[RESULTS_FILTER_OP_TO_FUNC[op](results_df[column], value)]
+    return results_df
+
+
+def to_compact_dtypes(results_df: pd.DataFrame) -> pd.DataFrame:
+    results_df = results_df.astype({
+        column: dtype for column, dtype in RESULTS_COLUMN_TO_COMPACT_DTYPE.items() if column in results_df.columns
+    })
+    # the partition values of a loaded dataset are categories of every partition in it, even the filtered out ones
+    return results_df.assign(**{
+        column: results_df[column].cat.remove_unused_categories()
+        for column in results_df.columns if isinstance(results_df[column].dtype, pd.CategoricalDtype)
+    })
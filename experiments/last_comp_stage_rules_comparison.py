@@ -1,19 +1,28 @@
+import cProfile
 import json
+import multiprocessing
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import replace
 from pathlib import Path
-from typing import Collection, Union, Literal, Optional, Set, List, Callable
+from typing import Collection, Dict, Union, Literal, Optional, Set, List, Callable
 from uuid import uuid4
 
-import dask
 import math
 import pandas as pd
-from compsoc.evaluate import get_rule_utility
-from dask.diagnostics import ProgressBar
+from compsoc.profile import Profile
 from tqdm import tqdm
 
-from evaluation.eval_rule import generate_eval_profile
+from evaluation.eval_rule import generate_eval_profiles
+from evaluation.oracle import calc_oracle_ranking, calc_oracle_topn_utilities, ORACLE_RULE_NAME
+from evaluation.rankings import Ranking, calc_rule_ranking
+from evaluation.utility_evaluator import calc_candidate_rankings_utilities
 from rules.borda_gamma_rule import build_borda_gamma_rule
 from rules.borda_rule import borda_rule
 from rules.borda_veto_hybrid_rule import borda_veto_hybrid_rule
+from rules.chatGPTs_kemeny_rule import kemeny_rule
 from rules.copeland_rule import copeland_rule
 from rules.dowdall_rule import dowdall_rule
 from rules.k_approval_rule_percentage_version import build_k_approval_rule_percentage_version
@@ -23,7 +32,28 @@ from rules.random_rule import random_rule
 from rules.simpson_rule import simpson_rule
 from rules.stv_rule_elishay import stv_rule_elishay
 from rules.veto_rule import veto_rule
-from utils.random_utils import set_global_random_seed
+from experiments.experiment_results_storage import store_results_df, store_trails_costs_df
+from experiments.trails_racing import (
+    RACING_DEFAULT_CONFIDENCE_LEVEL, RACING_DEFAULT_MIN_ITERATIONS, STOP_REASON_DOMINATED, STOP_REASON_MAX_ITERATIONS,
+    STOP_REASON_RACE_WON, TrailsRace
+)
+from experiments.trails_scheduling import (
+    PROFILE_GENERATION_COST_NAME, load_trails_cost_model, split_trails_to_setups_tasks, split_trails_to_tasks,
+    store_trails_timings
+)
+from experiments.trails_instrumentation import (
+    TRAIL_STAGE_RANKING, TRAIL_STAGE_UTILITY_EVALUATION, TRAILS_PROFILES_FOLDER_NAME, TRAILS_STAGES_KEY_COLUMNS,
+    TrailsInstrumentation, measure_trails_stage, store_trail_profile
+)
+from utils.profile_arrays import get_profile_arrays
+from utils.random_utils import spawn_rng
+from utils.voter_models import (
+    DEFAULT_VOTER_MODELS_GENERATOR, VoterModelsGenerator, to_profile, validate_compsoc_voter_model
+)
+
+EXPERIMENT_PLAN_FILE_NAME = 'experiment_plan.json'
+COMPLETED_TASKS_MANIFEST_FILE_NAME = 'manifest.jsonl'
+TASKS_SHARDS_FOLDER_NAME = 'shards'
 
 RULE_NAME_TO_FUNC = {
     'borda': borda_rule,
@@ -34,6 +64,7 @@ RULE_NAME_TO_FUNC = {
     'simpson': simpson_rule,
     'veto': veto_rule,
     'stv': stv_rule_elishay,
+    'kemeny': kemeny_rule,
     'borda_veto_hybrid_rule': borda_veto_hybrid_rule,
     'random': random_rule,
     **{
@@ -45,6 +76,11 @@ RULE_NAME_TO_FUNC = {
         for perc in (5, 10, 20, 40, 80)
     },
 }
+# rankings that depend on the topn, and so can't be called per candidate like the rules above - (profile, topn) ->
+# ranking. they are evaluated like the rules (and are part of 'all' the rules)
+PSEUDO_RULE_NAME_TO_RANKING_FUNC: Dict[str, Callable[[Profile, int], Ranking]] = {
+    ORACLE_RULE_NAME: calc_oracle_ranking,
+}
 
 
 def run_experiment(
@@ -56,15 +92,37 @@ def run_experiment(
     distortion_ratios: Collection[float],
     eval_iterations_per_rule: int,
     run_trails_in_parallel: bool,
-    random_seed: Optional[int] = None
+    random_seed: Optional[int] = None,
+    store_html_summary: bool = False,
+    adaptive_racing: bool = False,
+    racing_min_iterations: int = RACING_DEFAULT_MIN_ITERATIONS,
+    racing_confidence_level: float = RACING_DEFAULT_CONFIDENCE_LEVEL,
+    instrument_trails: bool = False,
+    profile_slowest_trails_count: int = 0,
+    voter_models_generator: VoterModelsGenerator = DEFAULT_VOTER_MODELS_GENERATOR
 ):
-    experiment_id = new_experiment_id()
-    print(f"experiment_id: '{experiment_id}'")
-
+    # with adaptive racing, `eval_iterations_per_rule` is only the max number of iterations - the rules of every
+    # dataset setup race on the same profiles, and a rule stops as soon as it's significantly dominated.
+    # with instrumented trails, the costs of every rule's ranking and utility evaluation (per dataset setup and
+    # iteration) are stored in a table of their own. the slowest trails are also run again under cProfile, and with
+    # their allocations traced for their memory peaks (which only they have - see `TrailsInstrumentation`)
     if rules == 'all':
-        rules = set(RULE_NAME_TO_FUNC.keys())
+        rules = {*RULE_NAME_TO_FUNC.keys(), *PSEUDO_RULE_NAME_TO_RANKING_FUNC.keys()}
     elif not isinstance(rules, set):
         raise ValueError(f"unexpected rules param type: {type(rules)}")
+    if profile_slowest_trails_count > 0 and not instrument_trails:
+        raise ValueError("profiling the slowest trails requires instrumenting the trails")
+    if profile_slowest_trails_count > 0 and random_seed is None:
+        # otherwise the profiled trails would run on other profiles than the ones they were slow on
+        raise ValueError("profiling the slowest trails requires a random seed")
+
+    if voter_models_generator == 'compsoc':
+        for voter_model in voter_models:
+            for number_candidates in numbers_candidates:
+                validate_compsoc_voter_model(voter_model, number_candidates)
+
+    experiment_id = new_experiment_id()
+    print(f"experiment_id: '{experiment_id}'")
 
     trails_dataset_setups = [
         dict(
@@ -78,11 +136,6 @@ def run_experiment(
         for number_candidates in numbers_candidates
         for distortion_ratio in distortion_ratios
     ]
-    # filter out dataset setups that cause memory leak
-    trails_dataset_setups = [
-        tds for tds in trails_dataset_setups
-        if not (tds['voters_model'] == 'gaussian' and tds['number_candidates'] > 10)
-    ]
     trails_params = [
         dict(
             dataset_setup=dataset_setup,
@@ -98,109 +151,601 @@ def run_experiment(
         )
         for dataset_setup in trails_dataset_setups
     ]
-    trails_results = _run_trails(trails_params, eval_iterations_per_rule, run_trails_in_parallel, random_seed)
+    racing_params = dict(
+        min_iterations=racing_min_iterations, confidence_level=racing_confidence_level
+    ) if adaptive_racing else None
+    tasks = _plan_trails_tasks(
+        trails_params, eval_iterations_per_rule, run_trails_in_parallel, racing_params, random_seed
+    )
 
-    _store_experiment_results(experiment_id, trails_results, experiment_extra_details=dict(
-        eval_iterations_per_rule=eval_iterations_per_rule, random_seed=random_seed
-    ))
+    experiment_results_folder_path = get_experiment_results_folder_path(experiment_id)
+    experiment_results_folder_path.mkdir(parents=False, exist_ok=False)
+    (experiment_results_folder_path / TASKS_SHARDS_FOLDER_NAME).mkdir()
+    with open(experiment_results_folder_path / EXPERIMENT_PLAN_FILE_NAME, 'w') as f:
+        json.dump(dict(
+            trails_params=trails_params,
+            tasks=tasks,
+            eval_iterations_per_rule=eval_iterations_per_rule,
+            run_trails_in_parallel=run_trails_in_parallel,
+            random_seed=random_seed,
+            store_html_summary=store_html_summary,
+            racing_params=racing_params,
+            instrument_trails=instrument_trails,
+            profile_slowest_trails_count=profile_slowest_trails_count,
+            voter_models_generator=voter_models_generator
+        ), f, indent=4)
+
+    _run_experiment_plan(experiment_id)
+
+
+def resume_experiment(experiment_id: str):
+    """
+    Runs only the tasks of an interrupted experiment that are missing from its manifest, and then stores the results
+    of the whole experiment from the shards of all its tasks.
+    """
+    print(f"resuming experiment_id: '{experiment_id}'")
+    _run_experiment_plan(experiment_id)
 
 
 def new_experiment_id():
     return uuid4().hex
 
 
-def _run_trails(
+def _plan_trails_tasks(
     trails_params: List[dict],
     eval_iterations_per_rule: int,
     in_parallel: bool,
+    racing_params: Optional[dict],
     random_seed: Optional[int]
-) -> Collection[dict]:
-    ProgressBar().register()
-    _write_jobs_stats_opening_message(trails_params)
+) -> List[dict]:
+    # the plan is stored with the experiment, so a resumed experiment runs the exact same tasks, even if the cost
+    # model has learned new timings meanwhile. the rules of a setup can only race in the same task, and without a
+    # seed they can only be split between tasks by iterations - so all of them are evaluated on the same profiles
+    if racing_params is not None and in_parallel:
+        tasks = split_trails_to_setups_tasks(trails_params, eval_iterations_per_rule, load_trails_cost_model())
+    elif in_parallel:
+        tasks = split_trails_to_tasks(
+            trails_params, eval_iterations_per_rule, load_trails_cost_model(), os.cpu_count(),
+            can_split_rules=random_seed is not None
+        )
+    else:
+        tasks = [
+            dict(
+                setup_index=setup_index,
+                trail_params=trail_params,
+                first_iteration=0,
+                iterations_count=eval_iterations_per_rule
+            )
+            for setup_index, trail_params in enumerate(trails_params)
+        ]
+    return [dict(task_id=task_id, **task) for task_id, task in enumerate(tasks)]
+
+
+def _run_experiment_plan(experiment_id: str):
+    experiment_results_folder_path = get_experiment_results_folder_path(experiment_id)
+    with open(experiment_results_folder_path / EXPERIMENT_PLAN_FILE_NAME) as f:
+        experiment_plan = json.load(f)
+    trails_params, tasks = experiment_plan['trails_params'], experiment_plan['tasks']
+    # the plans of the experiments from before the trails could be instrumented don't have the flag
+    instrument_trails = experiment_plan.get('instrument_trails', False)
+    voter_models_generator = experiment_plan['voter_models_generator']
+
+    completed_task_ids = _load_completed_task_ids(experiment_results_folder_path)
+    pending_tasks = [task for task in tasks if task['task_id'] not in completed_task_ids]
+    if completed_task_ids:
+        print(f"{len(tasks) - len(pending_tasks)} out of {len(tasks)} tasks are already completed")
+    _run_trails_tasks(
+        experiment_results_folder_path, trails_params, pending_tasks,
+        experiment_plan['random_seed'], experiment_plan['run_trails_in_parallel'], experiment_plan['racing_params'],
+        voter_models_generator, instrument_trails
+    )
 
+    trails_results = _merge_tasks_shards_per_setup(experiment_results_folder_path, trails_params, tasks)
+    _store_experiment_results(experiment_id, trails_results, experiment_extra_details=dict(
+        eval_iterations_per_rule=experiment_plan['eval_iterations_per_rule'],
+        random_seed=experiment_plan['random_seed'],
+        racing_params=experiment_plan['racing_params'],
+        voter_models_generator=voter_models_generator
+    ), store_html_summary=experiment_plan['store_html_summary'])
+
+    if instrument_trails:
+        trails_costs_df = _merge_tasks_costs_shards(experiment_results_folder_path, trails_params, tasks)
+        profile_slowest_trails_count = experiment_plan['profile_slowest_trails_count']
+        if profile_slowest_trails_count > 0:
+            trails_costs_df = _profile_slowest_trails(
+                experiment_results_folder_path, trails_params, trails_costs_df, profile_slowest_trails_count,
+                experiment_plan['random_seed'], voter_models_generator
+            )
+        store_trails_costs_df(experiment_results_folder_path, trails_costs_df.drop(columns=['setup_index']))
+
+
+def _run_trails_tasks(
+    experiment_results_folder_path: Path,
+    trails_params: List[dict],
+    tasks: List[dict],
+    random_seed: Optional[int],
+    in_parallel: bool,
+    racing_params: Optional[dict],
+    voter_models_generator: VoterModelsGenerator = DEFAULT_VOTER_MODELS_GENERATOR,
+    instrument_trails: bool = False
+):
+    # the results of every task are stored as soon as it is completed, and aren't kept in memory after that
+    if not tasks:
+        return
+    _write_jobs_stats_opening_message(trails_params, tasks_count=len(tasks))
     if in_parallel:
-        with dask.config.set(scheduler='processes'):
-            delayed_results = []
-            for trail_params in trails_params:
-                trail_task = dask.delayed(_run_dataset_trails_task)(
-                    trail_params=trail_params, eval_iterations_per_rule=eval_iterations_per_rule, random_seed=random_seed
-                )
-                delayed_results.append(trail_task)
-            trails_results = dask.compute(*delayed_results)
+        # the pool picks up the tasks in their submission order, so the heaviest ones are started first. its workers
+        # are spawned rather than forked, so they don't all inherit the same global random states (which the
+        # unseeded generators and rules draw from)
+        with ProcessPoolExecutor(
+            max_workers=os.cpu_count(), mp_context=multiprocessing.get_context('spawn')
+        ) as executor:
+            task_future_to_task = {
+                executor.submit(
+                    _run_dataset_trails_task,
+                    trail_params=task['trail_params'], eval_iterations_per_rule=task['iterations_count'],
+                    random_seed=random_seed, first_iteration=task['first_iteration'], racing_params=racing_params,
+                    voter_models_generator=voter_models_generator, instrument_trails=instrument_trails
+                ): task
+                for task in tasks
+            }
+            for task_future in tqdm(as_completed(task_future_to_task), total=len(task_future_to_task)):
+                task = task_future_to_task.pop(task_future)
+                _store_task_results(experiment_results_folder_path, task, task_future.result())
     else:
-        trails_results = []
-        with tqdm(total=len(trails_params)) as pabr:
-            for trail_params in trails_params:
-                pabr.write(f"curr dataset setup: {trail_params['dataset_setup']}")
-                trail_results = _run_dataset_trails_task(
-                    trail_params=trail_params, eval_iterations_per_rule=eval_iterations_per_rule,
-                    random_seed=random_seed, logging_func=pabr.write
+        with tqdm(total=len(tasks)) as pabr:
+            for task in tasks:
+                pabr.write(f"curr dataset setup: {task['trail_params']['dataset_setup']}")
+                task_results = _run_dataset_trails_task(
+                    trail_params=task['trail_params'], eval_iterations_per_rule=task['iterations_count'],
+                    random_seed=random_seed, logging_func=pabr.write, first_iteration=task['first_iteration'],
+                    racing_params=racing_params, voter_models_generator=voter_models_generator,
+                    instrument_trails=instrument_trails
                 )
-                trails_results.append(trail_results)
+                _store_task_results(experiment_results_folder_path, task, task_results)
                 pabr.update()
 
+
+def _store_task_results(experiment_results_folder_path: Path, task: dict, task_results: dict):
+    # the shards are written aside and renamed into place before the task is added to the manifest, so a crash
+    # never leaves a completed task with a partial shard
+    shard_file_path_to_df = {
+        _get_task_shard_file_path(experiment_results_folder_path, task['task_id']):
+            task_results['iteration_trails_results_df']
+    }
+    if not task_results['failed_iterations_details_df'].empty:
+        shard_file_path_to_df[_get_task_failures_shard_file_path(experiment_results_folder_path, task['task_id'])] = \
+            task_results['failed_iterations_details_df']
+    if 'trails_costs_df' in task_results:
+        shard_file_path_to_df[_get_task_costs_shard_file_path(experiment_results_folder_path, task['task_id'])] = \
+            task_results['trails_costs_df']
+    for shard_file_path, shard_df in shard_file_path_to_df.items():
+        temp_shard_file_path = shard_file_path.with_name(f'.{shard_file_path.name}')
+        shard_df.to_parquet(temp_shard_file_path, index=False)
+        temp_shard_file_path.replace(shard_file_path)
+    with open(experiment_results_folder_path / COMPLETED_TASKS_MANIFEST_FILE_NAME, 'a') as f:
+        f.write(json.dumps(dict(
+            task_id=task['task_id'],
+            setup_index=task['setup_index'],
+            rule_names=sorted({eval_params['rule_name'] for eval_params in task['trail_params']['evaluation_params']}),
+            first_iteration=task['first_iteration'],
+            iterations_count=task['iterations_count'],
+        )) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+    store_trails_timings(task_results['timings'])
+
+
+def _load_completed_task_ids(experiment_results_folder_path: Path) -> Set[int]:
+    manifest_file_path = experiment_results_folder_path / COMPLETED_TASKS_MANIFEST_FILE_NAME
+    if not manifest_file_path.exists():
+        return set()
+    completed_task_ids = set()
+    with open(manifest_file_path) as f:
+        for line in f:
+            try:
+                completed_task_ids.add(json.loads(line)['task_id'])
+            except json.JSONDecodeError:
+                # a line that a crash cut in the middle - its task is just run again
+                continue
+    return completed_task_ids
+
+
+def _get_task_shard_file_path(experiment_results_folder_path: Path, task_id: int) -> Path:
+    return experiment_results_folder_path / TASKS_SHARDS_FOLDER_NAME / f'task_{task_id:05d}.parquet'
+
+
+def _get_task_costs_shard_file_path(experiment_results_folder_path: Path, task_id: int) -> Path:
+    return experiment_results_folder_path / TASKS_SHARDS_FOLDER_NAME / f'task_{task_id:05d}_costs.parquet'
+
+
+def _get_task_failures_shard_file_path(experiment_results_folder_path: Path, task_id: int) -> Path:
+    # only the tasks with failed iterations have this shard
+    return experiment_results_folder_path / TASKS_SHARDS_FOLDER_NAME / f'task_{task_id:05d}_failures.parquet'
+
+
+def _merge_tasks_shards_per_setup(
+    experiment_results_folder_path: Path, trails_params: List[dict], tasks: List[dict]
+) -> List[dict]:
+    # the rows of every setup are put back in the order that a single task of the whole setup produces them in
+    setup_index_to_results_dfs = defaultdict(list)
+    setup_index_to_failures_dfs = defaultdict(list)
+    for task in tasks:
+        setup_index_to_results_dfs[task['setup_index']].append(pd.read_parquet(
+            _get_task_shard_file_path(experiment_results_folder_path, task['task_id'])
+        ))
+        failures_shard_file_path = _get_task_failures_shard_file_path(experiment_results_folder_path, task['task_id'])
+        if failures_shard_file_path.exists():
+            setup_index_to_failures_dfs[task['setup_index']].append(pd.read_parquet(failures_shard_file_path))
+
+    trails_results = []
+    for setup_index, trail_params in enumerate(trails_params):
+        eval_params_order = {
+            (eval_params['rule_name'], eval_params['topn_perc']): i
+            for i, eval_params in enumerate(trail_params['evaluation_params'])
+        }
+        setup_results_df = pd.concat(setup_index_to_results_dfs[setup_index])
+        setup_results_df = setup_results_df \
+            .assign(eval_params_order=[
+                eval_params_order[(rule_name, topn_perc)]
+                for rule_name, topn_perc in zip(setup_results_df['rule_name'], setup_results_df['topn_perc'])
+            ]) \
+            .sort_values(by=['eval_iter_index', 'eval_params_order'], kind='stable') \
+            .drop(columns=['eval_params_order']) \
+            .reset_index(drop=True)
+        setup_failures_dfs = setup_index_to_failures_dfs[setup_index]
+        trails_results.append(dict(
+            dataset_setup=trail_params['dataset_setup'],
+            iteration_trails_results_df=setup_results_df,
+            failed_iterations_details_df=pd.concat(setup_failures_dfs) \
+                .sort_values(by='eval_iter_index', kind='stable') \
+                .reset_index(drop=True) if setup_failures_dfs else pd.DataFrame()
+        ))
     return trails_results
 
 
-def _write_jobs_stats_opening_message(trails_params: List[dict]):
-    jobs_count = len(trails_params)
+def _merge_tasks_costs_shards(
+    experiment_results_folder_path: Path, trails_params: List[dict], tasks: List[dict]
+) -> pd.DataFrame:
+    tasks_costs_dfs = []
+    for task in tasks:
+        task_costs_df = pd.read_parquet(
+            _get_task_costs_shard_file_path(experiment_results_folder_path, task['task_id'])
+        )
+        dataset_setup = trails_params[task['setup_index']]['dataset_setup']
+        tasks_costs_dfs.append(task_costs_df.assign(setup_index=task['setup_index'], **dataset_setup))
+    trails_costs_df = pd.concat(tasks_costs_dfs, ignore_index=True) \
+        .sort_values(by=['setup_index', 'eval_iter_index'], kind='stable') \
+        .reset_index(drop=True)
+    dataset_setup_columns = list(trails_params[0]['dataset_setup'].keys())
+    return trails_costs_df[[
+        *dataset_setup_columns, *(column for column in trails_costs_df.columns if column not in dataset_setup_columns)
+    ]]
+
+
+def _profile_slowest_trails(
+    experiment_results_folder_path: Path,
+    trails_params: List[dict],
+    trails_costs_df: pd.DataFrame,
+    trails_count: int,
+    random_seed: Optional[int],
+    voter_models_generator: VoterModelsGenerator = DEFAULT_VOTER_MODELS_GENERATOR
+) -> pd.DataFrame:
+    # profiling (or tracing the allocations of) every trail would slow all of them down, so only the slowest trails
+    # are run again - on the same profiles, and with the same random streams that are derived from the seed (rather
+    # than the global random state) - once with their allocations traced, and once under cProfile. returns the costs,
+    # with the memory peaks of those trails
+    slowest_trails_df = trails_costs_df \
+        .groupby(by=['setup_index', 'eval_iter_index', 'rule_name'], sort=False)['wall_seconds'] \
+        .sum() \
+        .nlargest(trails_count) \
+        .reset_index()
+    trails_profiles_folder_path = experiment_results_folder_path / TRAILS_PROFILES_FOLDER_NAME
+    trails_profiles_folder_path.mkdir(exist_ok=True)
+    print(f"profiling the {len(slowest_trails_df)} slowest trails")
+    trails_peaks_dfs = []
+    for setup_index, eval_iter_index, rule_name in zip(
+        slowest_trails_df['setup_index'], slowest_trails_df['eval_iter_index'], slowest_trails_df['rule_name']
+    ):
+        trail_params = trails_params[setup_index]
+        dataset_setup = trail_params['dataset_setup']
+        trail_evaluation_params = [
+            eval_params for eval_params in trail_params['evaluation_params'] if eval_params['rule_name'] == rule_name
+        ]
+        dataset_profile, = generate_eval_profiles(
+            **dataset_setup, iterations_count=1, random_seed=random_seed, first_iteration=int(eval_iter_index),
+            voter_models_generator=voter_models_generator
+        )
+
+        # on a fresh copy of the profile, so its lazily derived arrays are allocated (and traced) again
+        instrumentation = TrailsInstrumentation()
+        with instrumentation.tracing_memory():
+            _evaluate_profile_trails(
+                to_profile(
+                    replace(get_profile_arrays(dataset_profile)), distorted=dataset_setup['distortion_ratio'] > 0
+                ),
+                trail_evaluation_params, int(eval_iter_index), logging_func=None, dataset_setup=dataset_setup,
+                random_seed=random_seed, instrumentation=instrumentation
+            )
+        trails_peaks_dfs.append(instrumentation.peaks_to_df().assign(setup_index=setup_index))
+
+        profiler = cProfile.Profile()
+        profiler.runcall(
+            _evaluate_profile_trails,
+            dataset_profile,
+            trail_evaluation_params,
+            int(eval_iter_index),
+            logging_func=None,
+            dataset_setup=dataset_setup,
+            random_seed=random_seed
+        )
+        trail_profile_file_name = f'setup_{setup_index:04d}_iter_{eval_iter_index:03d}_{rule_name}.prof'
+        store_trail_profile(profiler, trails_profiles_folder_path / trail_profile_file_name)
+
+    trails_peaks_df = pd.concat(trails_peaks_dfs, ignore_index=True)
+    return trails_costs_df \
+        .drop(columns=['peak_allocated_bytes']) \
+        .merge(trails_peaks_df, on=['setup_index', *TRAILS_STAGES_KEY_COLUMNS], how='left')
+
+
+def _write_jobs_stats_opening_message(trails_params: List[dict], tasks_count: int):
     total_trails_count = sum(len(tp['evaluation_params']) for tp in trails_params)
-    trails_per_job = round(total_trails_count / jobs_count, 2)
+    trails_per_job = round(total_trails_count / tasks_count, 2)
     print(
-        f"starting to run requested trails in parallel. total number of jobs: {jobs_count}. "
+        f"starting to run requested trails. total number of jobs: {tasks_count}. "
         f"total number of trails: {total_trails_count} (trails per job: ~{trails_per_job})."
     )
 
 
 def _run_dataset_trails_task(
     trail_params: dict, eval_iterations_per_rule: int,
-        random_seed: Optional[int], logging_func: Optional[Callable] = None
+        random_seed: Optional[int], logging_func: Optional[Callable] = None, first_iteration: int = 0,
+        racing_params: Optional[dict] = None,
+        voter_models_generator: VoterModelsGenerator = DEFAULT_VOTER_MODELS_GENERATOR, instrument_trails: bool = False
 ) -> dict:
-    if random_seed is not None:
-        set_global_random_seed(random_seed)
+    instrumentation = TrailsInstrumentation() if instrument_trails else None
+    if racing_params is not None:
+        task_results = _run_dataset_trails_race(
+            trail_params, eval_iterations_per_rule, random_seed, racing_params, voter_models_generator,
+            logging_func, instrumentation
+        )
+    else:
+        task_results = _run_dataset_trails_iterations(
+            trail_params, eval_iterations_per_rule, random_seed, voter_models_generator, logging_func,
+            first_iteration, instrumentation
+        )
+    if instrumentation is not None:
+        task_results['trails_costs_df'] = instrumentation.to_df()
+    return task_results
+
 
+def _run_dataset_trails_iterations(
+    trail_params: dict, eval_iterations_per_rule: int,
+        random_seed: Optional[int], voter_models_generator: VoterModelsGenerator, logging_func: Optional[Callable],
+        first_iteration: int, instrumentation: Optional[TrailsInstrumentation]
+) -> dict:
+    dataset_setup = trail_params['dataset_setup']
     iteration_trails_results = []
     failed_iterations_details = []
-    for i in range(eval_iterations_per_rule):
-        try:
-            dataset_profile = generate_eval_profile(**trail_params['dataset_setup'])
-        except Exception as ex:
-            (logging_func or print)("failed iteration")
-            failed_iterations_details.append({'eval_iter_index': i, 'exception_str': str(ex)})
+    timings = []
+    for i in range(first_iteration, first_iteration + eval_iterations_per_rule):
+        dataset_profile = _generate_iteration_profile(
+            dataset_setup, i, random_seed, voter_models_generator, logging_func, failed_iterations_details, timings
+        )
+        if dataset_profile is None:
             continue
+        rule_name_to_ranking_seconds = {}
+        iteration_trails_results.extend(_evaluate_profile_trails(
+            dataset_profile, trail_params['evaluation_params'], i, logging_func,
+            dataset_setup=dataset_setup, random_seed=random_seed,
+            rule_name_to_ranking_seconds=rule_name_to_ranking_seconds, instrumentation=instrumentation
+        ))
+        timings.extend(
+            _build_timing(rule_name, dataset_setup, seconds)
+            for rule_name, seconds in rule_name_to_ranking_seconds.items()
+        )
 
-        for eval_params in trail_params['evaluation_params']:
-            rule_name = eval_params['rule_name']
-            topn = eval_params['topn_actual']
+    assert any(iteration_trails_results), "empty results are unexpected"
+    iteration_trails_results_df = pd.DataFrame(data=iteration_trails_results)
+    ret = dict(
+        dataset_setup=dataset_setup,
+        iteration_trails_results_df=iteration_trails_results_df,
+        failed_iterations_details_df=pd.DataFrame(data=failed_iterations_details),
+        timings=timings
+    )
+    return ret
 
-            should_skip_trail = topn == 0
-            if not should_skip_trail:
-                assert rule_name in RULE_NAME_TO_FUNC, f"unknown rule: '{rule_name}'"
-                rule_func = RULE_NAME_TO_FUNC[rule_name]
 
-                if logging_func:
-                    logging_func(f"current trail: {eval_params}")
+def _run_dataset_trails_race(
+    trail_params: dict, max_iterations: int, random_seed: Optional[int], racing_params: dict,
+        voter_models_generator: VoterModelsGenerator = DEFAULT_VOTER_MODELS_GENERATOR,
+        logging_func: Optional[Callable] = None, instrumentation: Optional[TrailsInstrumentation] = None
+) -> dict:
+    # the rules race separately for every topn percentage, and a trail (of a rule with a topn percentage) stops as
+    # soon as it's dominated in its race, or when the race is won. the oracle doesn't race - it's only evaluated (for
+    # the regrets) for as long as the race of its topn percentage goes on
+    dataset_setup = trail_params['dataset_setup']
+    evaluation_params = [
+        eval_params for eval_params in trail_params['evaluation_params'] if eval_params['topn_actual'] > 0
+    ]
+    topn_perc_to_race = {}
+    for topn_perc in dict.fromkeys(eval_params['topn_perc'] for eval_params in evaluation_params):
+        contenders = [
+            eval_params['rule_name'] for eval_params in evaluation_params
+            if eval_params['topn_perc'] == topn_perc and eval_params['rule_name'] != ORACLE_RULE_NAME
+        ]
+        if len(contenders) >= 2:
+            topn_perc_to_race[topn_perc] = TrailsRace(contenders, **racing_params)
+
+    trail_key_to_stop_reason = {}
+    iteration_trails_results = []
+    failed_iterations_details = []
+    timings = []
+    for i in range(max_iterations):
+        running_evaluation_params = [
+            eval_params for eval_params in evaluation_params
+            if (eval_params['rule_name'], eval_params['topn_perc']) not in trail_key_to_stop_reason
+        ]
+        if not running_evaluation_params:
+            break
+
+        dataset_profile = _generate_iteration_profile(
+            dataset_setup, i, random_seed, voter_models_generator, logging_func, failed_iterations_details, timings
+        )
+        if dataset_profile is None:
+            continue
+        rule_name_to_ranking_seconds = {}
+        profile_trails_results = _evaluate_profile_trails(
+            dataset_profile, running_evaluation_params, i, logging_func, dataset_setup=dataset_setup,
+            random_seed=random_seed, rule_name_to_ranking_seconds=rule_name_to_ranking_seconds,
+            instrumentation=instrumentation
+        )
+        iteration_trails_results.extend(profile_trails_results)
+        timings.extend(
+            _build_timing(rule_name, dataset_setup, seconds)
+            for rule_name, seconds in rule_name_to_ranking_seconds.items()
+        )
 
-                iteration_results = get_rule_utility(
-                    profile=dataset_profile,
-                    rule=rule_func,
-                    topn=topn,
-                    verbose=False
-                )
-                iteration_trails_results.append({**eval_params, 'eval_iter_index': i, 'score': iteration_results['topn']})
+        topn_perc_to_rule_name_to_score = defaultdict(dict)
+        for trail_results in profile_trails_results:
+            rule_name_to_score = topn_perc_to_rule_name_to_score[trail_results['topn_perc']]
+            rule_name_to_score[trail_results['rule_name']] = trail_results['score']
+        for topn_perc, race in topn_perc_to_race.items():
+            if race.is_won:
+                continue
+            for rule_name in race.add_iteration_scores(topn_perc_to_rule_name_to_score[topn_perc]):
+                trail_key_to_stop_reason[(rule_name, topn_perc)] = STOP_REASON_DOMINATED
+            if race.is_won:
+                trail_key_to_stop_reason[(race.contenders[0], topn_perc)] = STOP_REASON_RACE_WON
+                trail_key_to_stop_reason[(ORACLE_RULE_NAME, topn_perc)] = STOP_REASON_RACE_WON
 
-    assert any(iteration_trails_results), "empty results are unexpected"
     iteration_trails_results_df = pd.DataFrame(data=iteration_trails_results)
-    failed_iterations_details_df = pd.DataFrame(data=failed_iterations_details) if any(failed_iterations_details) else pd.DataFrame()
-    ret = dict(
-        dataset_setup=trail_params['dataset_setup'],
+    iteration_trails_results_df['stop_reason'] = [
+        trail_key_to_stop_reason.get((rule_name, topn_perc), STOP_REASON_MAX_ITERATIONS)
+        for rule_name, topn_perc in zip(
+            iteration_trails_results_df['rule_name'], iteration_trails_results_df['topn_perc']
+        )
+    ]
+    return dict(
+        dataset_setup=dataset_setup,
         iteration_trails_results_df=iteration_trails_results_df,
-        failed_iterations_details_df=failed_iterations_details_df
+        failed_iterations_details_df=pd.DataFrame(data=failed_iterations_details),
+        timings=timings
     )
-    return ret
 
 
-def _store_experiment_results(experiment_id: str, trails_results: Collection[dict], experiment_extra_details: dict):
+def _generate_iteration_profile(
+    dataset_setup: dict, eval_iter_index: int, random_seed: Optional[int],
+        voter_models_generator: VoterModelsGenerator, logging_func: Optional[Callable],
+        failed_iterations_details: List[dict], timings: List[dict]
+) -> Optional[Profile]:
+    # compsoc's generators may fail (multinomial_dirichlet, even after its retries), and a failed iteration is only
+    # recorded and skipped
+    generation_start_time = time.perf_counter()
+    try:
+        dataset_profile, = generate_eval_profiles(
+            **dataset_setup, iterations_count=1, random_seed=random_seed, first_iteration=eval_iter_index,
+            voter_models_generator=voter_models_generator
+        )
+    except Exception as ex:
+        (logging_func or print)("failed iteration")
+        failed_iterations_details.append({'eval_iter_index': eval_iter_index, 'exception_str': str(ex)})
+        return None
+    timings.append(_build_timing(
+        PROFILE_GENERATION_COST_NAME, dataset_setup, time.perf_counter() - generation_start_time
+    ))
+    return dataset_profile
+
+
+def _build_timing(cost_name: str, dataset_setup: dict, seconds: float) -> dict:
+    return dict(
+        cost_name=cost_name,
+        number_voters=dataset_setup['number_voters'],
+        number_candidates=dataset_setup['number_candidates'],
+        seconds=seconds
+    )
+
+
+def _evaluate_profile_trails(
+    dataset_profile: Profile,
+    evaluation_params: List[dict],
+    eval_iter_index: int,
+    logging_func: Optional[Callable],
+    dataset_setup: Optional[dict] = None,
+    random_seed: Optional[int] = None,
+    rule_name_to_ranking_seconds: Optional[Dict[str, float]] = None,
+    instrumentation: Optional[TrailsInstrumentation] = None
+) -> List[dict]:
+    # every rule is ranked once per profile, and all the distinct rankings that are needed for the same topn are
+    # evaluated together in one pass - so trails of the same rule with different topn percentages, colliding topn
+    # values, and rules that happen to agree on the profile all share the work.
+    # every randomized rule draws from a stream of its own (spawned by the experiment seed, the dataset setup, the
+    # iteration and the rule), so its ranking doesn't depend on how the trails are split between tasks
+    rule_name_to_ranking = {}
+    rule_name_to_ranking_seconds = rule_name_to_ranking_seconds if rule_name_to_ranking_seconds is not None else {}
+    topn_to_rankings = defaultdict(set)
+    trails_to_evaluate = []
+    for eval_params in evaluation_params:
+        rule_name = eval_params['rule_name']
+        topn = eval_params['topn_actual']
+
+        should_skip_trail = topn == 0
+        if not should_skip_trail:
+            assert rule_name in RULE_NAME_TO_FUNC or rule_name in PSEUDO_RULE_NAME_TO_RANKING_FUNC, \
+                f"unknown rule: '{rule_name}'"
+            if logging_func:
+                logging_func(f"current trail: {eval_params}")
+
+            if rule_name in PSEUDO_RULE_NAME_TO_RANKING_FUNC:
+                with measure_trails_stage(instrumentation, [rule_name], eval_iter_index, TRAIL_STAGE_RANKING):
+                    ranking = PSEUDO_RULE_NAME_TO_RANKING_FUNC[rule_name](dataset_profile, topn)
+            else:
+                rule = RULE_NAME_TO_FUNC[rule_name]
+                if rule_name not in rule_name_to_ranking:
+                    rule_rng = (
+                        spawn_rng(random_seed, dataset_setup, eval_iter_index, rule_name)
+                        if random_seed is not None else None
+                    )
+                    with measure_trails_stage(instrumentation, [rule_name], eval_iter_index, TRAIL_STAGE_RANKING):
+                        ranking_start_time = time.perf_counter()
+                        rule_name_to_ranking[rule_name] = calc_rule_ranking(dataset_profile, rule, rule_rng)
+                        rule_name_to_ranking_seconds[rule_name] = time.perf_counter() - ranking_start_time
+                ranking = rule_name_to_ranking[rule_name]
+            topn_to_rankings[topn].add(ranking)
+            trails_to_evaluate.append((eval_params, ranking, topn))
+
+    ranking_and_topn_to_score = {}
+    for topn, rankings in topn_to_rankings.items():
+        rankings = list(rankings)
+        topn_rule_names = [
+            eval_params['rule_name'] for eval_params, _, trail_topn in trails_to_evaluate if trail_topn == topn
+        ]
+        with measure_trails_stage(
+            instrumentation, topn_rule_names, eval_iter_index, TRAIL_STAGE_UTILITY_EVALUATION
+        ):
+            _, topn_utilities = calc_candidate_rankings_utilities(dataset_profile, rankings, topn)
+        for ranking, topn_utility in zip(rankings, topn_utilities):
+            ranking_and_topn_to_score[(ranking, topn)] = float(topn_utility)
+
+    # the regret of a trail is how far its score is from the best achievable one
+    topn_to_oracle_score = calc_oracle_topn_utilities(dataset_profile, topn_to_rankings.keys())
+    return [
+        {
+            **eval_params,
+            'eval_iter_index': eval_iter_index,
+            'score': ranking_and_topn_to_score[(ranking, topn)],
+            'regret': topn_to_oracle_score[topn] - ranking_and_topn_to_score[(ranking, topn)],
+        }
+        for eval_params, ranking, topn in trails_to_evaluate
+    ]
+
+
+def _store_experiment_results(
+    experiment_id: str,
+    trails_results: Collection[dict],
+    experiment_extra_details: dict,
+    store_html_summary: bool = False
+):
     print(f"storing the results of the experiment (experiment_id: '{experiment_id}')")
 
     all_trails_results_dfs = []
@@ -225,15 +770,23 @@ def _store_experiment_results(experiment_id: str, trails_results: Collection[dic
     experiment_failures_df = pd.concat(all_failed_iterations_details_dfs)
 
     experiment_results_folder_path = get_experiment_results_folder_path(experiment_id)
-    experiment_results_folder_path.mkdir(parents=False, exist_ok=False)
-    experiment_results_df.to_csv(experiment_results_folder_path / 'results.csv', index=False)
+    store_results_df(experiment_results_folder_path, experiment_results_df)
     experiment_failures_df.to_csv(experiment_results_folder_path / 'failures.csv', index=False)
-    experiment_results_df.to_html(experiment_results_folder_path / 'results.html', index=False)
-    experiment_failures_df.to_html(experiment_results_folder_path / 'failures.html', index=False)
+    if store_html_summary:
+        _build_results_summary_df(experiment_results_df).to_html(
+            experiment_results_folder_path / 'results_summary.html'
+        )
     with open(experiment_results_folder_path / 'experiment_extra_details.json', 'w') as f:
         json.dump(experiment_extra_details, f, indent=4)
 
 
+def _build_results_summary_df(experiment_results_df: pd.DataFrame) -> pd.DataFrame:
+    return experiment_results_df \
+        .groupby(by=['voters_model', 'number_candidates', 'topn_perc', 'rule_name'], observed=True) \
+        [['score', 'regret']] \
+        .mean()
+
+
 def _add_dataset_setup_columns_to_df(df: pd.DataFrame, dataset_setup: dict) -> pd.DataFrame:
     df = df.copy()
     if not df.empty:
@@ -246,7 +799,7 @@ def _reorder_results_df_columns(
         iteration_trails_results_df: pd.DataFrame, dataset_setup_columns: Collection[str]
 ) -> pd.DataFrame:
     first_columns = list(dataset_setup_columns)
-    last_columns = ['eval_iter_index', 'score']
+    last_columns = ['eval_iter_index', 'score', 'regret']
     other_columns = [
         col for col in iteration_trails_results_df.columns
         if col not in (first_columns + last_columns)
@@ -1,6 +1,5 @@
 import json
-from collections import defaultdict
-from typing import List, Tuple, Collection
+from typing import Collection, Dict, Optional
 
 import numpy as np
 import pandas as pd
@@ -9,7 +8,8 @@ import matplotlib.pyplot as plt
 from IPython.core.display import HTML
 from IPython.display import display
 
-from experiments.last_comp_stage_rules_comparison import get_experiment_results_folder_path
+from evaluation.oracle import ORACLE_RULE_NAME
+from experiments.experiment_catalog import load_experiment_results_df, load_experiment_trails_costs_df
 
 DATASET_SETUP_DETAILS_COLUMNS = (
     'voters_model',
@@ -19,14 +19,29 @@ DATASET_SETUP_DETAILS_COLUMNS = (
     'topn_perc',
     'topn_actual'
 )
+DISPLAYED_RESULTS_COLUMNS = (*DATASET_SETUP_DETAILS_COLUMNS, 'rule_name', 'score', 'regret')
+TRAILS_COSTS_KEY_COLUMNS = (
+    'voters_model', 'number_voters', 'number_candidates', 'distortion_ratio', 'eval_iter_index', 'rule_name'
+)
 
 
-def display_experiment_results(experiment_id: str, use_datapane_datatables: bool = False):
-    experiment_results_folder = get_experiment_results_folder_path(experiment_id)
-    experiment_results_df = pd.read_csv(experiment_results_folder / 'results.csv')
+def display_experiment_results(
+    experiment_id: str,
+    use_datapane_datatables: bool = False,
+    partitions: Optional[Dict[str, Collection]] = None
+):
+    # the experiment may be either a base experiment or a derived one
+    experiment_results_df = load_experiment_results_df(
+        experiment_id, columns=DISPLAYED_RESULTS_COLUMNS, partitions=partitions
+    )
 
     _show_results_df_head(experiment_results_df)
 
+    # the oracle is an upper bound rather than a competing rule
+    experiment_results_df = experiment_results_df[experiment_results_df['rule_name'] != ORACLE_RULE_NAME]
+    if 'regret' in experiment_results_df.columns:
+        _show_rules_mean_regret(experiment_results_df)
+
     _plot_rules_winnings_comparison_graph(experiment_results_df, graph_title="all dataset setups")
     distribution_voter_models = sorted(set(experiment_results_df['voters_model']))
     for distribution_voter_model in distribution_voter_models:
@@ -53,29 +68,120 @@ def display_experiment_results(experiment_id: str, use_datapane_datatables: bool
     )
 
 
+def display_experiment_cost_vs_quality(experiment_id: str, partitions: Optional[Dict[str, Collection]] = None):
+    """
+    Shows, per rule, what it costs to evaluate a profile with it (its ranking plus its share of the utility
+    evaluation) against the quality of its rankings. Requires an experiment that ran with instrumented trails.
+    """
+    experiment_results_df = load_experiment_results_df(
+        experiment_id, columns=DISPLAYED_RESULTS_COLUMNS, partitions=partitions
+    )
+    trails_costs_df = load_experiment_trails_costs_df(experiment_id, partitions=partitions)
+    # the oracle is an upper bound rather than a competing rule
+    experiment_results_df = experiment_results_df[experiment_results_df['rule_name'] != ORACLE_RULE_NAME]
+    trails_costs_df = trails_costs_df[trails_costs_df['rule_name'] != ORACLE_RULE_NAME]
+
+    rules_cost_vs_quality_df = _calc_rules_cost_vs_quality(experiment_results_df, trails_costs_df)
+    _display_title("cost vs. quality per rule", main_else_secondary=True)
+    display(rules_cost_vs_quality_df)
+
+    plt.rcParams["figure.figsize"] = (12, 6)
+    plt.title("Mean seconds per profile vs. mean winnings score per rule")
+    plt.xscale('log')
+    plt.xlabel('Mean seconds per profile (log scale)')
+    plt.ylabel('Mean winnings score')
+    plt.scatter(
+        rules_cost_vs_quality_df['wall_seconds_mean'], rules_cost_vs_quality_df['mean_winnings_score'],
+        c=np.where(rules_cost_vs_quality_df['is_pareto_optimal'], 'tab:red', 'tab:blue')
+    )
+    for rule_name, rule_cost_vs_quality in rules_cost_vs_quality_df.iterrows():
+        plt.annotate(
+            rule_name, (rule_cost_vs_quality['wall_seconds_mean'], rule_cost_vs_quality['mean_winnings_score']),
+            fontsize=8
+        )
+    plt.show()
+    plt.close()
+
+    _display_title("mean seconds per profile per rule", main_else_secondary=False)
+    rules_mean_seconds_df = trails_costs_df \
+        .groupby(by=list(TRAILS_COSTS_KEY_COLUMNS), observed=True)['wall_seconds'] \
+        .sum() \
+        .groupby(by=['number_candidates', 'rule_name'], observed=True) \
+        .mean() \
+        .unstack(level='number_candidates') \
+        .sort_values(by=trails_costs_df['number_candidates'].max())
+    display(rules_mean_seconds_df)
+
+
+def _calc_rules_cost_vs_quality(experiment_results_df: pd.DataFrame, trails_costs_df: pd.DataFrame) -> pd.DataFrame:
+    # a rule's cost of a profile is the sum of its stages (e.g. ranking and utility evaluation) on the profile, and
+    # its peak is the highest of them. a rule is pareto optimal if no other rule is both as cheap and as good, and
+    # strictly cheaper or better
+    rules_profiles_costs_df = trails_costs_df \
+        .groupby(by=list(TRAILS_COSTS_KEY_COLUMNS), observed=True) \
+        .agg(
+            wall_seconds=('wall_seconds', 'sum'),
+            cpu_seconds=('cpu_seconds', 'sum'),
+            peak_allocated_bytes=('peak_allocated_bytes', 'max')
+        )
+    rules_cost_vs_quality_df = rules_profiles_costs_df \
+        .groupby(by='rule_name', observed=True) \
+        .agg(
+            wall_seconds_mean=('wall_seconds', 'mean'),
+            cpu_seconds_mean=('cpu_seconds', 'mean'),
+            peak_allocated_mb_max=('peak_allocated_bytes', lambda peaks_bytes: round(peaks_bytes.max() / 2 ** 20, 2))
+        )
+
+    score_stats_per_subgroup_df = _results_to_score_stats_per_subgroup(
+        experiment_results_df, subgroup_columns=DATASET_SETUP_DETAILS_COLUMNS)
+    ranked_score_stats_per_subgroup_df = _add_subgroups_score_ranks(
+        score_stats_per_subgroup_df, subgroup_columns=DATASET_SETUP_DETAILS_COLUMNS)
+    rules_cost_vs_quality_df['mean_winnings_score'] = pd.Series(
+        _calc_rule_to_mean_winnings_score(ranked_score_stats_per_subgroup_df)
+    )
+    if 'regret' in experiment_results_df.columns:
+        rules_cost_vs_quality_df['regret_mean'] = experiment_results_df \
+            .groupby(by='rule_name', observed=True)['regret'] \
+            .mean()
+    rules_cost_vs_quality_df = rules_cost_vs_quality_df.dropna(subset=['mean_winnings_score'])
+
+    wall_seconds_means = rules_cost_vs_quality_df['wall_seconds_mean'].to_numpy()
+    mean_winnings_scores = rules_cost_vs_quality_df['mean_winnings_score'].to_numpy()
+    is_as_cheap_and_good = (
+        (wall_seconds_means[:, None] <= wall_seconds_means[None, :])
+        & (mean_winnings_scores[:, None] >= mean_winnings_scores[None, :])
+    )
+    is_cheaper_or_better = (
+        (wall_seconds_means[:, None] < wall_seconds_means[None, :])
+        | (mean_winnings_scores[:, None] > mean_winnings_scores[None, :])
+    )
+    rules_cost_vs_quality_df['is_pareto_optimal'] = ~np.any(is_as_cheap_and_good & is_cheaper_or_better, axis=0)
+    return rules_cost_vs_quality_df.sort_values(by='wall_seconds_mean')
+
+
 def _show_results_df_head(experiment_results_df: pd.DataFrame):
-    _display_title(f"results CSV head (shape={experiment_results_df.shape})", main_else_secondary=True)
+    _display_title(f"results head (shape={experiment_results_df.shape})", main_else_secondary=True)
     display(experiment_results_df.head(10))
 
 
+def _show_rules_mean_regret(experiment_results_df: pd.DataFrame):
+    _display_title("mean regret (distance from the oracle's score) per rule", main_else_secondary=True)
+    rules_mean_regret_df = experiment_results_df \
+        .groupby(by=['number_candidates', 'rule_name'], observed=True)['regret'] \
+        .mean() \
+        .unstack(level='number_candidates') \
+        .sort_values(by=experiment_results_df['number_candidates'].max())
+    display(rules_mean_regret_df)
+
+
 def _plot_rules_winnings_comparison_graph(relevant_results_df: pd.DataFrame, graph_title: str):
     _display_title(graph_title, main_else_secondary=True)
     score_stats_per_subgroup_df = _results_to_score_stats_per_subgroup(
         relevant_results_df, subgroup_columns=DATASET_SETUP_DETAILS_COLUMNS)
+    ranked_score_stats_per_subgroup_df = _add_subgroups_score_ranks(
+        score_stats_per_subgroup_df, subgroup_columns=DATASET_SETUP_DETAILS_COLUMNS)
 
-    rule_to_accumulated_winnings_score = defaultdict(lambda: 0)
-    sum_components_count = 0
-    for _, trail_mean_df in score_stats_per_subgroup_df.groupby(by=[*DATASET_SETUP_DETAILS_COLUMNS]):
-        sum_components_count += 1
-
-        rule_name_to_winnings_score_0_to_1 = _calc_rule_to_winnings_score_in_trail_mean(trail_mean_df)
-        for rule_name, winnings_score_0_to_1 in rule_name_to_winnings_score_0_to_1.items():
-            rule_to_accumulated_winnings_score[rule_name] += winnings_score_0_to_1
-
-    rule_to_mean_winnings_score = {
-        rule_name: round(accumulated_winnings_score / sum_components_count, 4)
-        for rule_name, accumulated_winnings_score in rule_to_accumulated_winnings_score.items()
-    }
+    rule_to_mean_winnings_score = _calc_rule_to_mean_winnings_score(ranked_score_stats_per_subgroup_df)
     rule_to_mean_winnings_score = _sort_dict_by_vals(rule_to_mean_winnings_score, ascending=False)
     x = list(rule_to_mean_winnings_score.keys())
     y = list(rule_to_mean_winnings_score.values())
@@ -98,35 +204,47 @@ def _plot_rules_winnings_comparison_graph(relevant_results_df: pd.DataFrame, gra
 def _results_to_score_stats_per_subgroup(
     relevant_results_df: pd.DataFrame, subgroup_columns: Collection[str]
 ) -> pd.DataFrame:
-    score_stats_per_subgroup_df = relevant_results_df \
-        .groupby(by=[*subgroup_columns, 'rule_name']) \
-        .agg({"score": [np.mean, np.std]}) \
+    return relevant_results_df \
+        .groupby(by=[*subgroup_columns, 'rule_name'], observed=True)['score'] \
+        .agg(score_mean='mean', score_std='std') \
         .reset_index()
-    score_stats_per_subgroup_df['score_mean'] = score_stats_per_subgroup_df['score']['mean']
-    score_stats_per_subgroup_df['score_std'] = score_stats_per_subgroup_df['score']['std']
-    score_stats_per_subgroup_df.drop(columns=['score'], inplace=True)
-    return score_stats_per_subgroup_df
-
 
-def _calc_rule_to_winnings_score_in_trail_mean(trail_mean_df):
-    score_to_rules_ordered_by_score_desc = _calc_ordered_score_to_rules(trail_mean_df)
 
-    number_of_unique_scores = len(score_to_rules_ordered_by_score_desc)
-    rule_name_to_winnings_score_0_to_1 = {
-        rule_name: (number_of_unique_scores - rank_0_based) / number_of_unique_scores
-        for rank_0_based, (score, rule_names) in
-        enumerate(score_to_rules_ordered_by_score_desc)
-        for rule_name in rule_names
-    }
-    return rule_name_to_winnings_score_0_to_1
+def _add_subgroups_score_ranks(
+    score_stats_per_subgroup_df: pd.DataFrame, subgroup_columns: Collection[str]
+) -> pd.DataFrame:
+    # the rules of every subgroup are densely ranked by their mean score (so rules with the same mean score share a
+    # rank), and a rule's winnings score is `(number of unique scores - rank + 1) / number of unique scores`
+    subgroups_score_means = score_stats_per_subgroup_df.groupby(by=[*subgroup_columns], observed=True)['score_mean']
+    score_dense_rank = subgroups_score_means.rank(method='dense', ascending=False)
+    unique_scores_count = subgroups_score_means.transform('nunique')
+    return score_stats_per_subgroup_df.assign(
+        subgroup_index=subgroups_score_means.ngroup(),
+        score_dense_rank=score_dense_rank,
+        winnings_score_0_to_1=(unique_scores_count - score_dense_rank + 1) / unique_scores_count
+    )
 
 
-def _calc_ordered_score_to_rules(trail_mean_df) -> List[Tuple[float, List[str]]]:
-    score_to_rules = defaultdict(list)
-    for _, row in trail_mean_df.iterrows():
-        score_to_rules[row['score_mean'][0]].append(row['rule_name'][0])
-    score_to_rules_ordered_by_score_desc = sorted(list(score_to_rules.items()), key=lambda kvp: kvp[0], reverse=True)
-    return score_to_rules_ordered_by_score_desc
+def _calc_rule_to_mean_winnings_score(ranked_score_stats_per_subgroup_df: pd.DataFrame) -> dict:
+    # the rules are listed by their first appearance when going over the subgroups (in order) and over the rules of
+    # every subgroup by their mean score (descending) - which is how ties are ordered when sorting by the mean score.
+    # a rule gets 0 in the subgroups that it doesn't appear in
+    appearance_order = np.lexsort((
+        -ranked_score_stats_per_subgroup_df['score_mean'].to_numpy(),
+        ranked_score_stats_per_subgroup_df['subgroup_index'].to_numpy()
+    ))
+    rule_codes, rule_names = pd.factorize(ranked_score_stats_per_subgroup_df['rule_name'].to_numpy()[appearance_order])
+    # bincount adds up the scores of every rule one by one in subgroups order, so the sums are the same as a loop's
+    rules_accumulated_winnings_score = np.bincount(
+        rule_codes,
+        weights=ranked_score_stats_per_subgroup_df['winnings_score_0_to_1'].to_numpy()[appearance_order],
+        minlength=len(rule_names)
+    )
+    subgroups_count = ranked_score_stats_per_subgroup_df['subgroup_index'].nunique()
+    return {
+        rule_name: round(float(accumulated_winnings_score) / subgroups_count, 4)
+        for rule_name, accumulated_winnings_score in zip(rule_names, rules_accumulated_winnings_score)
+    }
 
 
 def _show_trail_inferable_subgroup_to_best_rules(relevant_results_df: pd.DataFrame, use_datapane_datatables: bool = False):
@@ -139,22 +257,17 @@ def _show_trail_inferable_subgroup_to_best_rules(relevant_results_df: pd.DataFra
     score_stats_per_subgroup_df = _results_to_score_stats_per_subgroup(
         relevant_results_without_borda_veto_hybrid_rule_df, subgroup_columns=inferable_subgroup_columns
     )
+    ranked_score_stats_per_subgroup_df = _add_subgroups_score_ranks(
+        score_stats_per_subgroup_df, subgroup_columns=inferable_subgroup_columns
+    )
 
-    trail_subgroup_to_best_rules_rows = []
-    for group_key, trail_mean_df in score_stats_per_subgroup_df.groupby(by=[*inferable_subgroup_columns]):
-        score_to_rules_ordered_by_score_desc = _calc_ordered_score_to_rules(trail_mean_df)
-        best_trail_rules = score_to_rules_ordered_by_score_desc[0][1]
-
-        row_dict = {
-            **{
-                key_col: group_key[i]
-                for i, key_col in enumerate(inferable_subgroup_columns)
-            },
-            'best_rules': str(best_trail_rules)
-        }
-        trail_subgroup_to_best_rules_rows.append(row_dict)
-
-    inferable_subgroup_to_best_rules_df = pd.DataFrame(data=trail_subgroup_to_best_rules_rows)
+    best_rules_per_subgroup_df = ranked_score_stats_per_subgroup_df[
+        ranked_score_stats_per_subgroup_df['score_dense_rank'] == 1
+    ]
+    inferable_subgroup_to_best_rules_df = best_rules_per_subgroup_df \
+        .groupby(by=[*inferable_subgroup_columns], observed=True)['rule_name'] \
+        .agg(lambda best_rule_names: str(list(best_rule_names))) \
+        .reset_index(name='best_rules')
 
     _display_title("inferable_subgroup_to_best_rules_df", main_else_secondary=True)
     display(table_display(inferable_subgroup_to_best_rules_df))
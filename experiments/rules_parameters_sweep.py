@@ -0,0 +1,177 @@
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from typing import Callable, Collection, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+from compsoc.profile import Profile
+from tqdm import tqdm
+
+from evaluation.eval_rule import generate_eval_profiles
+from evaluation.oracle import calc_oracle_topn_utilities
+from evaluation.utility_evaluator import calc_rankings_utilities
+from rules.borda_gamma_rule import calc_borda_gamma_rankings
+from rules.borda_veto_hybrid_rule import calc_borda_veto_hybrid_threshold_rankings
+from rules.k_approval_rule_percentage_version import calc_k_approval_percentage_rankings
+from utils.profile_arrays import get_profile_arrays
+from utils.voter_models import DEFAULT_VOTER_MODELS_GENERATOR, VoterModelsGenerator, validate_compsoc_voter_model
+
+# (profile, parameter values) -> the rankings of the profile by the rule with each of the values (values x candidate
+# indices)
+RankingsByParameterFunc = Callable[[Profile, np.ndarray], np.ndarray]
+
+RULE_FAMILY_NAME_TO_RANKINGS_FUNC: Dict[str, RankingsByParameterFunc] = {
+    'borda_gamma': calc_borda_gamma_rankings,
+    'k_approval_percentage': calc_k_approval_percentage_rankings,
+    'borda_veto_hybrid_threshold': calc_borda_veto_hybrid_threshold_rankings,
+}
+DATASET_SETUP_COLUMNS = ['voters_model', 'number_voters', 'number_candidates', 'distortion_ratio']
+
+
+@dataclass(frozen=True)
+class ParameterRange:
+    start: float
+    stop: float
+    points_count: int
+
+    @property
+    def values(self) -> np.ndarray:
+        return np.linspace(self.start, self.stop, self.points_count)
+
+
+@dataclass(frozen=True)
+class ParameterSweepResults:
+    """
+    * `response_surface_df` - the mean (and std) score and the mean regret of every parameter value, per dataset setup
+      and topn percentage.
+    * `best_parameters_df` - the parameter value with the best mean score, per dataset setup and topn percentage.
+    """
+    response_surface_df: pd.DataFrame
+    best_parameters_df: pd.DataFrame
+
+
+def sweep_rule_parameter(
+    rule_family_name: str,
+    parameter_values: Union[Sequence[float], ParameterRange],
+    voter_models: Collection[str],
+    top_n_percs: Collection[float],
+    numbers_voters: Collection[int],
+    numbers_candidates: Collection[int],
+    distortion_ratios: Collection[float],
+    eval_iterations_count: int,
+    run_in_parallel: bool,
+    random_seed: Optional[int] = None,
+    voter_models_generator: VoterModelsGenerator = DEFAULT_VOTER_MODELS_GENERATOR
+) -> ParameterSweepResults:
+    """
+    Evaluates a parameterized rule with every parameter value on the same profiles of every dataset setup. Per
+    profile, all the values are ranked at once, and only their distinct rankings are evaluated - in one pass per topn.
+    """
+    if rule_family_name not in RULE_FAMILY_NAME_TO_RANKINGS_FUNC:
+        raise ValueError(f"unknown rule family: '{rule_family_name}'")
+    if voter_models_generator == 'compsoc':
+        for voter_model in voter_models:
+            for number_candidates in numbers_candidates:
+                validate_compsoc_voter_model(voter_model, number_candidates)
+    parameter_values = (
+        parameter_values.values if isinstance(parameter_values, ParameterRange) else np.asarray(parameter_values)
+    )
+
+    dataset_setups = [
+        dict(
+            voters_model=voter_model,
+            number_voters=number_voters,
+            number_candidates=number_candidates,
+            distortion_ratio=distortion_ratio
+        )
+        for voter_model in voter_models
+        for number_voters in numbers_voters
+        for number_candidates in numbers_candidates
+        for distortion_ratio in distortion_ratios
+    ]
+    sweep_dataset_setup = partial(
+        _sweep_dataset_setup, rule_family_name=rule_family_name, parameter_values=parameter_values,
+        top_n_percs=list(top_n_percs), eval_iterations_count=eval_iterations_count, random_seed=random_seed,
+        voter_models_generator=voter_models_generator
+    )
+    if run_in_parallel:
+        # spawned (rather than forked) workers don't all inherit the same global random states
+        with ProcessPoolExecutor(
+            max_workers=os.cpu_count(), mp_context=multiprocessing.get_context('spawn')
+        ) as executor:
+            setups_response_surfaces_dfs = list(tqdm(
+                executor.map(sweep_dataset_setup, dataset_setups), total=len(dataset_setups)
+            ))
+    else:
+        setups_response_surfaces_dfs = [sweep_dataset_setup(dataset_setup) for dataset_setup in tqdm(dataset_setups)]
+
+    response_surface_df = pd.concat(setups_response_surfaces_dfs, ignore_index=True)
+    # ties are broken in favor of the first parameter value
+    best_parameters_indices = response_surface_df \
+        .groupby(by=[*DATASET_SETUP_COLUMNS, 'topn_perc'], sort=False)['score_mean'] \
+        .idxmax()
+    best_parameters_df = response_surface_df.loc[best_parameters_indices].reset_index(drop=True)
+    return ParameterSweepResults(response_surface_df=response_surface_df, best_parameters_df=best_parameters_df)
+
+
+def _sweep_dataset_setup(
+    dataset_setup: dict,
+    rule_family_name: str,
+    parameter_values: np.ndarray,
+    top_n_percs: List[float],
+    eval_iterations_count: int,
+    random_seed: Optional[int],
+    voter_models_generator: VoterModelsGenerator
+) -> pd.DataFrame:
+    calc_rankings = RULE_FAMILY_NAME_TO_RANKINGS_FUNC[rule_family_name]
+    topn_perc_to_topn = {
+        topn_perc: math.ceil(dataset_setup['number_candidates'] * (topn_perc / 100)) for topn_perc in top_n_percs
+    }
+    topn_perc_to_topn = {topn_perc: topn for topn_perc, topn in topn_perc_to_topn.items() if topn > 0}
+    # (topn percentage, iteration, parameter value)
+    scores = np.zeros((len(topn_perc_to_topn), eval_iterations_count, len(parameter_values)))
+    regrets = np.zeros_like(scores)
+
+    profiles = generate_eval_profiles(
+        **dataset_setup, iterations_count=eval_iterations_count, random_seed=random_seed,
+        voter_models_generator=voter_models_generator
+    )
+    for i, profile in enumerate(profiles):
+        profile_arrays = get_profile_arrays(profile)
+        unique_rankings, ranking_indices = np.unique(
+            calc_rankings(profile, parameter_values), axis=0, return_inverse=True
+        )
+        topn_to_oracle_score = calc_oracle_topn_utilities(profile, set(topn_perc_to_topn.values()))
+        for j, topn in enumerate(topn_perc_to_topn.values()):
+            _, unique_rankings_scores = calc_rankings_utilities(profile_arrays, unique_rankings, topn)
+            scores[j, i] = unique_rankings_scores[ranking_indices.reshape(-1)]
+            regrets[j, i] = topn_to_oracle_score[topn] - scores[j, i]
+
+    return pd.DataFrame(dict(
+        **{column: dataset_setup[column] for column in DATASET_SETUP_COLUMNS},
+        topn_perc=np.repeat(list(topn_perc_to_topn.keys()), len(parameter_values)),
+        parameter_value=np.tile(parameter_values, len(topn_perc_to_topn)),
+        score_mean=scores.mean(axis=1).reshape(-1),
+        score_std=scores.std(axis=1, ddof=1).reshape(-1) if eval_iterations_count > 1 else np.nan,
+        regret_mean=regrets.mean(axis=1).reshape(-1),
+    ))
+
+
+if __name__ == '__main__':
+    sweep_results = sweep_rule_parameter(
+        rule_family_name='borda_gamma',
+        parameter_values=ParameterRange(start=0.25, stop=1.0, points_count=301),
+        voter_models=('random', 'gaussian', 'multinomial_dirichlet'),
+        top_n_percs=(20, 40, 60, 80),
+        numbers_voters=(1_000,),
+        numbers_candidates=(5, 10, 20, 40),
+        distortion_ratios=(0.1, 0.5, 0.8),
+        eval_iterations_count=15,
+        run_in_parallel=True,
+        random_seed=42
+    )
+    print(sweep_results.best_parameters_df.to_string(index=False))
@@ -0,0 +1,234 @@
+import json
+import shutil
+import subprocess
+import tempfile
+import time
+from dataclasses import replace
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Collection, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from evaluation.eval_rule import generate_eval_profiles
+from evaluation.rankings import calc_rule_ranking
+from evaluation.utility_evaluator import calc_candidate_rankings_utilities
+from experiments.last_comp_stage_rules_comparison import PSEUDO_RULE_NAME_TO_RANKING_FUNC, RULE_NAME_TO_FUNC
+from experiments.trails_scheduling import PROFILE_GENERATION_COST_NAME, TrailsCostModel
+from utils.profile_arrays import ProfileArrays, get_profile_arrays
+from utils.profile_store import ProfileStore
+from utils.random_utils import spawn_rng
+from utils.voter_models import DEFAULT_VOTER_MODELS_GENERATOR, VoterModelsGenerator, to_profile
+
+BENCHMARK_HISTORY_FILE_PATH = Path(__file__).parent.parent / 'results' / 'rules_throughput_benchmarks_history.json'
+UTILITY_EVALUATION_COST_NAME = 'utility_evaluation'
+PROFILE_STORE_LOAD_COST_NAME = 'profile_store_load'
+BENCHMARK_REPEATS_COUNT = 3
+# a cost regressed if it got slower than in the last passing run by more than this ratio - by the geometric mean of
+# its slowdowns over the grid, in which the timings are floored to `BENCHMARK_MIN_SECONDS` to ignore timer noise
+BENCHMARK_REGRESSION_THRESHOLD = 0.25
+BENCHMARK_MIN_SECONDS = 1e-4
+
+
+def benchmark_rules_throughput(
+    voters_model: str,
+    numbers_voters: Collection[int],
+    numbers_candidates: Collection[int],
+    distortion_ratios: Collection[float],
+    rule_names: Optional[Collection[str]] = None,
+    repeats_count: int = BENCHMARK_REPEATS_COUNT,
+    random_seed: int = 42,
+    regression_threshold: float = BENCHMARK_REGRESSION_THRESHOLD,
+    voter_models_generator: VoterModelsGenerator = DEFAULT_VOTER_MODELS_GENERATOR
+) -> pd.DataFrame:
+    """
+    Times (by the best of `repeats_count` runs) the generation of a fixed-seed profile of every setup of the grid, its
+    ranking by every rule, and the evaluation of a ranking's utility. The profile is generated the way the experiments
+    do (by `generate_eval_profiles`, with `voter_models_generator`) - both into an empty profile store, and loaded
+    back from it (in a temporary folder, rather than the experiments' store). Fits the scaling exponents of every
+    cost in the numbers of voters and candidates, appends the run to the benchmarks history, and fails if any cost
+    regressed compared to the last passing run of the same grid.
+    """
+    rule_names = sorted(
+        rule_names if rule_names is not None else [*RULE_NAME_TO_FUNC.keys(), *PSEUDO_RULE_NAME_TO_RANKING_FUNC.keys()]
+    )
+    timings = []
+    for number_voters in numbers_voters:
+        for number_candidates in numbers_candidates:
+            for distortion_ratio in distortion_ratios:
+                dataset_setup = dict(
+                    voters_model=voters_model,
+                    number_voters=number_voters,
+                    number_candidates=number_candidates,
+                    distortion_ratio=distortion_ratio
+                )
+                print(f"benchmarking dataset setup: {dataset_setup}")
+                timings.extend(
+                    dict(cost_name=cost_name, **dataset_setup, seconds=seconds)
+                    for cost_name, seconds in _benchmark_dataset_setup(
+                        dataset_setup, rule_names, repeats_count, random_seed, voter_models_generator
+                    ).items()
+                )
+    timings_df = pd.DataFrame(timings)
+
+    grid = dict(
+        voters_model=voters_model,
+        numbers_voters=list(numbers_voters),
+        numbers_candidates=list(numbers_candidates),
+        distortion_ratios=list(distortion_ratios),
+        rule_names=rule_names,
+        random_seed=random_seed,
+        voter_models_generator=voter_models_generator
+    )
+    benchmarks_history = _load_benchmarks_history()
+    baseline_run = next((
+        run for run in reversed(benchmarks_history) if run['grid'] == grid and not run['regressed_cost_names']
+    ), None)
+    benchmark_df = _build_benchmark_df(timings_df, baseline_run, regression_threshold)
+    print(benchmark_df.to_string(index=False))
+
+    regressed_cost_names = benchmark_df.loc[benchmark_df['is_regressed'], 'cost_name'].tolist()
+    benchmarks_history.append(dict(
+        timestamp=datetime.now(timezone.utc).isoformat(),
+        git_commit=_get_git_commit(),
+        grid=grid,
+        timings=timings,
+        scaling_exponents={
+            row['cost_name']: dict(voters_exponent=row['voters_exponent'], candidates_exponent=row['candidates_exponent'])
+            for _, row in benchmark_df.iterrows()
+        },
+        regressed_cost_names=regressed_cost_names
+    ))
+    BENCHMARK_HISTORY_FILE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with open(BENCHMARK_HISTORY_FILE_PATH, 'w') as f:
+        json.dump(benchmarks_history, f, indent=4)
+
+    assert not regressed_cost_names, f"the throughput regressed: {regressed_cost_names}"
+    return benchmark_df
+
+
+def _benchmark_dataset_setup(
+    dataset_setup: dict,
+    rule_names: List[str],
+    repeats_count: int,
+    random_seed: int,
+    voter_models_generator: VoterModelsGenerator
+) -> dict:
+    # the same profile is generated in every repeat (and run)
+    generate_profile = lambda profile_store: generate_eval_profiles(
+        **dataset_setup, iterations_count=1, random_seed=random_seed, voter_models_generator=voter_models_generator,
+        profile_store=profile_store
+    )[0]
+    with tempfile.TemporaryDirectory() as store_folder_path:
+        store_folder_path = Path(store_folder_path)
+        cost_name_to_seconds = {
+            PROFILE_GENERATION_COST_NAME: _time_best_of(
+                generate_profile, repeats_count, setup_func=lambda: _create_empty_profile_store(store_folder_path)
+            ),
+            # the last repeat of the generation left the profile in the store
+            PROFILE_STORE_LOAD_COST_NAME: _time_best_of(
+                generate_profile, repeats_count, setup_func=lambda: ProfileStore(store_folder_path)
+            ),
+        }
+        # the rules get the profile as the experiments do - loaded from the store (the memory map of its positions
+        # outlives the temporary folder)
+        profile_arrays = get_profile_arrays(generate_profile(ProfileStore(store_folder_path)))
+
+    distorted = dataset_setup['distortion_ratio'] > 0
+    number_candidates = dataset_setup['number_candidates']
+    for rule_name in rule_names:
+        if rule_name in PSEUDO_RULE_NAME_TO_RANKING_FUNC:
+            calc_pseudo_rule_ranking = PSEUDO_RULE_NAME_TO_RANKING_FUNC[rule_name]
+            calc_ranking = lambda profile: calc_pseudo_rule_ranking(profile, number_candidates)
+        else:
+            rule = RULE_NAME_TO_FUNC[rule_name]
+            calc_ranking = lambda profile: calc_rule_ranking(profile, rule, spawn_rng(random_seed, rule_name))
+        cost_name_to_seconds[rule_name] = _time_best_of(
+            calc_ranking, repeats_count, setup_func=lambda: _to_fresh_profile(profile_arrays, distorted)
+        )
+
+    ranking = tuple(range(number_candidates))
+    cost_name_to_seconds[UTILITY_EVALUATION_COST_NAME] = _time_best_of(
+        lambda profile: calc_candidate_rankings_utilities(profile, [ranking], number_candidates),
+        repeats_count,
+        setup_func=lambda: _to_fresh_profile(profile_arrays, distorted)
+    )
+    return cost_name_to_seconds
+
+
+def _create_empty_profile_store(folder_path: Path) -> ProfileStore:
+    shutil.rmtree(folder_path)
+    folder_path.mkdir()
+    return ProfileStore(folder_path)
+
+
+def _to_fresh_profile(profile_arrays: ProfileArrays, distorted: bool):
+    # a copy of the arrays without their lazily derived arrays (e.g. the position counts), so no rule gets them from
+    # the rules that were timed before it
+    return to_profile(replace(profile_arrays), distorted)
+
+
+def _time_best_of(func: Callable, repeats_count: int, setup_func: Optional[Callable] = None) -> float:
+    repeats_seconds = []
+    for _ in range(repeats_count):
+        func_args = (setup_func(),) if setup_func is not None else ()
+        start_time = time.perf_counter()
+        func(*func_args)
+        repeats_seconds.append(time.perf_counter() - start_time)
+    return min(repeats_seconds)
+
+
+def _build_benchmark_df(
+    timings_df: pd.DataFrame, baseline_run: Optional[dict], regression_threshold: float
+) -> pd.DataFrame:
+    cost_model = TrailsCostModel.from_timings(timings_df)
+    benchmark_df = pd.DataFrame([
+        dict(
+            cost_name=cost_name,
+            voters_exponent=round(voters_exponent, 3),
+            candidates_exponent=round(candidates_exponent, 3),
+            total_seconds=round(timings_df.loc[timings_df['cost_name'] == cost_name, 'seconds'].sum(), 4),
+        )
+        for cost_name, (_, voters_exponent, candidates_exponent) in cost_model.cost_name_to_terms.items()
+    ])
+
+    if baseline_run is None:
+        return benchmark_df.assign(slowdown=np.nan, is_regressed=False)
+    setup_columns = ['cost_name', 'voters_model', 'number_voters', 'number_candidates', 'distortion_ratio']
+    compared_timings_df = timings_df.merge(
+        pd.DataFrame(baseline_run['timings']), on=setup_columns, suffixes=('', '_baseline')
+    )
+    log_slowdowns = np.log(
+        np.maximum(compared_timings_df['seconds'], BENCHMARK_MIN_SECONDS)
+        / np.maximum(compared_timings_df['seconds_baseline'], BENCHMARK_MIN_SECONDS)
+    )
+    cost_name_to_slowdown = np.exp(log_slowdowns.groupby(compared_timings_df['cost_name']).mean())
+    benchmark_df['slowdown'] = benchmark_df['cost_name'].map(cost_name_to_slowdown).round(3)
+    benchmark_df['is_regressed'] = benchmark_df['slowdown'] > 1 + regression_threshold
+    return benchmark_df
+
+
+def _load_benchmarks_history() -> List[dict]:
+    if not BENCHMARK_HISTORY_FILE_PATH.exists():
+        return []
+    with open(BENCHMARK_HISTORY_FILE_PATH) as f:
+        return json.load(f)
+
+
+def _get_git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=Path(__file__).parent, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == '__main__':
+    benchmark_rules_throughput(
+        voters_model='gaussian',
+        numbers_voters=(500, 1_000, 10_000),
+        numbers_candidates=(5, 10, 20, 40),
+        distortion_ratios=(0.1, 0.5, 0.9),
+    )
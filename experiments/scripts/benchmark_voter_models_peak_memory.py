@@ -0,0 +1,83 @@
+import multiprocessing
+import resource
+from typing import Collection
+
+import pandas as pd
+
+from utils.voter_models import (
+    DEFAULT_VOTER_MODELS_GENERATOR, VOTER_MODELS_GENERATION_MAX_MEMORY_BYTES, VoterModelsGenerator
+)
+
+# the generation may take its memory cap (see `VOTER_MODELS_GENERATION_MAX_MEMORY_BYTES`), plus this many bytes per
+# generated (iteration, voter, candidate) cell - for its output, and for aggregating it into the profiles the rules get
+PEAK_RSS_ALLOWED_BYTES_PER_CELL = 16
+
+
+def benchmark_voter_models_peak_memory(
+    voters_model: str,
+    numbers_candidates: Collection[int],
+    number_voters: int,
+    iterations_count: int,
+    voter_models_generator: VoterModelsGenerator = DEFAULT_VOTER_MODELS_GENERATOR
+) -> pd.DataFrame:
+    """
+    Measures the peak RSS increase of generating the profiles of every setup the way the experiments do (by
+    `generate_eval_profiles`), each in a fresh process, and fails if any of them exceeds the memory that a generation
+    that is linear in voters x candidates is allowed to take.
+    """
+    benchmark_rows = []
+    spawn_context = multiprocessing.get_context('spawn')
+    for number_candidates in numbers_candidates:
+        with spawn_context.Pool(processes=1) as pool:
+            peak_rss_increase_bytes = pool.apply(
+                _measure_generation_peak_rss_increase,
+                (voters_model, number_voters, number_candidates, iterations_count, voter_models_generator)
+            )
+        cells_count = iterations_count * number_voters * number_candidates
+        allowed_peak_rss_increase_bytes = \
+            VOTER_MODELS_GENERATION_MAX_MEMORY_BYTES + PEAK_RSS_ALLOWED_BYTES_PER_CELL * cells_count
+        benchmark_rows.append(dict(
+            voter_models_generator=voter_models_generator,
+            voters_model=voters_model,
+            number_voters=number_voters,
+            number_candidates=number_candidates,
+            iterations_count=iterations_count,
+            peak_rss_increase_mb=round(peak_rss_increase_bytes / 2 ** 20, 1),
+            allowed_peak_rss_increase_mb=round(allowed_peak_rss_increase_bytes / 2 ** 20, 1),
+            peak_rss_increase_bytes_per_cell=round(peak_rss_increase_bytes / cells_count, 2),
+            is_within_allowed=peak_rss_increase_bytes <= allowed_peak_rss_increase_bytes,
+        ))
+
+    benchmark_df = pd.DataFrame(benchmark_rows)
+    print(benchmark_df.to_string(index=False))
+    assert benchmark_df['is_within_allowed'].all(), "the peak memory of the generation regressed"
+    return benchmark_df
+
+
+def _measure_generation_peak_rss_increase(
+    voters_model: str,
+    number_voters: int,
+    number_candidates: int,
+    iterations_count: int,
+    voter_models_generator: VoterModelsGenerator
+) -> int:
+    from evaluation.eval_rule import generate_eval_profiles
+
+    # warms up the imports and the allocator, so the baseline peak includes them
+    generate_eval_profiles(voters_model, 10, number_candidates, 0.5, 1, voter_models_generator=voter_models_generator)
+    baseline_peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    generate_eval_profiles(
+        voters_model, number_voters, number_candidates, 0.5, iterations_count,
+        voter_models_generator=voter_models_generator
+    )
+    peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return (peak_rss_kb - baseline_peak_rss_kb) * 1024
+
+
+if __name__ == '__main__':
+    benchmark_voter_models_peak_memory(
+        voters_model='gaussian',
+        numbers_candidates=(20, 40, 80),
+        number_voters=10_000,
+        iterations_count=15
+    )
@@ -0,0 +1,121 @@
+import cProfile
+import io
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import ContextManager, List, Optional
+
+import pandas as pd
+
+TRAIL_STAGE_RANKING = 'ranking'
+TRAIL_STAGE_UTILITY_EVALUATION = 'utility_evaluation'
+TRAILS_STAGES_KEY_COLUMNS = ('eval_iter_index', 'rule_name', 'stage')
+TRAILS_COSTS_COLUMNS = (
+    'eval_iter_index', 'rule_name', 'stage', 'wall_seconds', 'cpu_seconds', 'peak_allocated_bytes'
+)
+TRAILS_PROFILES_FOLDER_NAME = 'trails_profiles'
+TRAIL_PROFILE_STATS_LINES_COUNT = 40
+
+
+class TrailsInstrumentation:
+    """
+    Measures the stages of the trails of a task (see `TRAIL_STAGE_...`), per rule and iteration - the wall time, the
+    CPU time (of the whole process) and the peak of the memory that was allocated during the stage, above the memory
+    that was allocated when it started (as traced by tracemalloc).
+    Tracing the allocations slows down every allocation, so the times and the peaks are measured in separate passes
+    over the trails - the stages that are measured within `tracing_memory` only record their peaks, and the rest only
+    record their times.
+    """
+
+    def __init__(self):
+        self.trails_stages_times: List[dict] = []
+        self.trails_stages_peaks: List[dict] = []
+        self._is_tracing_memory = False
+
+    @contextmanager
+    def tracing_memory(self):
+        has_started_tracing = not tracemalloc.is_tracing()
+        if has_started_tracing:
+            tracemalloc.start()
+        self._is_tracing_memory = True
+        try:
+            yield
+        finally:
+            self._is_tracing_memory = False
+            if has_started_tracing:
+                tracemalloc.stop()
+
+    @contextmanager
+    def measure(self, rule_names: List[str], eval_iter_index: int, stage: str):
+        # a stage that is shared by a few trails (e.g. evaluating the rankings of all the rules with the same topn)
+        # splits its times evenly between them, and each of them gets its whole peak
+        if self._is_tracing_memory:
+            start_allocated_bytes, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            yield
+            _, peak_allocated_bytes = tracemalloc.get_traced_memory()
+            self.trails_stages_peaks.extend(
+                dict(
+                    eval_iter_index=eval_iter_index,
+                    rule_name=rule_name,
+                    stage=stage,
+                    peak_allocated_bytes=peak_allocated_bytes - start_allocated_bytes
+                )
+                for rule_name in rule_names
+            )
+            return
+
+        start_wall_time, start_cpu_time = time.perf_counter(), time.process_time()
+        yield
+        wall_seconds = time.perf_counter() - start_wall_time
+        cpu_seconds = time.process_time() - start_cpu_time
+        self.trails_stages_times.extend(
+            dict(
+                eval_iter_index=eval_iter_index,
+                rule_name=rule_name,
+                stage=stage,
+                wall_seconds=wall_seconds / len(rule_names),
+                cpu_seconds=cpu_seconds / len(rule_names)
+            )
+            for rule_name in rule_names
+        )
+
+    def to_df(self) -> pd.DataFrame:
+        # a rule's stage may be measured a few times per iteration (e.g. the oracle ranks a profile once per topn)
+        trails_stages_times_df = pd.DataFrame(
+            self.trails_stages_times, columns=[*TRAILS_STAGES_KEY_COLUMNS, 'wall_seconds', 'cpu_seconds']
+        ) \
+            .groupby(by=list(TRAILS_STAGES_KEY_COLUMNS), sort=False) \
+            .agg(wall_seconds=('wall_seconds', 'sum'), cpu_seconds=('cpu_seconds', 'sum'))
+        return trails_stages_times_df \
+            .join(self.peaks_to_df().set_index(list(TRAILS_STAGES_KEY_COLUMNS)), how='left') \
+            .reset_index()[list(TRAILS_COSTS_COLUMNS)]
+
+    def peaks_to_df(self) -> pd.DataFrame:
+        return pd.DataFrame(self.trails_stages_peaks, columns=[*TRAILS_STAGES_KEY_COLUMNS, 'peak_allocated_bytes']) \
+            .groupby(by=list(TRAILS_STAGES_KEY_COLUMNS), sort=False) \
+            .agg(peak_allocated_bytes=('peak_allocated_bytes', 'max')) \
+            .reset_index()
+
+
+def measure_trails_stage(
+    instrumentation: Optional[TrailsInstrumentation], rule_names: List[str], eval_iter_index: int, stage: str
+) -> ContextManager:
+    if instrumentation is None:
+        return nullcontext()
+    return instrumentation.measure(rule_names, eval_iter_index, stage)
+
+
+def store_trail_profile(profiler: cProfile.Profile, trail_profile_file_path: Path):
+    """
+    Stores the raw stats (e.g. for snakeviz or `pstats.Stats`) and, next to them, a text summary of the functions
+    with the highest cumulative time.
+    """
+    profiler.dump_stats(trail_profile_file_path)
+    stats_stream = io.StringIO()
+    pstats.Stats(profiler, stream=stats_stream) \
+        .sort_stats(pstats.SortKey.CUMULATIVE) \
+        .print_stats(TRAIL_PROFILE_STATS_LINES_COUNT)
+    trail_profile_file_path.with_suffix('.txt').write_text(stats_stream.getvalue())
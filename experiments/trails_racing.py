@@ -0,0 +1,95 @@
+from typing import Dict, Hashable, List
+
+import numpy as np
+from scipy import stats
+
+RACING_DEFAULT_MIN_ITERATIONS = 5
+RACING_DEFAULT_CONFIDENCE_LEVEL = 0.95
+# why a trail stopped before the max number of iterations (or at it)
+STOP_REASON_DOMINATED = 'dominated'
+STOP_REASON_RACE_WON = 'race_won'
+STOP_REASON_MAX_ITERATIONS = 'max_iterations'
+
+
+class TrailsRace:
+    """
+    An F-race between contenders (e.g. the rules that rank the profiles of a dataset setup for the same topn) that
+    are scored on the same iterations. Once the contenders have `min_iterations` paired scores, every iteration
+    a Friedman test checks whether they differ at all, and if they do, the contenders that are significantly worse
+    than the best one (by a post-hoc test on their rank sums) are dropped. The race is won when a single contender is
+    left.
+    """
+
+    def __init__(self, contenders: List[Hashable], min_iterations: int, confidence_level: float):
+        self.contender_to_scores: Dict[Hashable, List[float]] = {contender: [] for contender in contenders}
+        self.min_iterations = min_iterations
+        self.confidence_level = confidence_level
+
+    @property
+    def contenders(self) -> List[Hashable]:
+        return list(self.contender_to_scores.keys())
+
+    @property
+    def iterations_count(self) -> int:
+        return len(next(iter(self.contender_to_scores.values())))
+
+    @property
+    def is_won(self) -> bool:
+        return len(self.contender_to_scores) == 1
+
+    def add_iteration_scores(self, contender_to_score: Dict[Hashable, float]) -> List[Hashable]:
+        """
+        Adds the scores of the contenders in an iteration, and returns the contenders that are dropped by it.
+        """
+        for contender, scores in self.contender_to_scores.items():
+            scores.append(contender_to_score[contender])
+        if len(self.contender_to_scores) < 2 or self.iterations_count < self.min_iterations:
+            return []
+
+        dominated_contenders_mask = find_dominated_contenders(
+            np.column_stack(list(self.contender_to_scores.values())), self.confidence_level
+        )
+        dominated_contenders = [
+            contender for contender, is_dominated in zip(self.contenders, dominated_contenders_mask) if is_dominated
+        ]
+        for contender in dominated_contenders:
+            del self.contender_to_scores[contender]
+        return dominated_contenders
+
+
+def find_dominated_contenders(contenders_scores: np.ndarray, confidence_level: float) -> np.ndarray:
+    """
+    Given the (iterations x contenders) matrix of paired scores (the higher the better), returns the mask of the
+    contenders that are significantly worse than the best one - by the Friedman test and its post-hoc comparisons
+    of rank sums (as in F-race, Birattari et al. 2002).
+    """
+    iterations_count, contenders_count = contenders_scores.shape
+    dominated_contenders_mask = np.zeros(contenders_count, dtype=bool)
+    if iterations_count < 2 or contenders_count < 2:
+        return dominated_contenders_mask
+
+    # in every iteration, the best contender is ranked 1 (and tied contenders share their mean rank)
+    ranks = stats.rankdata(-contenders_scores, axis=1)
+    ranks_sums = ranks.sum(axis=0)
+    ranks_squares_sum = np.sum(ranks ** 2)
+    ranks_squares_sum_if_all_tied = iterations_count * contenders_count * (contenders_count + 1) ** 2 / 4
+    ranks_variance_term = ranks_squares_sum - ranks_squares_sum_if_all_tied
+    if np.isclose(ranks_variance_term, 0):
+        # the contenders are tied in every iteration
+        return dominated_contenders_mask
+
+    friedman_statistic = (contenders_count - 1) * np.sum(
+        (ranks_sums - iterations_count * (contenders_count + 1) / 2) ** 2
+    ) / ranks_variance_term
+    significance_level = 1 - confidence_level
+    if stats.chi2.sf(friedman_statistic, contenders_count - 1) >= significance_level:
+        return dominated_contenders_mask
+
+    degrees_of_freedom = (iterations_count - 1) * (contenders_count - 1)
+    ranks_sums_diff_std = np.sqrt(max(
+        2 * iterations_count * (1 - friedman_statistic / (iterations_count * (contenders_count - 1)))
+        * ranks_variance_term / degrees_of_freedom,
+        0
+    ))
+    critical_ranks_sums_diff = stats.t.ppf(1 - significance_level / 2, degrees_of_freedom) * ranks_sums_diff_std
+    return ranks_sums - ranks_sums.min() > critical_ranks_sums_diff
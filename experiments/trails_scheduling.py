@@ -0,0 +1,200 @@
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+TRAILS_TIMINGS_FILE_PATH = Path(__file__).parent / 'results' / 'trails_timings.csv'
+PROFILE_GENERATION_COST_NAME = 'profile_generation'
+# only the latest timings of every cost name and (voters, candidates) size are kept, so the timings file stays small
+# and the cost model follows the current code
+TRAILS_TIMINGS_PER_SIZE_MAX_COUNT = 50
+TRAILS_TASKS_PER_WORKER = 4
+# until a rule's cost is learned from timings, it's assumed to be this many seconds per voter x candidate ...
+PRIOR_SECONDS_PER_VOTER_CANDIDATE = 1e-7
+# ... raised to these (voters, candidates) exponents
+DEFAULT_PRIOR_COST_EXPONENTS = (1.0, 1.0)
+RULE_NAME_TO_PRIOR_COST_EXPONENTS = {
+    'copeland': (1.0, 2.0),
+    'simpson': (1.0, 2.0),
+    'maximin': (1.0, 2.0),
+    'kemeny': (1.0, 3.0),
+    'stv': (1.0, 2.0),
+    'oracle': (1.0, 2.0),
+}
+# fitting the exponents too takes timings of at least this many different (voters, candidates) sizes
+MIN_SIZES_COUNT_TO_FIT_EXPONENTS = 3
+
+
+@dataclass(frozen=True)
+class TrailsCostModel:
+    """
+    Estimates the seconds it takes to rank a profile by a rule (or to generate it) as
+    `exp(log_coefficient) * number_voters ** voters_exponent * number_candidates ** candidates_exponent`,
+    per cost name (a rule name or `PROFILE_GENERATION_COST_NAME`). The terms are fitted (in log space) to the timings
+    of previous runs, and fall back to priors for cost names without timings.
+    """
+    cost_name_to_terms: Dict[str, Tuple[float, float, float]] = field(default_factory=dict)
+
+    @classmethod
+    def from_timings(cls, timings_df: pd.DataFrame) -> 'TrailsCostModel':
+        cost_name_to_terms = {}
+        for cost_name, cost_timings_df in timings_df.groupby('cost_name'):
+            log_seconds = np.log(np.maximum(cost_timings_df['seconds'].to_numpy(), 1e-6))
+            log_voters = np.log(cost_timings_df['number_voters'].to_numpy())
+            log_candidates = np.log(cost_timings_df['number_candidates'].to_numpy())
+
+            voters_exponent, candidates_exponent = _get_prior_cost_exponents(cost_name)
+            sizes_count = len(set(zip(log_voters, log_candidates)))
+            # an exponent of a size that is the same in all the timings can't be told apart from the coefficient (the
+            # fit would be rank-deficient), so it's kept at its prior
+            should_fit_voters_exponent = \
+                sizes_count >= MIN_SIZES_COUNT_TO_FIT_EXPONENTS and len(np.unique(log_voters)) > 1
+            should_fit_candidates_exponent = \
+                sizes_count >= MIN_SIZES_COUNT_TO_FIT_EXPONENTS and len(np.unique(log_candidates)) > 1
+            prior_log_seconds = \
+                (0 if should_fit_voters_exponent else voters_exponent) * log_voters \
+                + (0 if should_fit_candidates_exponent else candidates_exponent) * log_candidates
+            features = np.column_stack([
+                np.ones_like(log_voters),
+                *([log_voters] if should_fit_voters_exponent else []),
+                *([log_candidates] if should_fit_candidates_exponent else []),
+            ])
+            fitted_terms = iter(np.linalg.lstsq(features, log_seconds - prior_log_seconds, rcond=None)[0])
+            log_coefficient = next(fitted_terms)
+            if should_fit_voters_exponent:
+                voters_exponent = next(fitted_terms)
+            if should_fit_candidates_exponent:
+                candidates_exponent = next(fitted_terms)
+            cost_name_to_terms[cost_name] = (float(log_coefficient), float(voters_exponent), float(candidates_exponent))
+        return cls(cost_name_to_terms=cost_name_to_terms)
+
+    def calc_cost(self, cost_name: str, number_voters: int, number_candidates: int) -> float:
+        log_coefficient, voters_exponent, candidates_exponent = self.cost_name_to_terms.get(
+            cost_name, (np.log(PRIOR_SECONDS_PER_VOTER_CANDIDATE), *_get_prior_cost_exponents(cost_name))
+        )
+        return float(
+            np.exp(log_coefficient) * number_voters ** voters_exponent * number_candidates ** candidates_exponent
+        )
+
+
+def load_trails_cost_model() -> TrailsCostModel:
+    if not TRAILS_TIMINGS_FILE_PATH.exists():
+        return TrailsCostModel()
+    return TrailsCostModel.from_timings(pd.read_csv(TRAILS_TIMINGS_FILE_PATH))
+
+
+def store_trails_timings(timings: List[dict]):
+    # the timings file is rewritten aside and renamed into place, so a crash never leaves it partial
+    if not timings:
+        return
+    timings_df = pd.DataFrame(timings)
+    if TRAILS_TIMINGS_FILE_PATH.exists():
+        timings_df = pd.concat([pd.read_csv(TRAILS_TIMINGS_FILE_PATH), timings_df], ignore_index=True)
+    timings_df = timings_df \
+        .groupby(by=['cost_name', 'number_voters', 'number_candidates'], sort=False) \
+        .tail(TRAILS_TIMINGS_PER_SIZE_MAX_COUNT)
+    TRAILS_TIMINGS_FILE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    temp_timings_file_path = TRAILS_TIMINGS_FILE_PATH.with_name(f'.{TRAILS_TIMINGS_FILE_PATH.name}')
+    timings_df.to_csv(temp_timings_file_path, index=False)
+    temp_timings_file_path.replace(TRAILS_TIMINGS_FILE_PATH)
+
+
+def split_trails_to_tasks(
+    trails_params: List[dict],
+    eval_iterations_per_rule: int,
+    cost_model: TrailsCostModel,
+    workers_count: int,
+    can_split_rules: bool = True
+) -> List[dict]:
+    """
+    Splits the trails of every dataset setup into (setup, iterations chunk, rules group) tasks of about the same
+    estimated cost - small enough for `TRAILS_TASKS_PER_WORKER` tasks per worker. Setups are first split by
+    iterations, and only setups whose single iteration is still too heavy are split by groups of rules too (unless
+    `can_split_rules` is false - e.g. when the profiles aren't seeded, so every task would generate other profiles
+    for the same iterations).
+    Returns the tasks, heaviest first.
+    """
+    setups_costs = [_calc_setup_iteration_costs(trail_params, cost_model) for trail_params in trails_params]
+    total_cost = eval_iterations_per_rule * sum(
+        generation_cost + sum(rule_name_to_cost.values()) for generation_cost, rule_name_to_cost in setups_costs
+    )
+    target_task_cost = total_cost / (workers_count * TRAILS_TASKS_PER_WORKER)
+
+    tasks = []
+    for setup_index, trail_params in enumerate(trails_params):
+        generation_cost, rule_name_to_cost = setups_costs[setup_index]
+        rules_groups = _group_rules_by_cost(rule_name_to_cost, max_group_cost=target_task_cost - generation_cost) \
+            if can_split_rules else [list(rule_name_to_cost.keys())]
+        for rules_group in rules_groups:
+            iteration_cost = generation_cost + sum(rule_name_to_cost[rule_name] for rule_name in rules_group)
+            iterations_chunk_size = int(np.clip(target_task_cost // iteration_cost, 1, eval_iterations_per_rule))
+            for first_iteration in range(0, eval_iterations_per_rule, iterations_chunk_size):
+                iterations_count = min(iterations_chunk_size, eval_iterations_per_rule - first_iteration)
+                tasks.append(dict(
+                    setup_index=setup_index,
+                    trail_params=dict(
+                        dataset_setup=trail_params['dataset_setup'],
+                        evaluation_params=[
+                            eval_params for eval_params in trail_params['evaluation_params']
+                            if eval_params['rule_name'] in rules_group
+                        ]
+                    ),
+                    first_iteration=first_iteration,
+                    iterations_count=iterations_count,
+                    estimated_cost=iterations_count * iteration_cost,
+                ))
+
+    return sorted(tasks, key=lambda task: task['estimated_cost'], reverse=True)
+
+
+def split_trails_to_setups_tasks(
+    trails_params: List[dict], eval_iterations_per_rule: int, cost_model: TrailsCostModel
+) -> List[dict]:
+    """
+    A task per dataset setup, with all its trails and iterations (e.g. for racing its rules). Returns the tasks,
+    heaviest first.
+    """
+    tasks = []
+    for setup_index, trail_params in enumerate(trails_params):
+        generation_cost, rule_name_to_cost = _calc_setup_iteration_costs(trail_params, cost_model)
+        tasks.append(dict(
+            setup_index=setup_index,
+            trail_params=trail_params,
+            first_iteration=0,
+            iterations_count=eval_iterations_per_rule,
+            estimated_cost=eval_iterations_per_rule * (generation_cost + sum(rule_name_to_cost.values())),
+        ))
+    return sorted(tasks, key=lambda task: task['estimated_cost'], reverse=True)
+
+
+def _calc_setup_iteration_costs(trail_params: dict, cost_model: TrailsCostModel) -> Tuple[float, Dict[str, float]]:
+    number_voters = trail_params['dataset_setup']['number_voters']
+    number_candidates = trail_params['dataset_setup']['number_candidates']
+    generation_cost = cost_model.calc_cost(PROFILE_GENERATION_COST_NAME, number_voters, number_candidates)
+    rule_name_to_cost = {
+        eval_params['rule_name']: cost_model.calc_cost(eval_params['rule_name'], number_voters, number_candidates)
+        for eval_params in trail_params['evaluation_params']
+    }
+    return generation_cost, rule_name_to_cost
+
+
+def _group_rules_by_cost(rule_name_to_cost: Dict[str, float], max_group_cost: float) -> List[List[str]]:
+    # first fit decreasing - a rule that is heavier than the max cost by itself gets its own group
+    groups, groups_costs = [], []
+    for rule_name, cost in sorted(rule_name_to_cost.items(), key=lambda kvp: kvp[1], reverse=True):
+        group_index = next(
+            (i for i, group_cost in enumerate(groups_costs) if group_cost + cost <= max_group_cost), None
+        )
+        if group_index is None:
+            groups.append([rule_name])
+            groups_costs.append(cost)
+        else:
+            groups[group_index].append(rule_name)
+            groups_costs[group_index] += cost
+    return groups
+
+
+def _get_prior_cost_exponents(cost_name: str) -> Tuple[float, float]:
+    return RULE_NAME_TO_PRIOR_COST_EXPONENTS.get(cost_name, DEFAULT_PRIOR_COST_EXPONENTS)
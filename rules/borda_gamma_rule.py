@@ -1,13 +1,24 @@
+import numpy as np
 from compsoc.profile import Profile
 
+from rules.positional_scoring_rule import (
+    PositionalScoringRule, calc_positional_scores_by_vectors, rank_candidates_by_scores
+)
+from utils.profile_arrays import get_profile_arrays
+
 
 def build_borda_gamma_rule(gamma: float):
-    def borda_gamma_rule(profile: Profile, candidate: int) -> int:
-        scores = [
-            frequency * (gamma ** ballot.index(candidate))
-            for frequency, ballot in profile.pairs
-            if candidate in ballot
-        ]
-        return sum(scores)
-
-    return borda_gamma_rule
+    return PositionalScoringRule(
+        'borda_gamma_rule', lambda number_candidates: borda_gamma_score_vector(number_candidates, gamma)
+    )
+
+
+def borda_gamma_score_vector(number_candidates: int, gamma: float) -> np.ndarray:
+    return gamma ** np.arange(number_candidates)
+
+
+def calc_borda_gamma_rankings(profile: Profile, gammas: np.ndarray) -> np.ndarray:
+    # the rankings of the profile by many gammas at once (gammas x candidate indices)
+    number_candidates = get_profile_arrays(profile).number_candidates
+    score_vectors = np.asarray(gammas, dtype=np.float64)[None, :] ** np.arange(number_candidates)[:, None]
+    return rank_candidates_by_scores(calc_positional_scores_by_vectors(profile, score_vectors, np.zeros(len(gammas))))
@@ -1,12 +1,8 @@
-from compsoc.profile import Profile
+from rules.borda_gamma_rule import borda_gamma_score_vector
+from rules.positional_scoring_rule import PositionalScoringRule
 
 GAMMA = 0.1
 
-
-def borda_gamma_rule(profile: Profile, candidate: int) -> int:
-    scores = [
-        frequency * (GAMMA ** ballot.index(candidate))
-        for frequency, ballot in profile.pairs
-        if candidate in ballot
-    ]
-    return sum(scores)
+borda_gamma_rule = PositionalScoringRule(
+    'borda_gamma_rule', lambda number_candidates: borda_gamma_score_vector(number_candidates, GAMMA)
+)
@@ -1,11 +1,11 @@
-from compsoc.profile import Profile
+import numpy as np
 
+from rules.positional_scoring_rule import PositionalScoringRule
 
-def borda_rule(profile: Profile, candidate: int) -> int:
-    top_score = len(profile.candidates) - 1
-    scores = [
-        frequency * (top_score - ballot.index(candidate))
-        for frequency, ballot in profile.pairs
-        if candidate in ballot
-    ]
-    return sum(scores)
+
+def _borda_score_vector(number_candidates: int) -> np.ndarray:
+    top_score = number_candidates - 1
+    return top_score - np.arange(number_candidates)
+
+
+borda_rule = PositionalScoringRule('borda_rule', _borda_score_vector)
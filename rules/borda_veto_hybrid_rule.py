@@ -1,35 +1,33 @@
+from typing import Dict
+
+import numpy as np
 from compsoc.profile import Profile
 
+from rules.borda_rule import borda_rule
+from rules.positional_scoring_rule import calc_positional_scores, rank_candidates_by_scores
+from rules.score_all_rule import score_all_rule
+from rules.veto_rule import veto_rule
+from utils.profile_stats import get_profile_stats
+
 BORDA_VETO_DISTORTION_RATIO_THRESHOLD = 0.8
 
 
-def borda_veto_hybrid_rule(profile: Profile, candidate: int) -> int:
-    # calculate the distortion ratio of the profile
-    average_ballot_length = sum(len(ballot) for _, ballot in profile.pairs) / len(profile.pairs)
-    profile_distortion_ratio = 1 - (average_ballot_length / len(profile.candidates))
+@score_all_rule
+def borda_veto_hybrid_rule(profile: Profile) -> Dict[int, int]:
+    # the distortion ratio of the profile (averaged over its unique ballots)
+    profile_distortion_ratio = get_profile_stats(profile).unique_ballots_distortion_ratio
 
     if profile_distortion_ratio >= BORDA_VETO_DISTORTION_RATIO_THRESHOLD:
-        # veto rule:
-        veto_score = 0
-
-        for frequency, ballot in profile.pairs:
-            ballot_is_distorted = len(ballot) != len(profile.candidates)
-
-            if ballot_is_distorted:
-                candidate_is_last_in_ballot = candidate not in ballot
-            else:
-                candidate_is_last_in_ballot = ballot[-1] == candidate
+        return veto_rule.score_all(profile)
+    else:
+        return borda_rule.score_all(profile)
 
-            if candidate_is_last_in_ballot:
-                veto_score += frequency
 
-        return -veto_score
-    else:
-        # borda rule
-        top_score = len(profile.candidates) - 1
-        scores = [
-            frequency * (top_score - ballot.index(candidate))
-            for frequency, ballot in profile.pairs
-            if candidate in ballot
-        ]
-        return sum(scores)
+def calc_borda_veto_hybrid_threshold_rankings(profile: Profile, thresholds: np.ndarray) -> np.ndarray:
+    # the rankings of the profile by the hybrid rule with many distortion ratio thresholds at once (thresholds x
+    # candidate indices) - each is either the borda ranking or the veto ranking
+    profile_distortion_ratio = get_profile_stats(profile).unique_ballots_distortion_ratio
+    borda_ranking, veto_ranking = rank_candidates_by_scores(calc_positional_scores(profile, [borda_rule, veto_rule]))
+    return np.where(
+        (profile_distortion_ratio >= np.asarray(thresholds))[:, None], veto_ranking[None, :], borda_ranking[None, :]
+    )
@@ -1,50 +1,21 @@
-import itertools
-import math
-from functools import lru_cache
+from typing import Dict
 
 from compsoc.profile import Profile
-from tqdm import tqdm
 
+from rules.score_all_rule import score_all_rule
+from utils.kemeny import solve_kemeny
+from utils.pairwise_majority import get_preference_matrix
+from utils.profile_arrays import get_profile_arrays
 
-def kemeny_rule(profile: Profile, candidate: int) -> int:
-    candidates = tuple(profile.candidates)
-    pairs = tuple(profile.pairs)
 
-    candidate_to_score = _clac_kemeny_scores(candidates, pairs)
-
-    candidate_score = candidate_to_score[candidate]
-    return candidate_score
-
-
-@lru_cache(maxsize=1)
-def _clac_kemeny_scores(candidates, pairs):
-    num_candidates = len(candidates)
-    all_permutations = itertools.permutations(candidates)
-    min_distance = float('inf')
-
-    candidate_ranking = None
-    # for permutation in all_permutations:
-    for permutation in tqdm(all_permutations, total=math.factorial(num_candidates), desc="kemeny_rule main loop"):
-        distance = 0
-        for frequency, ballot in pairs:
-
-            # Calculate the Kendall tau distance between ballot and permutation
-            n = len(ballot)
-            tau_distance = 0
-            for i in range(n):
-                for j in range(i + 1, n):
-                    if (ballot[i] < ballot[j] and permutation[i] > permutation[j]) or (
-                            ballot[i] > ballot[j] and permutation[i] < permutation[j]):
-                        tau_distance += 1
-
-            distance += tau_distance * frequency
-
-        if distance < min_distance:
-            min_distance = distance
-            candidate_ranking = list(permutation)
+@score_all_rule
+def kemeny_rule(profile: Profile) -> Dict[int, int]:
+    profile_arrays = get_profile_arrays(profile)
+    kemeny_result = solve_kemeny(get_preference_matrix(profile))
 
+    num_candidates = len(profile.candidates)
     candidate_to_score = {
-        c: num_candidates - i
-        for i, c in enumerate(candidate_ranking)
+        int(profile_arrays.candidates[c]): num_candidates - i
+        for i, c in enumerate(kemeny_result.ranking)
     }
     return candidate_to_score
@@ -1,11 +1,15 @@
+from typing import Dict
+
 import numpy as np
 from compsoc.profile import Profile
 
+from rules.score_all_rule import score_all_rule
+from utils.pairwise_majority import get_net_preference_matrix
+from utils.profile_arrays import get_profile_arrays
+
 
-def copeland_rule(profile: Profile, candidate: int) -> int:
-    scores = []
-    for m in profile.candidates:
-        preference = profile.get_net_preference(candidate, m)  # preference over m
-        scores.append(np.sign(preference))  # win or not
-    # Return the total score
-    return sum(scores)
+@score_all_rule
+def copeland_rule(profile: Profile) -> Dict[int, int]:
+    net_preference_matrix = get_net_preference_matrix(profile)
+    scores = np.sign(net_preference_matrix).sum(axis=1)  # number of wins minus number of losses
+    return get_profile_arrays(profile).by_candidate(scores)
@@ -1,11 +1,12 @@
-from compsoc.profile import Profile
+import numpy as np
 
+from rules.positional_scoring_rule import PositionalScoringRule
 
-def dowdall_rule(profile: Profile, candidate: int) -> int:
-    top_score = len(profile.candidates) - 1
-    scores = [
-        frequency * ((top_score - ballot.index(candidate)) / (ballot.index(candidate) + 1))
-        for frequency, ballot in profile.pairs
-        if candidate in ballot
-    ]
-    return sum(scores)
+
+def _dowdall_score_vector(number_candidates: int) -> np.ndarray:
+    top_score = number_candidates - 1
+    positions = np.arange(number_candidates)
+    return (top_score - positions) / (positions + 1)
+
+
+dowdall_rule = PositionalScoringRule('dowdall_rule', _dowdall_score_vector)
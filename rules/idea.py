@@ -1,24 +1,25 @@
-import itertools
-import math
-from functools import lru_cache
+from typing import Dict
 
+import numpy as np
 from compsoc.profile import Profile
-from tqdm import tqdm
 
 from rules.borda_rule import borda_rule
 from rules.chatGPTs_kemeny_rule import kemeny_rule
 from rules.copeland_rule import copeland_rule
 from rules.k_approval_rule_submission_version import k_approval_rule
 from rules.plurality_rule import plurality_rule
+from rules.score_all_rule import score_all_rule
 from rules.veto_rule import veto_rule
+from utils.kemeny import KEMENY_EXACT_MAX_CANDIDATES_COUNT, solve_kemeny_exact
+from utils.pairwise_majority import get_preference_matrix
+from utils.profile_arrays import get_profile_arrays
 
-KEMENY_RULE_MAX_SUPPORTED_CANDIDATES_COUNT = 9
+KEMENY_RULE_MAX_SUPPORTED_CANDIDATES_COUNT = KEMENY_EXACT_MAX_CANDIDATES_COUNT
 
 
-def idea_rule(profile: Profile, candidate: int) -> int:
-    candidate_to_heuristic_score = dict()
-    for c in profile.candidates:
-        candidate_to_heuristic_score[c] = borda_rule(profile, c)
+@score_all_rule
+def idea_rule(profile: Profile) -> Dict[int, int]:
+    candidate_to_heuristic_score = borda_rule.score_all(profile)
 
     candidates_sorted_by_heuristic_score_asc = list(sorted(
         candidate_to_heuristic_score.keys(), key=lambda c_: candidate_to_heuristic_score[c_])
@@ -26,54 +27,26 @@ def idea_rule(profile: Profile, candidate: int) -> int:
     candidates_for_kemeny_rule = candidates_sorted_by_heuristic_score_asc[-KEMENY_RULE_MAX_SUPPORTED_CANDIDATES_COUNT:]
     candidates_excluded_from_kemeny_rule = [c for c in candidates_sorted_by_heuristic_score_asc if c not in candidates_for_kemeny_rule]
 
-    if candidate in candidates_excluded_from_kemeny_rule:
-        final_score = -(list(reversed(candidates_excluded_from_kemeny_rule)).index(candidate) + 1)
-    else:
-        candidate_to_score = _clac_kemeny_scores(tuple(profile.candidates), tuple(profile.pairs), tuple(candidates_for_kemeny_rule))
-        # pairs_with_best_candidates = {
-        #     (frequency, tuple(c for c in ballot if c in candidates_for_kemeny_rule))
-        #     for frequency, ballot in profile.pairs
-        # }
-        # profile_with_best_candidates = Profile(
-        #     pairs=pairs_with_best_candidates,
-        #     num_candidates=KEMENY_RULE_MAX_SUPPORTED_CANDIDATES_COUNT,
-        #     distorted=True
-        # )
-        final_score = candidate_to_score[candidate]
-
-    print(dict(candiadte=candidate, final_score=final_score))
-    return final_score
-
-
-@lru_cache(maxsize=1)
-def _clac_kemeny_scores(candidates, pairs, candidates_to_consider):
-    num_candidates = len(candidates)
-    all_permutations = itertools.permutations(candidates_to_consider)
-    min_distance = float('inf')
-
-    candidate_ranking = None
-    # for permutation in all_permutations:
-    for permutation in tqdm(all_permutations, total=math.factorial(len(candidates_to_consider)), desc="kemeny_rule main loop", leave=False):
-        distance = 0
-        for frequency, ballot in pairs:
-
-            # Calculate the Kendall tau distance between ballot and permutation
-            n = len(permutation)
-            tau_distance = 0
-            for i in range(n):
-                for j in range(i + 1, n):
-                    if (ballot[i] < ballot[j] and permutation[i] > permutation[j]) or (
-                            ballot[i] > ballot[j] and permutation[i] < permutation[j]):
-                        tau_distance += 1
+    candidate_to_score = _clac_kemeny_scores(profile, candidates_for_kemeny_rule)
+    return {
+        **candidate_to_score,
+        **{
+            candidate: -(i + 1)
+            for i, candidate in enumerate(reversed(candidates_excluded_from_kemeny_rule))
+        }
+    }
 
-            distance += tau_distance * frequency
 
-        if distance < min_distance:
-            min_distance = distance
-            candidate_ranking = list(permutation)
+def _clac_kemeny_scores(profile: Profile, candidates_to_consider) -> Dict[int, int]:
+    # the preference matrix restricted to some candidates is the one of the ballots restricted to them
+    profile_arrays = get_profile_arrays(profile)
+    candidate_indices = np.array([profile_arrays.candidate_index(c) for c in candidates_to_consider])
+    preference_matrix = get_preference_matrix(profile)[np.ix_(candidate_indices, candidate_indices)]
+    kemeny_result = solve_kemeny_exact(preference_matrix)
 
+    num_candidates = len(profile.candidates)
     candidate_to_score = {
-        c: num_candidates - i
-        for i, c in enumerate(candidate_ranking)
+        candidates_to_consider[c]: num_candidates - i
+        for i, c in enumerate(kemeny_result.ranking)
     }
     return candidate_to_score
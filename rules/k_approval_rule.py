@@ -1,15 +1,11 @@
-from compsoc.profile import Profile
+import numpy as np
 
+from rules.positional_scoring_rule import PositionalScoringRule
 
-def build_k_approval_rule(k: int):
-    def k_approval_rule(profile: Profile, candidate: int) -> int:
-        candidate_scores = {c: 0 for c in profile.candidates}
 
-        for frequency, ballot in profile.pairs:
-            approved_candidates = ballot[:k]
-            for approved_candidate in approved_candidates:
-                candidate_scores[approved_candidate] += frequency
+def build_k_approval_rule(k: int):
+    return PositionalScoringRule('k_approval_rule', lambda number_candidates: k_approval_score_vector(number_candidates, k))
 
-        return candidate_scores[candidate]
 
-    return k_approval_rule
+def k_approval_score_vector(number_candidates: int, k: int) -> np.ndarray:
+    return (np.arange(number_candidates) < k).astype(np.int64)
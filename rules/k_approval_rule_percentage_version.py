@@ -1,14 +1,34 @@
 import math
+
+import numpy as np
 from compsoc.profile import Profile
 
-from rules.k_approval_rule import build_k_approval_rule
+from rules.k_approval_rule import k_approval_score_vector
+from rules.positional_scoring_rule import (
+    PositionalScoringRule, calc_positional_scores_by_vectors, rank_candidates_by_scores
+)
+from utils.profile_arrays import get_profile_arrays
 
 
 def build_k_approval_rule_percentage_version(k_percentage: float):
-    def k_approval_rule_percentage_version(profile: Profile, candidate: int) -> int:
-        k = max(math.ceil(len(profile.candidates) * (k_percentage / 100)), 2)
-        final_rule = build_k_approval_rule(k)
-        score = final_rule(profile, candidate)
-        return score
+    def k_approval_percentage_score_vector(number_candidates: int) -> np.ndarray:
+        return k_approval_score_vector(number_candidates, _calc_k(number_candidates, k_percentage))
+
+    return PositionalScoringRule('k_approval_rule_percentage_version', k_approval_percentage_score_vector)
+
+
+def calc_k_approval_percentage_rankings(profile: Profile, k_percentages: np.ndarray) -> np.ndarray:
+    # the rankings of the profile by many k percentages at once (k percentages x candidate indices) - the percentages
+    # only map to a few distinct k values, so only they are scored
+    number_candidates = get_profile_arrays(profile).number_candidates
+    ks = np.array([_calc_k(number_candidates, k_percentage) for k_percentage in k_percentages], dtype=np.int64)
+    unique_ks, k_indices = np.unique(ks, return_inverse=True)
+    score_vectors = (np.arange(number_candidates)[:, None] < unique_ks[None, :]).astype(np.int64)
+    unique_ks_rankings = rank_candidates_by_scores(
+        calc_positional_scores_by_vectors(profile, score_vectors, np.zeros(len(unique_ks), dtype=np.int64))
+    )
+    return unique_ks_rankings[k_indices]
+
 
-    return k_approval_rule_percentage_version
+def _calc_k(number_candidates: int, k_percentage: float) -> int:
+    return max(math.ceil(number_candidates * (k_percentage / 100)), 2)
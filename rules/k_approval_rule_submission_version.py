@@ -1,14 +1,8 @@
-from compsoc.profile import Profile
+from rules.k_approval_rule import k_approval_score_vector
+from rules.positional_scoring_rule import PositionalScoringRule
 
 K = 9
 
-
-def k_approval_rule(profile: Profile, candidate: int) -> int:
-    candidate_scores = {c: 0 for c in profile.candidates}
-
-    for frequency, ballot in profile.pairs:
-        approved_candidates = ballot[:K]
-        for approved_candidate in approved_candidates:
-            candidate_scores[approved_candidate] += frequency
-
-    return candidate_scores[candidate]
+k_approval_rule = PositionalScoringRule(
+    'k_approval_rule', lambda number_candidates: k_approval_score_vector(number_candidates, K)
+)
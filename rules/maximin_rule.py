@@ -1,14 +1,20 @@
+from typing import Dict
+
+import numpy as np
 from compsoc.profile import Profile
 
+from rules.score_all_rule import score_all_rule
+from utils.pairwise_majority import get_net_preference_matrix
+from utils.profile_arrays import get_profile_arrays
 
-def maximin_rule(profile: Profile, candidate: int) -> int:
-    possible_x_scores = []
 
-    x = candidate
-    for frequency, ballot in profile.pairs:
-        for y in profile.candidates:
-            if y != candidate:
-                preference = profile.get_net_preference(x, y)
-                n_x_gt_y = frequency if preference > 0 else 0
-                possible_x_scores.append(n_x_gt_y)
-    return min(possible_x_scores)
+@score_all_rule
+def maximin_rule(profile: Profile) -> Dict[int, int]:
+    # the score of x is the minimum over all (pair, y) of the pair's frequency if x beats y (else 0), so it doesn't
+    # depend on the ballots themselves: the smallest pair frequency if x beats every other candidate, and 0 otherwise
+    profile_arrays = get_profile_arrays(profile)
+    net_preference_matrix = get_net_preference_matrix(profile)
+    is_self = np.eye(len(net_preference_matrix), dtype=bool)
+    beats_all = ((net_preference_matrix > 0) | is_self).all(axis=1)
+    scores = np.where(beats_all, profile_arrays.frequencies.min(), 0)
+    return profile_arrays.by_candidate(scores)
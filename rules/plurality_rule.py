@@ -1,10 +1,12 @@
-from compsoc.profile import Profile
+import numpy as np
 
+from rules.positional_scoring_rule import PositionalScoringRule
 
-def plurality_rule(profile: Profile, candidate: int) -> int:
-    candidate_score = sum(
-        frequency
-        for frequency, ballot in profile.pairs
-        if ballot[0] == candidate
-    )
-    return candidate_score
+
+def _plurality_score_vector(number_candidates: int) -> np.ndarray:
+    score_vector = np.zeros(number_candidates, dtype=np.int64)
+    score_vector[0] = 1
+    return score_vector
+
+
+plurality_rule = PositionalScoringRule('plurality_rule', _plurality_score_vector)
@@ -0,0 +1,73 @@
+from typing import Callable, Dict, Sequence
+
+import numpy as np
+from compsoc.profile import Profile
+
+from utils.profile_arrays import get_profile_arrays
+from utils.profile_cache import cached_per_profile
+
+ScoreVectorFunc = Callable[[int], np.ndarray]
+
+
+class PositionalScoringRule:
+    """
+    A rule in which every voter gives the candidate at position `p` of their ballot the score
+    `score_vector_fn(number_candidates)[p]`. A truncated (distorted) ballot of length `l` gives the scores of
+    positions `0..l-1` to the candidates it ranks, and `missing_candidate_score` to each candidate it doesn't.
+    Like the `score_all_rule` rules, it's called as a compsoc rule and exposes a memoized `score_all`.
+    """
+
+    def __init__(self, name: str, score_vector_fn: ScoreVectorFunc, missing_candidate_score: float = 0):
+        self.__name__ = name
+        self.score_vector_fn = score_vector_fn
+        self.missing_candidate_score = missing_candidate_score
+        self.score_all = cached_per_profile()(self._calc_candidate_to_score)
+
+    def __call__(self, profile: Profile, candidate: int) -> float:
+        return self.score_all(profile)[candidate]
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.__name__!r})"
+
+    def __getstate__(self) -> dict:
+        return {key: val for key, val in self.__dict__.items() if key != 'score_all'}
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self.score_all = cached_per_profile()(self._calc_candidate_to_score)
+
+    def _calc_candidate_to_score(self, profile: Profile) -> Dict[int, float]:
+        scores = calc_positional_scores(profile, [self])[:, 0]
+        return get_profile_arrays(profile).by_candidate(scores)
+
+
+def calc_positional_scores(profile: Profile, rules: Sequence[PositionalScoringRule]) -> np.ndarray:
+    """
+    Scores all the candidates by many positional scoring rules at once: the weighted position counts (C x L)
+    are multiplied by the stacked score vectors (L x K). `scores[c, k]` is the score of candidate `c` by `rules[k]`.
+    """
+    number_candidates = get_profile_arrays(profile).number_candidates
+    score_vectors = np.column_stack([np.asarray(rule.score_vector_fn(number_candidates)) for rule in rules])
+    missing_candidate_scores = np.array([rule.missing_candidate_score for rule in rules])
+    return calc_positional_scores_by_vectors(profile, score_vectors, missing_candidate_scores)
+
+
+def calc_positional_scores_by_vectors(
+    profile: Profile, score_vectors: np.ndarray, missing_candidate_scores: np.ndarray
+) -> np.ndarray:
+    """
+    Like `calc_positional_scores`, for score vectors that are given directly as the columns of `score_vectors` (C x K).
+    """
+    profile_arrays = get_profile_arrays(profile)
+    return (
+        profile_arrays.position_counts @ score_vectors[:profile_arrays.max_ballot_length]
+        + np.outer(profile_arrays.missing_counts, missing_candidate_scores)
+    )
+
+
+def rank_candidates_by_scores(scores: np.ndarray) -> np.ndarray:
+    """
+    The rankings (K x C, of candidate indices) by every column of the scores (C x K). Like `calc_rule_ranking`, the
+    candidates are sorted stably, so tied candidates keep their order.
+    """
+    return np.argsort(-scores, axis=0, kind='stable').T
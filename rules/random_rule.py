@@ -1,7 +1,14 @@
-import random
+from typing import Dict
 
+import numpy as np
 from compsoc.profile import Profile
 
+from rules.score_all_rule import randomized_score_all_rule
+from utils.profile_arrays import get_profile_arrays
 
-def random_rule(profile: Profile, candidate: int) -> int:
-    return random.randint(0, 1_000_000)
+
+@randomized_score_all_rule
+def random_rule(profile: Profile, rng: np.random.Generator) -> Dict[int, int]:
+    candidates = get_profile_arrays(profile).candidates
+    scores = rng.integers(0, 1_000_000, size=len(candidates), endpoint=True)
+    return {int(c): int(score) for c, score in zip(candidates, scores)}
@@ -0,0 +1,53 @@
+from functools import wraps
+from typing import Callable, Dict, Optional
+
+import numpy as np
+from compsoc.profile import Profile
+
+from utils.profile_cache import cached_per_profile
+
+ScoreAllFunc = Callable[[Profile], Dict[int, float]]
+RandomizedScoreAllFunc = Callable[[Profile, np.random.Generator], Dict[int, float]]
+RuleFunc = Callable[[Profile, int], float]
+
+
+def score_all_rule(score_all_func: ScoreAllFunc) -> RuleFunc:
+    """
+    Turns a `score_all(profile) -> {candidate: score}` function into a rule with the `(profile, candidate)`
+    signature compsoc expects. The scores are computed once per profile (memoized by profile identity), and the
+    returned rule exposes them through its `score_all` attribute.
+    """
+    cached_score_all_func = cached_per_profile()(score_all_func)
+
+    @wraps(score_all_func)
+    def rule(profile: Profile, candidate: int) -> float:
+        return cached_score_all_func(profile)[candidate]
+
+    rule.score_all = cached_score_all_func
+    return rule
+
+
+def randomized_score_all_rule(score_all_func: RandomizedScoreAllFunc) -> RuleFunc:
+    """
+    Like `score_all_rule`, for a rule that draws from a random generator: its `score_all(profile, rng=None)` takes
+    the generator explicitly, and draws one from the global NumPy random state when it's not given (e.g. when it's
+    called by compsoc).
+    """
+    @wraps(score_all_func)
+    def score_all(profile: Profile, rng: Optional[np.random.Generator] = None) -> Dict[int, float]:
+        return score_all_func(profile, rng if rng is not None else np.random.default_rng(np.random.randint(2 ** 32)))
+
+    rule = score_all_rule(score_all)
+    rule.is_randomized = True
+    return rule
+
+
+def score_all_candidates(
+    rule: RuleFunc, profile: Profile, rng: Optional[np.random.Generator] = None
+) -> Dict[int, float]:
+    # `rng` is only used by randomized rules
+    if getattr(rule, 'is_randomized', False) and rng is not None:
+        return rule.score_all(profile, rng=rng)
+    if hasattr(rule, 'score_all'):
+        return rule.score_all(profile)
+    return {c: rule(profile, c) for c in profile.candidates}
@@ -1,9 +1,16 @@
+from typing import Dict
+
+import numpy as np
 from compsoc.profile import Profile
 
+from rules.score_all_rule import score_all_rule
+from utils.pairwise_majority import get_net_preference_matrix
+from utils.profile_arrays import get_profile_arrays
+
 
-def simpson_rule(profile: Profile, candidate: int) -> int:
-    scores = [
-        profile.get_net_preference(candidate, m) for m in
-        profile.candidates - {candidate}
-    ]
-    return min(scores)
+@score_all_rule
+def simpson_rule(profile: Profile) -> Dict[int, int]:
+    net_preference_matrix = get_net_preference_matrix(profile)
+    is_self = np.eye(len(net_preference_matrix), dtype=bool)
+    scores = np.where(is_self, np.iinfo(np.int64).max, net_preference_matrix).min(axis=1)
+    return get_profile_arrays(profile).by_candidate(scores)
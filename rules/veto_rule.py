@@ -1,18 +1,13 @@
-from compsoc.profile import Profile
+import numpy as np
 
+from rules.positional_scoring_rule import PositionalScoringRule
 
-def veto_rule(profile: Profile, candidate: int) -> int:
-    veto_score = 0
 
-    for frequency, ballot in profile.pairs:
-        ballot_is_distorted = len(ballot) != len(profile.candidates)
+def _veto_score_vector(number_candidates: int) -> np.ndarray:
+    # only full ballots reach the last position, and in distorted ballots every missing candidate is vetoed instead
+    score_vector = np.zeros(number_candidates, dtype=np.int64)
+    score_vector[-1] = -1
+    return score_vector
 
-        if ballot_is_distorted:
-            candidate_is_last_in_ballot = candidate not in ballot
-        else:
-            candidate_is_last_in_ballot = ballot[-1] == candidate
 
-        if candidate_is_last_in_ballot:
-            veto_score += frequency
-
-    return -veto_score
+veto_rule = PositionalScoringRule('veto_rule', _veto_score_vector, missing_candidate_score=-1)
@@ -0,0 +1,38 @@
+import numpy as np
+import pyrankvote
+import pytest
+from pyrankvote import Ballot, Candidate
+
+from utils.profile_arrays import ProfileArrays
+from utils.stv import calc_stv_winners
+from utils.voter_models import generate_profile_arrays_batch
+
+PROFILES_COUNT = 20
+
+
+def _calc_pyrankvote_stv_winners(profile_arrays: ProfileArrays, number_of_seats: int) -> list:
+    candidates = [Candidate(str(c)) for c in range(profile_arrays.number_candidates)]
+    ballots = [
+        Ballot(ranked_candidates=[candidates[c] for c in ballot[:ballot_length]])
+        for frequency, ballot, ballot_length in zip(
+            profile_arrays.frequencies, profile_arrays.ballots, profile_arrays.ballot_lengths
+        )
+        for _ in range(frequency)
+    ]
+    election_result = pyrankvote.single_transferable_vote(candidates, ballots, number_of_seats=number_of_seats)
+    return [int(candidate.name) for candidate in election_result.get_winners()]
+
+
+@pytest.mark.parametrize('distortion_ratio', (0, 0.5, 0.9))
+def test_calc_stv_winners_equals_pyrankvote(distortion_ratio: float):
+    # with hundreds of voters, no two candidates are tied all the way down their later choices (where pyrankvote
+    # picks at random)
+    for random_seed in range(PROFILES_COUNT):
+        rng = np.random.default_rng(random_seed)
+        number_candidates = int(rng.integers(3, 9))
+        profile_arrays, = generate_profile_arrays_batch(
+            'random', int(rng.integers(500, 2_001)), number_candidates, distortion_ratio, 1, rng
+        )
+        number_of_seats = number_candidates - 1
+        assert calc_stv_winners(profile_arrays, number_of_seats) == \
+            _calc_pyrankvote_stv_winners(profile_arrays, number_of_seats), f"random_seed={random_seed}"
@@ -0,0 +1,58 @@
+import random
+
+import numpy as np
+import pytest
+from compsoc.evaluate import get_rule_utility
+from compsoc.voter_model import generate_distorted_from_normal_profile, get_profile_from_model
+
+from evaluation.rankings import build_ranking_rule
+from evaluation.utility_evaluator import calc_candidate_rankings_utilities, calc_rule_utility
+from rules.borda_rule import borda_rule
+from rules.copeland_rule import copeland_rule
+from rules.plurality_rule import plurality_rule
+from rules.stv_rule_elishay import stv_rule_elishay
+from rules.veto_rule import veto_rule
+
+RULES = (borda_rule, copeland_rule, plurality_rule, stv_rule_elishay, veto_rule)
+PROFILES_COUNT = 5
+NUMBER_VOTERS = 300
+
+
+def _generate_compsoc_profiles(number_candidates: int, distortion_ratio: float, random_seed: int) -> list:
+    random.seed(random_seed)
+    np.random.seed(random_seed)
+    return [
+        generate_distorted_from_normal_profile(
+            get_profile_from_model(number_candidates, NUMBER_VOTERS, voters_model='random', verbose=False),
+            distortion_ratio
+        )
+        for _ in range(PROFILES_COUNT)
+    ]
+
+
+@pytest.mark.parametrize('number_candidates', (2, 5, 9))
+@pytest.mark.parametrize('distortion_ratio', (0, 0.5, 0.9))
+def test_calc_rule_utility_equals_compsoc(number_candidates: int, distortion_ratio: float):
+    for profile in _generate_compsoc_profiles(number_candidates, distortion_ratio, random_seed=number_candidates):
+        for rule in RULES:
+            for topn in range(1, number_candidates + 1):
+                expected_utilities = get_rule_utility(profile=profile, rule=rule, topn=topn, verbose=False)
+                assert calc_rule_utility(profile, rule, topn) == pytest.approx(expected_utilities, rel=1e-12), \
+                    f"{rule.__name__} (topn={topn})"
+
+
+@pytest.mark.parametrize('distortion_ratio', (0, 0.5, 0.9))
+def test_calc_candidate_rankings_utilities_equals_compsoc(distortion_ratio: float):
+    number_candidates = 7
+    rng = np.random.default_rng(0)
+    for profile in _generate_compsoc_profiles(number_candidates, distortion_ratio, random_seed=1):
+        rankings = [tuple(int(c) for c in rng.permutation(number_candidates)) for _ in range(10)]
+        for topn in range(1, number_candidates + 1):
+            top_utilities, topn_utilities = calc_candidate_rankings_utilities(profile, rankings, topn)
+            for ranking, top_utility, topn_utility in zip(rankings, top_utilities, topn_utilities):
+                expected_utilities = get_rule_utility(
+                    profile=profile, rule=build_ranking_rule(ranking), topn=topn, verbose=False
+                )
+                assert (top_utility, topn_utility) == pytest.approx(
+                    (expected_utilities['top'], expected_utilities['topn']), rel=1e-12
+                )
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from utils.voter_models import (
+    VOTER_MODEL_NAMES, calc_voter_models_two_sample_p_values, generate_compsoc_profile_arrays,
+    generate_profile_arrays_batch
+)
+
+PROFILES_COUNT = 100
+NUMBER_VOTERS = 200
+NUMBER_CANDIDATES = 8
+# the tests are seeded, so a native generator that matches compsoc's can't fail them by chance between runs
+MIN_P_VALUE = 0.001
+
+
+def _generate_compsoc_profiles_arrays(voters_model: str, distortion_ratio: float, rng: np.random.Generator) -> list:
+    return [
+        generate_compsoc_profile_arrays(voters_model, NUMBER_VOTERS, NUMBER_CANDIDATES, distortion_ratio, rng)
+        for _ in range(PROFILES_COUNT)
+    ]
+
+
+@pytest.mark.parametrize('voters_model', VOTER_MODEL_NAMES)
+@pytest.mark.parametrize('distortion_ratio', (0, 0.5, 0.9))
+def test_native_voter_model_matches_compsoc(voters_model: str, distortion_ratio: float):
+    rng = np.random.default_rng(42)
+    compsoc_profiles_arrays = _generate_compsoc_profiles_arrays(voters_model, distortion_ratio, rng)
+    if voters_model != 'random':
+        # the tests can't tell a model from compsoc's 'random' one, when the installed compsoc's generators don't
+        # (e.g. a stand-in of it that ignores `voters_model`) - passing them would then prove nothing
+        statistic_name_to_p_value = calc_voter_models_two_sample_p_values(
+            voters_model, compsoc_profiles_arrays, _generate_compsoc_profiles_arrays('random', distortion_ratio, rng)
+        )
+        if min(statistic_name_to_p_value.values()) >= MIN_P_VALUE:
+            pytest.skip(f"the installed compsoc's '{voters_model}' profiles can't be told from its 'random' ones")
+
+    native_profiles_arrays = generate_profile_arrays_batch(
+        voters_model, NUMBER_VOTERS, NUMBER_CANDIDATES, distortion_ratio, PROFILES_COUNT, rng
+    )
+    statistic_name_to_p_value = calc_voter_models_two_sample_p_values(
+        voters_model, compsoc_profiles_arrays, native_profiles_arrays
+    )
+    assert min(statistic_name_to_p_value.values()) >= MIN_P_VALUE, statistic_name_to_p_value
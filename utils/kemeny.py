@@ -0,0 +1,221 @@
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+from scipy.sparse.csgraph import connected_components
+
+KEMENY_EXACT_MAX_CANDIDATES_COUNT = 20
+HELD_KARP_CHUNK_SIZE = 2 ** 16
+# the approximation stops after this many perturbations, so its ranking doesn't depend on the machine's speed or load
+KEMENY_APPROXIMATION_MAX_PERTURBATIONS = 200
+
+
+@dataclass(frozen=True)
+class KemenyResult:
+    ranking: List[int]
+    distance: int
+    lower_bound: int
+    is_optimal: bool
+
+
+def calc_kemeny_distance(preference_matrix: np.ndarray, ranking: List[int]) -> int:
+    # every voter that prefers a candidate over one that is ranked above it disagrees with the ranking once
+    ranked_preference_matrix = preference_matrix[np.ix_(ranking, ranking)]
+    return int(np.tril(ranked_preference_matrix, k=-1).sum())
+
+
+def calc_kemeny_lower_bound(preference_matrix: np.ndarray) -> int:
+    pairs_disagreements = np.minimum(preference_matrix, preference_matrix.T)
+    return int(np.triu(pairs_disagreements, k=1).sum())
+
+
+def solve_kemeny(
+    preference_matrix: np.ndarray,
+    max_perturbations: int = KEMENY_APPROXIMATION_MAX_PERTURBATIONS,
+    rng: Optional[np.random.Generator] = None,
+    time_budget_seconds: Optional[float] = None
+) -> KemenyResult:
+    """
+    Solves every majority component exactly when it's small enough, and approximately (within the given budget)
+    otherwise. Pairs of candidates from different components always agree with the majority, so the ranking
+    is optimal if every component was solved exactly, and otherwise the lower bound is only loosened by the
+    approximated components. `time_budget_seconds` is an optional safety cap on all the approximations together.
+    """
+    deadline = time.monotonic() + time_budget_seconds if time_budget_seconds is not None else None
+    ranking = []
+    approximation_gap = 0
+    for component in _ordered_majority_components(preference_matrix):
+        component_preference_matrix = preference_matrix[np.ix_(component, component)]
+        if len(component) <= KEMENY_EXACT_MAX_CANDIDATES_COUNT:
+            component_order = _solve_held_karp(component_preference_matrix)
+        else:
+            component_result = solve_kemeny_approximate(
+                component_preference_matrix,
+                max_perturbations=max_perturbations,
+                rng=rng,
+                time_budget_seconds=max(deadline - time.monotonic(), 0) if deadline is not None else None
+            )
+            component_order = np.array(component_result.ranking)
+            approximation_gap += component_result.distance - component_result.lower_bound
+        ranking.extend(int(c) for c in component[component_order])
+
+    distance = calc_kemeny_distance(preference_matrix, ranking)
+    return KemenyResult(
+        ranking=ranking, distance=distance, lower_bound=distance - approximation_gap, is_optimal=approximation_gap == 0
+    )
+
+
+def solve_kemeny_exact(preference_matrix: np.ndarray) -> KemenyResult:
+    """
+    Finds an optimal Kemeny ranking (as candidate indices) of the given weighted preference matrix.
+    The candidates are first split into the strongly connected components of the majority graph - all the
+    members of a component beat all the members of the components after it, so by the extended Condorcet
+    criterion they precede them in every Kemeny ranking - and then every component is solved by a Held-Karp
+    style dynamic programming over its subsets.
+    """
+    ranking = []
+    for component in _ordered_majority_components(preference_matrix):
+        if len(component) > KEMENY_EXACT_MAX_CANDIDATES_COUNT:
+            raise ValueError(
+                f"exact kemeny isn't supported for more than {KEMENY_EXACT_MAX_CANDIDATES_COUNT} candidates "
+                f"without a majority ordering between them (got {len(component)})"
+            )
+        component_order = _solve_held_karp(preference_matrix[np.ix_(component, component)])
+        ranking.extend(int(c) for c in component[component_order])
+
+    distance = calc_kemeny_distance(preference_matrix, ranking)
+    return KemenyResult(ranking=ranking, distance=distance, lower_bound=distance, is_optimal=True)
+
+
+def solve_kemeny_approximate(
+    preference_matrix: np.ndarray,
+    max_perturbations: int = KEMENY_APPROXIMATION_MAX_PERTURBATIONS,
+    rng: Optional[np.random.Generator] = None,
+    time_budget_seconds: Optional[float] = None
+) -> KemenyResult:
+    """
+    An anytime approximation: the Borda and Copeland orderings are improved by a best-insertion local search,
+    and the best local optimum is then repeatedly perturbed and improved again until the perturbations budget is
+    exhausted (or the ranking reaches the pairwise lower bound and is thus optimal). The result is reproducible for
+    a given `rng`, unless the optional `time_budget_seconds` safety cap cuts the perturbations short.
+    """
+    deadline = time.monotonic() + time_budget_seconds if time_budget_seconds is not None else None
+    rng = rng if rng is not None else np.random.default_rng(0)
+    lower_bound = calc_kemeny_lower_bound(preference_matrix)
+
+    best_ranking, best_distance = None, None
+    for initial_ranking in _initial_rankings(preference_matrix):
+        ranking, distance = _improve_by_insertions(preference_matrix, initial_ranking)
+        if best_distance is None or distance < best_distance:
+            best_ranking, best_distance = ranking, distance
+
+    perturbations_count = 0
+    while best_distance > lower_bound and perturbations_count < max_perturbations \
+            and (deadline is None or time.monotonic() < deadline):
+        perturbations_count += 1
+        ranking, distance = _improve_by_insertions(preference_matrix, _perturbed(best_ranking, rng))
+        if distance < best_distance:
+            best_ranking, best_distance = ranking, distance
+
+    return KemenyResult(
+        ranking=[int(c) for c in best_ranking],
+        distance=best_distance,
+        lower_bound=lower_bound,
+        is_optimal=best_distance == lower_bound
+    )
+
+
+def _initial_rankings(preference_matrix: np.ndarray) -> List[np.ndarray]:
+    borda_scores = preference_matrix.sum(axis=1)
+    copeland_scores = np.sign(preference_matrix - preference_matrix.T).sum(axis=1)
+    borda_ranking = np.argsort(-borda_scores, kind='stable')
+    copeland_ranking = np.lexsort((-borda_scores, -copeland_scores))
+    return [borda_ranking, copeland_ranking]
+
+
+def _improve_by_insertions(preference_matrix: np.ndarray, ranking: np.ndarray):
+    """
+    Repeatedly applies the best improving move of a single candidate to another position (adjacent swaps included).
+    For the ranked preference matrix `M` and `D = M - M.T`, moving the candidate at position `i` down to position
+    `j > i` changes the distance by `sum(D[i, i+1..j])`, and moving it up to `j < i` by `-sum(D[i, j..i-1])`,
+    so all the moves are evaluated at once from the row-wise cumulative sums of `D`.
+    """
+    ranking = np.array(ranking)
+    positions = np.arange(len(ranking))
+    while True:
+        ranked_preference_matrix = preference_matrix[np.ix_(ranking, ranking)]
+        net_preference_matrix = ranked_preference_matrix - ranked_preference_matrix.T
+        cumulative_net_preference = np.cumsum(net_preference_matrix, axis=1)
+        move_deltas = (
+            cumulative_net_preference
+            - cumulative_net_preference[positions, positions][:, None]
+            - np.tril(net_preference_matrix, k=-1)
+        )
+
+        from_position, to_position = np.unravel_index(move_deltas.argmin(), move_deltas.shape)
+        if move_deltas[from_position, to_position] >= 0:
+            return ranking, calc_kemeny_distance(preference_matrix, ranking)
+        ranking = np.insert(np.delete(ranking, from_position), to_position, ranking[from_position])
+
+
+def _perturbed(ranking: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    # shuffles a random segment of the ranking
+    segment_length = rng.integers(2, max(len(ranking) // 4, 2) + 1)
+    segment_start = rng.integers(0, len(ranking) - segment_length + 1)
+    perturbed_ranking = ranking.copy()
+    perturbed_ranking[segment_start:segment_start + segment_length] = \
+        rng.permutation(ranking[segment_start:segment_start + segment_length])
+    return perturbed_ranking
+
+
+def _ordered_majority_components(preference_matrix: np.ndarray) -> List[np.ndarray]:
+    # ties are kept as edges in both directions, so between components the majority is always strict
+    weakly_beats = preference_matrix >= preference_matrix.T
+    np.fill_diagonal(weakly_beats, False)
+    components_count, candidate_to_component = connected_components(weakly_beats, directed=True, connection='strong')
+    components = [np.flatnonzero(candidate_to_component == i) for i in range(components_count)]
+
+    # the components are totally ordered, and the earlier a component is the more candidates each of its members beat
+    wins_counts = weakly_beats.sum(axis=1)
+    return sorted(components, key=lambda component: -wins_counts[component[0]])
+
+
+def _solve_held_karp(preference_matrix: np.ndarray) -> np.ndarray:
+    number_candidates = len(preference_matrix)
+    if number_candidates <= 1:
+        return np.arange(number_candidates)
+
+    subsets = np.arange(2 ** number_candidates, dtype=np.int64)
+    candidate_bits = np.int64(1) << np.arange(number_candidates, dtype=np.int64)
+    subsets_sizes = np.zeros(len(subsets), dtype=np.int8)
+    for candidate_bit in candidate_bits:
+        subsets_sizes += (subsets & candidate_bit) != 0
+
+    # subset_costs[s] - the minimal disagreement of ranking the candidates of `s` above all the rest.
+    # placing `c` right after the rest of `s` costs `preference_matrix[c, a]` for every other `a` in `s`
+    subset_costs = np.full(len(subsets), np.inf)
+    subset_costs[0] = 0
+    subset_last_candidate = np.zeros(len(subsets), dtype=np.int8)
+    placement_weights = preference_matrix.T.astype(np.float64)
+
+    for subset_size in range(1, number_candidates + 1):
+        layer_subsets = np.flatnonzero(subsets_sizes == subset_size)
+        for chunk_start in range(0, len(layer_subsets), HELD_KARP_CHUNK_SIZE):
+            chunk_subsets = layer_subsets[chunk_start:chunk_start + HELD_KARP_CHUNK_SIZE]
+            in_subset = (chunk_subsets[:, None] & candidate_bits) != 0
+            placement_costs = in_subset @ placement_weights
+            total_costs = np.where(
+                in_subset, subset_costs[chunk_subsets[:, None] ^ candidate_bits] + placement_costs, np.inf
+            )
+            best_last_candidates = total_costs.argmin(axis=1)
+            subset_costs[chunk_subsets] = total_costs[np.arange(len(chunk_subsets)), best_last_candidates]
+            subset_last_candidate[chunk_subsets] = best_last_candidates
+
+    reversed_order = []
+    subset = len(subsets) - 1
+    while subset:
+        last_candidate = int(subset_last_candidate[subset])
+        reversed_order.append(last_candidate)
+        subset ^= 1 << last_candidate
+    return np.array(reversed_order[::-1])
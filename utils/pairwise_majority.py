@@ -0,0 +1,43 @@
+import numpy as np
+from compsoc.profile import Profile
+
+from utils.profile_arrays import ProfileArrays, get_profile_arrays
+from utils.profile_cache import cached_per_profile
+
+
+def calc_preference_matrix(profile_arrays: ProfileArrays, unranked_as_last: bool = False) -> np.ndarray:
+    """
+    `preference_matrix[a, b]` is the number of voters that rank candidate `a` above candidate `b`.
+    By default a (distorted) ballot only counts for pairs it ranks both of, and with `unranked_as_last` every
+    candidate that a ballot ranks is also preferred over all the candidates it doesn't rank.
+    """
+    positions = profile_arrays.positions
+    present_mask = profile_arrays.present_mask
+    preference_matrix = np.zeros((profile_arrays.number_candidates, profile_arrays.number_candidates), dtype=np.int64)
+
+    # the missing value is larger than any position, so unranked candidates already lose to every ranked candidate
+    for a in range(profile_arrays.number_candidates):
+        a_above_b = positions[:, [a]] < positions
+        if not unranked_as_last:
+            a_above_b &= present_mask
+        preference_matrix[a] = profile_arrays.frequencies @ a_above_b
+
+    return preference_matrix
+
+
+@cached_per_profile()
+def get_preference_matrix(profile: Profile, unranked_as_last: bool = False) -> np.ndarray:
+    preference_matrix = calc_preference_matrix(get_profile_arrays(profile), unranked_as_last)
+    preference_matrix.setflags(write=False)
+    return preference_matrix
+
+
+@cached_per_profile()
+def get_net_preference_matrix(profile: Profile, unranked_as_last: bool = False) -> np.ndarray:
+    """
+    `net_preference_matrix[a, b]` is the weighted equivalent of `profile.get_net_preference(a, b)`.
+    """
+    preference_matrix = get_preference_matrix(profile, unranked_as_last)
+    net_preference_matrix = preference_matrix - preference_matrix.T
+    net_preference_matrix.setflags(write=False)
+    return net_preference_matrix
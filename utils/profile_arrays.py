@@ -0,0 +1,200 @@
+import itertools
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Collection, Dict, Iterable, Set, Tuple
+
+import numpy as np
+from compsoc.profile import Profile
+
+from utils.profile_cache import cached_per_profile
+
+
+@dataclass(frozen=True, eq=False)
+class ProfileArrays:
+    """
+    A compact, read-only NumPy representation of a profile.
+    Candidates are referred to by their index in `candidates` (sorted ascending), and the ballots of the profile
+    are kept aggregated - one row per unique ballot, weighted by `frequencies`.
+    * `ballots[u, p]` is the index of the candidate at position `p` of ballot `u` (padded with `missing_value`).
+    * `positions[u, c]` is the 0-based position of candidate `c` in ballot `u` (or `missing_value` if it's absent).
+    """
+    candidates: np.ndarray
+    frequencies: np.ndarray
+    ballots: np.ndarray
+    positions: np.ndarray
+    ballot_lengths: np.ndarray
+    missing_value: int
+
+    @classmethod
+    def from_pairs(cls, pairs: Iterable[Tuple[int, Tuple[int, ...]]], candidates: Collection[int]) -> 'ProfileArrays':
+        pairs = list(pairs)
+        candidates = np.array(sorted(candidates), dtype=np.int64)
+        dtype, missing_value = _get_candidate_index_dtype(len(candidates))
+
+        frequencies = np.fromiter((frequency for frequency, _ in pairs), dtype=np.int64, count=len(pairs))
+        ballot_lengths = np.fromiter((len(ballot) for _, ballot in pairs), dtype=np.int64, count=len(pairs))
+        max_ballot_length = int(ballot_lengths.max(initial=0))
+        total_ballots_length = int(ballot_lengths.sum())
+
+        flat_ballots = np.fromiter(
+            itertools.chain.from_iterable(ballot for _, ballot in pairs), dtype=np.int64, count=total_ballots_length
+        )
+        flat_candidate_indices = np.searchsorted(candidates, flat_ballots)
+        flat_rows = np.repeat(np.arange(len(pairs)), ballot_lengths)
+        ballot_offsets = np.cumsum(ballot_lengths) - ballot_lengths
+        flat_positions = np.arange(total_ballots_length) - np.repeat(ballot_offsets, ballot_lengths)
+
+        ballots = np.full((len(pairs), max_ballot_length), missing_value, dtype=dtype)
+        ballots[flat_rows, flat_positions] = flat_candidate_indices
+        return cls._from_aggregated_ballots(candidates, frequencies, ballots, ballot_lengths, missing_value)
+
+    @classmethod
+    def from_ballots(
+        cls, ballots: np.ndarray, ballot_lengths: np.ndarray, candidates: Collection[int]
+    ) -> 'ProfileArrays':
+        """
+        Aggregates per-voter ballots - a V x C matrix of candidate indices, of which only the first
+        `ballot_lengths[v]` of row `v` are ranked - into unique ballots.
+        """
+        candidates = np.array(sorted(candidates), dtype=np.int64)
+        dtype, missing_value = _get_candidate_index_dtype(len(candidates))
+        is_ranked = np.arange(ballots.shape[1]) < np.asarray(ballot_lengths)[:, None]
+        ballots = np.where(is_ranked, ballots, missing_value).astype(dtype)
+
+        ballots, frequencies = np.unique(ballots, axis=0, return_counts=True)
+        ballot_lengths = (ballots != missing_value).sum(axis=1)
+        ballots = ballots[:, :int(ballot_lengths.max(initial=0))]
+        return cls._from_aggregated_ballots(
+            candidates, frequencies.astype(np.int64), np.ascontiguousarray(ballots), ballot_lengths, missing_value
+        )
+
+    @classmethod
+    def from_positions(
+        cls, frequencies: np.ndarray, positions: np.ndarray, candidates: Collection[int]
+    ) -> 'ProfileArrays':
+        # the positions (e.g. a read-only memory map) are kept as they are, and the ballots are derived from them
+        candidates = np.array(sorted(candidates), dtype=np.int64)
+        _, missing_value = _get_candidate_index_dtype(len(candidates))
+        ballot_indices, ballot_candidates = np.nonzero(positions != missing_value)
+        ballot_lengths = np.bincount(ballot_indices, minlength=len(positions))
+        ballots = np.full((len(positions), int(ballot_lengths.max(initial=0))), missing_value, dtype=positions.dtype)
+        ballots[ballot_indices, positions[ballot_indices, ballot_candidates]] = ballot_candidates
+
+        ballot_lengths = ballot_lengths.astype(positions.dtype)
+        for array in (candidates, frequencies, ballots, positions, ballot_lengths):
+            array.setflags(write=False)
+        return cls(
+            candidates=candidates,
+            frequencies=frequencies,
+            ballots=ballots,
+            positions=positions,
+            ballot_lengths=ballot_lengths,
+            missing_value=missing_value
+        )
+
+    @classmethod
+    def _from_aggregated_ballots(
+        cls,
+        candidates: np.ndarray,
+        frequencies: np.ndarray,
+        ballots: np.ndarray,
+        ballot_lengths: np.ndarray,
+        missing_value: int
+    ) -> 'ProfileArrays':
+        ballot_indices, ballot_positions = np.nonzero(ballots != missing_value)
+        positions = np.full((len(ballots), len(candidates)), missing_value, dtype=ballots.dtype)
+        positions[ballot_indices, ballots[ballot_indices, ballot_positions]] = ballot_positions
+
+        ballot_lengths = ballot_lengths.astype(ballots.dtype)
+        for array in (candidates, frequencies, ballots, positions, ballot_lengths):
+            array.setflags(write=False)
+        return cls(
+            candidates=candidates,
+            frequencies=frequencies,
+            ballots=ballots,
+            positions=positions,
+            ballot_lengths=ballot_lengths,
+            missing_value=missing_value
+        )
+
+    def to_pairs(self) -> Set[Tuple[int, Tuple[int, ...]]]:
+        return {
+            (int(frequency), tuple(self.candidates[ballot[:ballot_length]].tolist()))
+            for frequency, ballot, ballot_length in zip(self.frequencies, self.ballots, self.ballot_lengths)
+        }
+
+    @property
+    def number_candidates(self) -> int:
+        return len(self.candidates)
+
+    @property
+    def max_ballot_length(self) -> int:
+        return self.ballots.shape[1]
+
+    @cached_property
+    def number_voters(self) -> int:
+        return int(self.frequencies.sum())
+
+    @cached_property
+    def candidate_to_index(self) -> Dict[int, int]:
+        return {int(c): i for i, c in enumerate(self.candidates)}
+
+    def candidate_index(self, candidate: int) -> int:
+        return self.candidate_to_index[candidate]
+
+    @cached_property
+    def present_mask(self) -> np.ndarray:
+        present_mask = self.positions != self.missing_value
+        present_mask.setflags(write=False)
+        return present_mask
+
+    @cached_property
+    def position_counts(self) -> np.ndarray:
+        """
+        `position_counts[c, p]` is the number of voters that ranked candidate `c` at position `p`.
+        """
+        number_candidates, max_ballot_length = self.number_candidates, self.max_ballot_length
+        ballot_indices, ballot_positions = np.nonzero(self.ballots != self.missing_value)
+        ballot_candidates = self.ballots[ballot_indices, ballot_positions].astype(np.int64)
+        position_counts = np.bincount(
+            ballot_candidates * max_ballot_length + ballot_positions,
+            weights=self.frequencies[ballot_indices],
+            minlength=number_candidates * max_ballot_length
+        ).reshape(number_candidates, max_ballot_length).astype(np.int64)
+        position_counts.setflags(write=False)
+        return position_counts
+
+    @cached_property
+    def missing_counts(self) -> np.ndarray:
+        """
+        `missing_counts[c]` is the number of voters whose (distorted) ballot doesn't include candidate `c`.
+        """
+        missing_counts = self.number_voters - self.position_counts.sum(axis=1)
+        missing_counts.setflags(write=False)
+        return missing_counts
+
+    def candidate_position_counts(self, candidate: int) -> np.ndarray:
+        return self.position_counts[self.candidate_index(candidate)]
+
+    def position_counts_prefix(self, k: int) -> np.ndarray:
+        return self.position_counts[:, :k]
+
+    def ballots_prefix(self, k: int) -> np.ndarray:
+        return self.ballots[:, :k]
+
+    @property
+    def first_choices(self) -> np.ndarray:
+        return self.ballots[:, 0]
+
+    def by_candidate(self, values: np.ndarray) -> Dict[int, float]:
+        return {int(c): v.item() for c, v in zip(self.candidates, values)}
+
+
+@cached_per_profile()
+def get_profile_arrays(profile: Profile) -> ProfileArrays:
+    return ProfileArrays.from_pairs(profile.pairs, profile.candidates)
+
+
+def _get_candidate_index_dtype(number_candidates: int) -> Tuple[type, int]:
+    dtype = np.uint8 if number_candidates < np.iinfo(np.uint8).max else np.uint16
+    return dtype, int(np.iinfo(dtype).max)
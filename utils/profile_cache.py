@@ -0,0 +1,45 @@
+from collections import OrderedDict
+from functools import wraps
+from typing import Callable, TypeVar
+
+from compsoc.profile import Profile
+
+PROFILE_CACHE_MAX_SIZE = 8
+
+T = TypeVar('T')
+
+
+def cached_per_profile(max_size: int = PROFILE_CACHE_MAX_SIZE):
+    """
+    Memoizes a `func(profile, *args, **kwargs)` by the identity of the profile (and the extra hashable args).
+    The cache is a bounded LRU that holds a reference to each cached profile, so an entry can never be
+    served for a different profile object that happens to reuse the id of a collected one.
+    """
+    def decorator(func: Callable[..., T]) -> Callable[..., T]:
+        profile_key_to_entry = OrderedDict()
+
+        @wraps(func)
+        def wrapper(profile: Profile, *args, **kwargs) -> T:
+            key = (id(profile), *args, *sorted(kwargs.items()))
+            entry = profile_key_to_entry.get(key)
+            if entry is not None and entry[0] is profile:
+                profile_key_to_entry.move_to_end(key)
+                return entry[1]
+
+            value = func(profile, *args, **kwargs)
+            cache_set(value, profile, *args, **kwargs)
+            return value
+
+        def cache_set(value: T, profile: Profile, *args, **kwargs):
+            # lets a caller that already has the value of a profile (e.g. the one that created it) seed the cache
+            key = (id(profile), *args, *sorted(kwargs.items()))
+            profile_key_to_entry[key] = (profile, value)
+            profile_key_to_entry.move_to_end(key)
+            while len(profile_key_to_entry) > max_size:
+                profile_key_to_entry.popitem(last=False)
+
+        wrapper.cache_set = cache_set
+        wrapper.cache_clear = profile_key_to_entry.clear
+        return wrapper
+
+    return decorator
@@ -0,0 +1,28 @@
+from dataclasses import dataclass
+
+import numpy as np
+from compsoc.profile import Profile
+
+from utils.profile_arrays import ProfileArrays, get_profile_arrays
+from utils.profile_cache import cached_per_profile
+
+
+@dataclass(frozen=True)
+class ProfileStats:
+    """
+    Summary statistics of a profile. The distortion ratio is the mean fraction of candidates that a unique ballot
+    doesn't rank.
+    """
+    unique_ballots_distortion_ratio: float
+
+    @classmethod
+    def from_profile_arrays(cls, profile_arrays: ProfileArrays) -> 'ProfileStats':
+        ballot_lengths = profile_arrays.ballot_lengths.astype(np.int64)
+        return cls(
+            unique_ballots_distortion_ratio=1 - (float(ballot_lengths.mean()) / profile_arrays.number_candidates)
+        )
+
+
+@cached_per_profile()
+def get_profile_stats(profile: Profile) -> ProfileStats:
+    return ProfileStats.from_profile_arrays(get_profile_arrays(profile))
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import shutil
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, Optional
+from uuid import uuid4
+
+import numpy as np
+
+from utils.profile_arrays import ProfileArrays
+from utils.random_utils import spawn_rng
+from utils.voter_models import (
+    DEFAULT_VOTER_MODELS_GENERATOR, VOTER_MODELS_VERSION, VoterModelName, VoterModelsGenerator, generate_profile_arrays
+)
+
+PROFILE_STORE_FOLDER_PATH = Path(__file__).parent.parent / 'experiments' / 'profiles_store'
+PROFILE_STORE_MAX_SIZE_BYTES = 4 * 2 ** 30
+# an eviction frees the store down to this fraction of its max size, so it's only needed again after a while
+PROFILE_STORE_EVICTION_TARGET_RATIO = 0.9
+PROFILE_GENERATION_STREAM_NAME = 'profile_generation'
+
+# the size of every store folder, as scanned by this process and then added to on every save (the stores are created
+# per call, and the running size outlives them)
+_folder_path_to_size_bytes: Dict[Path, int] = {}
+
+
+@dataclass(frozen=True)
+class ProfileKey:
+    voters_model: VoterModelName
+    number_voters: int
+    number_candidates: int
+    distortion_ratio: float
+    random_seed: int
+    iteration: int
+    voter_models_generator: VoterModelsGenerator = DEFAULT_VOTER_MODELS_GENERATOR
+
+    @property
+    def digest(self) -> str:
+        key_json = json.dumps({**asdict(self), 'voters_models_version': VOTER_MODELS_VERSION}, sort_keys=True)
+        return hashlib.sha256(key_json.encode()).hexdigest()
+
+    def create_rng(self) -> np.random.Generator:
+        # every key has its own stream, so a stored profile doesn't depend on which other profiles were generated
+        return spawn_rng(self.random_seed, self.dataset_setup, self.iteration, PROFILE_GENERATION_STREAM_NAME)
+
+    @property
+    def dataset_setup(self) -> dict:
+        return dict(
+            voters_model=self.voters_model,
+            number_voters=self.number_voters,
+            number_candidates=self.number_candidates,
+            distortion_ratio=self.distortion_ratio
+        )
+
+
+class ProfileStore:
+    """
+    A content-addressed on-disk store of generated profiles. Every profile is kept in its own folder (named by the
+    digest of its key) as `frequencies.npy` and the uint8/uint16 `positions.npy` matrix, which is loaded as a
+    read-only memory map. When the store grows beyond `max_size_bytes`, the least recently used profiles are evicted.
+    The size is only scanned when the running size (that this process adds its saves to) crosses `max_size_bytes`,
+    so the entries that other workers save meanwhile may let the store overshoot it until the next scan.
+    """
+
+    def __init__(
+        self, folder_path: Path = PROFILE_STORE_FOLDER_PATH, max_size_bytes: int = PROFILE_STORE_MAX_SIZE_BYTES
+    ):
+        self.folder_path = Path(folder_path)
+        self.max_size_bytes = max_size_bytes
+
+    def load_or_generate(self, key: ProfileKey) -> ProfileArrays:
+        profile_arrays = self.load(key)
+        if profile_arrays is None:
+            profile_arrays = generate_profile_arrays(
+                **key.dataset_setup, voter_models_generator=key.voter_models_generator, rng=key.create_rng()
+            )
+            self.save(key, profile_arrays)
+        return profile_arrays
+
+    def load(self, key: ProfileKey) -> Optional[ProfileArrays]:
+        entry_folder_path = self.folder_path / key.digest
+        try:
+            frequencies = np.load(entry_folder_path / 'frequencies.npy')
+            positions = np.load(entry_folder_path / 'positions.npy', mmap_mode='r')
+            # marks the entry as recently used
+            os.utime(entry_folder_path)
+        except FileNotFoundError:
+            return None
+        return ProfileArrays.from_positions(frequencies, positions, range(key.number_candidates))
+
+    def save(self, key: ProfileKey, profile_arrays: ProfileArrays):
+        # the entry is written aside and renamed into place, so concurrent workers never see a partial entry
+        self.folder_path.mkdir(parents=True, exist_ok=True)
+        temp_entry_folder_path = self.folder_path / f'.{key.digest}.{uuid4().hex}'
+        temp_entry_folder_path.mkdir()
+        np.save(temp_entry_folder_path / 'frequencies.npy', profile_arrays.frequencies)
+        np.save(temp_entry_folder_path / 'positions.npy', profile_arrays.positions)
+        entry_size_bytes = _calc_entry_size_bytes(temp_entry_folder_path)
+        try:
+            temp_entry_folder_path.rename(self.folder_path / key.digest)
+        except OSError:
+            # another worker has just stored the same profile
+            shutil.rmtree(temp_entry_folder_path, ignore_errors=True)
+            return
+
+        if self.folder_path not in _folder_path_to_size_bytes:
+            _folder_path_to_size_bytes[self.folder_path] = self._evict_least_recently_used(self.max_size_bytes)
+        else:
+            _folder_path_to_size_bytes[self.folder_path] += entry_size_bytes
+        if _folder_path_to_size_bytes[self.folder_path] > self.max_size_bytes:
+            _folder_path_to_size_bytes[self.folder_path] = self._evict_least_recently_used(
+                int(self.max_size_bytes * PROFILE_STORE_EVICTION_TARGET_RATIO)
+            )
+
+    def _evict_least_recently_used(self, target_size_bytes: int) -> int:
+        entry_to_last_use_and_size = {}
+        for entry_folder_path in self.folder_path.iterdir():
+            if entry_folder_path.name.startswith('.'):
+                continue
+            try:
+                entry_to_last_use_and_size[entry_folder_path] = (
+                    entry_folder_path.stat().st_mtime, _calc_entry_size_bytes(entry_folder_path)
+                )
+            except FileNotFoundError:
+                # evicted by another worker meanwhile
+                continue
+
+        store_size_bytes = sum(size for _, size in entry_to_last_use_and_size.values())
+        for entry_folder_path, (_, size) in sorted(entry_to_last_use_and_size.items(), key=lambda kvp: kvp[1][0]):
+            if store_size_bytes <= target_size_bytes:
+                break
+            shutil.rmtree(entry_folder_path, ignore_errors=True)
+            store_size_bytes -= size
+        return store_size_bytes
+
+
+def _calc_entry_size_bytes(entry_folder_path: Path) -> int:
+    return sum(file_path.stat().st_size for file_path in entry_folder_path.iterdir())
@@ -1,3 +1,5 @@
+import hashlib
+import json
 import random
 
 import numpy as np
@@ -6,3 +8,19 @@ import numpy as np
 def set_global_random_seed(random_seed: int):
     random.seed(random_seed)
     np.random.seed(random_seed)
+
+
+def spawn_rng(random_seed: int, *spawn_keys) -> np.random.Generator:
+    """
+    The generator of the stream at `spawn_keys` in the tree of `SeedSequence(random_seed).spawn(...)` children.
+    Every key is either a child index or any JSON serializable value (e.g. a dataset setup, a rule name) that is
+    mapped to a stable index - so a stream only depends on what it's derived from, and not on the order in which
+    streams are created, or on the process that creates them.
+    """
+    spawn_key = tuple(key if isinstance(key, int) else _to_spawn_key_index(key) for key in spawn_keys)
+    return np.random.default_rng(np.random.SeedSequence(random_seed, spawn_key=spawn_key))
+
+
+def _to_spawn_key_index(key) -> int:
+    key_json = json.dumps(key, sort_keys=True)
+    return int.from_bytes(hashlib.sha256(key_json.encode()).digest()[:4], 'little')
@@ -0,0 +1,245 @@
+from functools import cmp_to_key
+from typing import List, Optional
+
+import numpy as np
+
+from utils.profile_arrays import ProfileArrays
+
+# the incrementally updated tallies of fractional (transferred) weights are rounded to this many decimals, so that
+# tied candidates stay tied whatever order their weights were added up in
+TALLIES_DECIMALS = 9
+# the margins of pyrankvote's count - a candidate within the rounding error below the quota is elected, candidates
+# within the considered equal margin of each other are tied, and transfers that round to zero are skipped
+PYRANKVOTE_ROUNDING_ERROR = 1e-6
+PYRANKVOTE_CONSIDERED_EQUAL_MARGIN = 0.001
+PYRANKVOTE_TRANSFER_DECIMALS = 4
+
+
+def calc_instant_runoff_elimination_order(
+    profile_arrays: ProfileArrays, rng: Optional[np.random.Generator] = None
+) -> List[int]:
+    """
+    Eliminates the candidate with the fewest (transferred) votes until no candidate is left, and returns the
+    candidate indices in elimination order (so the winner is last).
+    Ties are broken by `rng` when it's given, and in favor of eliminating the lowest index otherwise.
+    """
+    transferable_ballots = _TransferableBallots(profile_arrays)
+    elimination_order = []
+    while transferable_ballots.running_candidates.size:
+        tallies = transferable_ballots.calc_running_tallies()
+        eliminated_candidate = _choose_tied(
+            transferable_ballots.running_candidates[tallies == tallies.min()], rng
+        )
+        transferable_ballots.remove_candidate(eliminated_candidate)
+        elimination_order.append(eliminated_candidate)
+    return elimination_order
+
+
+def calc_stv_winners(
+    profile_arrays: ProfileArrays, number_of_seats: int, rng: Optional[np.random.Generator] = None
+) -> List[int]:
+    """
+    Single transferable vote, counted like pyrankvote's `single_transferable_vote` (which `stv_rule` used to run):
+    * the Droop quota is the number of non-blank ballots divided by `number_of_seats + 1`,
+    * every running candidate that reaches the quota is elected in the same round, and their surpluses move on,
+    * otherwise, the trailing candidates that all together don't have more votes than the candidate before them are
+      rejected at once, and all their votes move on,
+    * the votes that a candidate passes on are shared evenly by the ballots of its pile, whatever they brought in.
+    The running candidates are ordered by their votes, and those within `PYRANKVOTE_CONSIDERED_EQUAL_MARGIN` of each
+    other by the ballots that rank them second among the running candidates (then third, and so on), and by `rng` (or
+    by their index) when that doesn't decide. Returns the winners' candidate indices in election order.
+    """
+    stv_count = _StvCount(profile_arrays, rng)
+    quota = stv_count.non_blank_ballots_count / (number_of_seats + 1)
+    winners = []
+    while True:
+        seats_left = number_of_seats - len(winners)
+        running_candidates = list(stv_count.running_candidates)
+        running_candidates_votes = [float(stv_count.votes[c]) for c in running_candidates]
+        remaining_votes = sum(running_candidates_votes)
+        previous_candidate_votes = 0.0
+        elected_candidates = []
+        rejected_candidates = []
+        for i, (candidate, candidate_votes) in enumerate(zip(running_candidates, running_candidates_votes)):
+            if candidate_votes - PYRANKVOTE_ROUNDING_ERROR >= quota:
+                elected_candidates.append(candidate)
+            elif i >= seats_left and remaining_votes - PYRANKVOTE_ROUNDING_ERROR <= previous_candidate_votes:
+                # the elected candidates' surpluses may still change who trails
+                if elected_candidates:
+                    break
+                rejected_candidates.append(candidate)
+            previous_candidate_votes = candidate_votes
+            remaining_votes -= candidate_votes
+
+        for candidate in [*elected_candidates, *rejected_candidates]:
+            stv_count.remove_candidate(candidate)
+        winners.extend(elected_candidates)
+        seats_left = number_of_seats - len(winners)
+        if len(stv_count.running_candidates) <= seats_left:
+            return winners + stv_count.running_candidates
+        if seats_left == 0:
+            return winners
+
+        for candidate in elected_candidates:
+            stv_count.transfer_votes(candidate, float(stv_count.votes[candidate]) - quota)
+        for candidate in rejected_candidates:
+            stv_count.transfer_votes(candidate, float(stv_count.votes[candidate]))
+
+
+class _StvCount:
+    """
+    The piles of the running candidates, as pyrankvote keeps them - every ballot is in the pile of its current
+    preference, and every candidate has a number of votes (which isn't split between the ballots of its pile). Only
+    the ballots of the pile that is passed on are touched when a candidate's votes are transferred.
+    """
+
+    def __init__(self, profile_arrays: ProfileArrays, rng: Optional[np.random.Generator]):
+        self._ballots = profile_arrays.ballots
+        self._frequencies = profile_arrays.frequencies
+        self._missing_value = profile_arrays.missing_value
+        self._number_candidates = profile_arrays.number_candidates
+        self._rng = rng
+        self._current_positions = np.zeros(len(self._ballots), dtype=np.int64)
+        self._current_preferences = self._ballots[:, 0].astype(np.int64) if self._ballots.shape[1] \
+            else np.full(len(self._ballots), self._missing_value, dtype=np.int64)
+        self._is_running = np.zeros(self._missing_value + 1, dtype=bool)
+        self._is_running[:self._number_candidates] = True
+
+        is_non_blank = self._current_preferences != self._missing_value
+        self.non_blank_ballots_count = int(self._frequencies[is_non_blank].sum())
+        self.votes = np.bincount(
+            self._current_preferences[is_non_blank], weights=self._frequencies[is_non_blank],
+            minlength=self._number_candidates
+        )
+        self._piles_sizes = self.votes.astype(np.int64)
+        self.running_candidates: List[int] = list(range(self._number_candidates))
+        self._sort_running_candidates()
+
+    def remove_candidate(self, candidate: int):
+        self._is_running[candidate] = False
+        self.running_candidates.remove(candidate)
+
+    def transfer_votes(self, candidate: int, transferred_votes: float):
+        if round(transferred_votes, PYRANKVOTE_TRANSFER_DECIMALS) == 0:
+            return
+        moving_ballots = np.flatnonzero(self._current_preferences == candidate)
+        ballot_votes = transferred_votes / self._piles_sizes[candidate]
+        self.votes[candidate] -= transferred_votes
+        self._piles_sizes[candidate] = 0
+
+        # advance each moving ballot to its next running preference (or exhaust it)
+        transferred_ballots = moving_ballots
+        while moving_ballots.size:
+            self._current_positions[moving_ballots] += 1
+            next_positions = self._current_positions[moving_ballots]
+            is_exhausted = next_positions >= self._ballots.shape[1]
+            next_preferences = np.full(len(moving_ballots), self._missing_value, dtype=np.int64)
+            next_preferences[~is_exhausted] = self._ballots[moving_ballots[~is_exhausted], next_positions[~is_exhausted]]
+            self._current_preferences[moving_ballots] = next_preferences
+
+            is_blocked = (next_preferences != self._missing_value) & ~self._is_running[next_preferences]
+            moving_ballots = moving_ballots[is_blocked]
+
+        preferences = self._current_preferences[transferred_ballots]
+        is_active = preferences != self._missing_value
+        active_frequencies = self._frequencies[transferred_ballots[is_active]]
+        self.votes += np.bincount(
+            preferences[is_active], weights=active_frequencies * ballot_votes, minlength=self._number_candidates
+        )
+        self._piles_sizes += np.bincount(
+            preferences[is_active], weights=active_frequencies, minlength=self._number_candidates
+        ).astype(np.int64)
+        self._sort_running_candidates()
+
+    def _sort_running_candidates(self):
+        # the later choices are only counted when there are candidates with (almost) equal votes
+        later_choices_counts = None
+
+        def compare_candidates(first_candidate: int, second_candidate: int) -> int:
+            nonlocal later_choices_counts
+            first_votes, second_votes = self.votes[first_candidate], self.votes[second_candidate]
+            if abs(first_votes - second_votes) >= PYRANKVOTE_CONSIDERED_EQUAL_MARGIN:
+                return -1 if first_votes > second_votes else 1
+            if later_choices_counts is None:
+                later_choices_counts = self._calc_running_choices_counts()
+            for first_count, second_count in zip(
+                later_choices_counts[1:, first_candidate], later_choices_counts[1:, second_candidate]
+            ):
+                if first_count != second_count:
+                    return -1 if first_count > second_count else 1
+            if self._rng is None:
+                return -1
+            return -1 if self._rng.random() < 0.5 else 1
+
+        self.running_candidates = sorted(self.running_candidates, key=cmp_to_key(compare_candidates))
+
+    def _calc_running_choices_counts(self) -> np.ndarray:
+        # counts[x, c] - the number of voters whose x-th (0-based) running candidate is c, over all the ballots
+        is_running_entry = self._is_running[self._ballots]
+        running_ranks = np.cumsum(is_running_entry, axis=1) - 1
+        rows, columns = np.nonzero(is_running_entry)
+        return np.bincount(
+            running_ranks[rows, columns] * self._number_candidates + self._ballots[rows, columns],
+            weights=self._frequencies[rows], minlength=self._number_candidates ** 2
+        ).reshape(self._number_candidates, self._number_candidates)
+
+
+class _TransferableBallots:
+    """
+    The aggregated ballots with a (fractional) weight and a pointer to the current preference of each of them,
+    so that removing a candidate only touches the ballots that currently point at it - both when advancing them and
+    when updating the tallies.
+    """
+
+    def __init__(self, profile_arrays: ProfileArrays):
+        self._ballots = profile_arrays.ballots
+        self._missing_value = profile_arrays.missing_value
+        self._number_candidates = profile_arrays.number_candidates
+        self._weights = profile_arrays.frequencies.astype(np.float64)
+        self._current_positions = np.zeros(len(self._ballots), dtype=np.int64)
+        self._current_preferences = self._ballots[:, 0].astype(np.int64) if self._ballots.shape[1] \
+            else np.full(len(self._ballots), self._missing_value, dtype=np.int64)
+        self._is_running = np.zeros(self._missing_value + 1, dtype=bool)
+        self._is_running[:self._number_candidates] = True
+        self._tallies = self._calc_tallies(np.arange(len(self._ballots)))
+
+    @property
+    def running_candidates(self) -> np.ndarray:
+        return np.flatnonzero(self._is_running)
+
+    def calc_running_tallies(self) -> np.ndarray:
+        return np.round(self._tallies[self.running_candidates], TALLIES_DECIMALS)
+
+    def remove_candidate(self, candidate: int, transferred_weight_ratio: float = 1.0):
+        self._is_running[candidate] = False
+        moving_ballots = np.flatnonzero(self._current_preferences == candidate)
+        transferred_ballots = moving_ballots
+        self._weights[moving_ballots] *= transferred_weight_ratio
+        self._tallies[candidate] = 0
+
+        # advance each moving ballot to its next running preference (or exhaust it)
+        while moving_ballots.size:
+            self._current_positions[moving_ballots] += 1
+            next_positions = self._current_positions[moving_ballots]
+            is_exhausted = next_positions >= self._ballots.shape[1]
+            next_preferences = np.full(len(moving_ballots), self._missing_value, dtype=np.int64)
+            next_preferences[~is_exhausted] = self._ballots[moving_ballots[~is_exhausted], next_positions[~is_exhausted]]
+            self._current_preferences[moving_ballots] = next_preferences
+
+            is_blocked = (next_preferences != self._missing_value) & ~self._is_running[next_preferences]
+            moving_ballots = moving_ballots[is_blocked]
+
+        self._tallies += self._calc_tallies(transferred_ballots)
+
+    def _calc_tallies(self, ballots_indices: np.ndarray) -> np.ndarray:
+        preferences = self._current_preferences[ballots_indices]
+        is_active = preferences != self._missing_value
+        return np.bincount(
+            preferences[is_active], weights=self._weights[ballots_indices[is_active]], minlength=self._number_candidates
+        )
+
+
+def _choose_tied(tied_candidates: np.ndarray, rng: Optional[np.random.Generator]) -> int:
+    if len(tied_candidates) == 1 or rng is None:
+        return int(tied_candidates[0])
+    return int(rng.choice(tied_candidates))
@@ -0,0 +1,289 @@
+from functools import partial
+from typing import Dict, List, Literal, Optional, Tuple
+
+import numpy as np
+from compsoc.profile import Profile
+from compsoc.voter_model import generate_distorted_from_normal_profile, get_profile_from_model
+from scipy import stats
+
+from utils.profile_arrays import ProfileArrays, get_profile_arrays
+from utils.random_utils import set_global_random_seed, spawn_rng
+
+VoterModelName = Literal['random', 'gaussian', 'multinomial_dirichlet']
+VoterModelsGenerator = Literal['compsoc', 'native']
+
+VOTER_MODEL_NAMES = ('random', 'gaussian', 'multinomial_dirichlet')
+# the native generators follow compsoc's models, which tests/test_voter_models.py checks by two-sample tests against
+# compsoc's own generators (run this module to see the p-values). compsoc's generators are kept as an opt-in
+DEFAULT_VOTER_MODELS_GENERATOR = 'native'
+# the models whose voters are drawn independently of each other - in the rest, the voters of a profile share its
+# candidates weights, so only statistics per profile (rather than per voter) are compared between two samples
+INDEPENDENT_VOTERS_VOTER_MODEL_NAMES = ('random', 'gaussian')
+# compsoc's gaussian generator's memory blows up beyond this many candidates (see reproduce_memory_leak.py)
+COMPSOC_GAUSSIAN_MAX_CANDIDATES_COUNT = 10
+# should be bumped on every change to the generated distributions, since stored profiles are keyed by it
+VOTER_MODELS_VERSION = 4
+GAUSSIAN_PERMUTATION_INDEX_MEAN = 0.5
+GAUSSIAN_PERMUTATION_INDEX_STD = 1 / 6
+# beyond this many possible leading-candidates prefixes, the gaussian density is flat enough to be uniform
+GAUSSIAN_DECODED_PREFIXES_MAX_COUNT = 2 ** 32
+MULTINOMIAL_DIRICHLET_ALPHA = 1.0
+# the voters of every profile are generated in chunks of about this many (voter, candidate) cells. It's fixed (rather
+# than derived from a memory cap), since the chunks are drawn one after the other from the profile's random stream
+VOTER_MODELS_GENERATION_CHUNK_CELLS_COUNT = 2 ** 20
+# an upper estimate of the temporary bytes that generating a single (voter, candidate) cell takes
+VOTER_MODELS_GENERATION_BYTES_PER_CELL = 48
+VOTER_MODELS_GENERATION_MAX_MEMORY_BYTES = \
+    VOTER_MODELS_GENERATION_CHUNK_CELLS_COUNT * VOTER_MODELS_GENERATION_BYTES_PER_CELL
+
+
+def generate_ballots_batch(
+    voters_model: VoterModelName,
+    number_voters: int,
+    number_candidates: int,
+    distortion_ratio: float,
+    iterations_count: int,
+    rng: Optional[np.random.Generator] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Generates the ballots of `iterations_count` independent profiles at once, following compsoc's voter models:
+    * 'random' - every voter ranks the candidates by a uniformly random permutation.
+    * 'gaussian' - the lexicographic index of every voter's permutation is normally distributed (as a fraction of
+      the number of permutations, with `GAUSSIAN_PERMUTATION_INDEX_MEAN` and `GAUSSIAN_PERMUTATION_INDEX_STD`).
+    * 'multinomial_dirichlet' - every profile draws candidates weights from a symmetric Dirichlet distribution, and
+      every voter draws candidates by those weights, without replacement.
+    The distortion follows compsoc's `generate_distorted_from_normal_profile`: with probability `distortion_ratio`,
+    a voter's ballot is truncated to its first k candidates, for a uniformly random k in 1..`number_candidates - 1`.
+    Every profile is drawn from a stream of its own (derived from a single draw of `rng`), in chunks of a fixed
+    number of voters, so the i-th profile is the same whatever `iterations_count` is, and the temporary arrays stay
+    within about `VOTER_MODELS_GENERATION_MAX_MEMORY_BYTES` - besides the returned arrays, memory grows linearly
+    with the number of voters and candidates.
+    Returns `ballots[i, v, p]` - the index of the candidate at position `p` of voter `v` in profile `i`, and
+    `ballot_lengths[i, v]` - the number of candidates that voter ranks.
+    """
+    if voters_model not in VOTER_MODEL_NAMES:
+        raise ValueError(f"unknown voters model: '{voters_model}'")
+    rng = rng if rng is not None else np.random.default_rng(np.random.randint(2 ** 32))
+
+    ballots = np.empty((iterations_count, number_voters, number_candidates), np.min_scalar_type(number_candidates))
+    ballot_lengths = np.empty((iterations_count, number_voters), np.int64)
+    chunk_voters_count = max(VOTER_MODELS_GENERATION_CHUNK_CELLS_COUNT // number_candidates, 1)
+    iterations_random_seed = int(rng.integers(2 ** 63))
+    for iteration in range(iterations_count):
+        iteration_rng = spawn_rng(iterations_random_seed, iteration)
+        if voters_model == 'random':
+            generate_chunk = _generate_random_ballots
+        elif voters_model == 'gaussian':
+            generate_chunk = _generate_gaussian_ballots
+        else:
+            candidates_weights = iteration_rng.dirichlet(np.full(number_candidates, MULTINOMIAL_DIRICHLET_ALPHA))
+            generate_chunk = partial(_generate_multinomial_dirichlet_ballots, candidates_weights=candidates_weights)
+        for chunk_start in range(0, number_voters, chunk_voters_count):
+            chunk_stop = min(chunk_start + chunk_voters_count, number_voters)
+            ballots[iteration, chunk_start:chunk_stop] = generate_chunk(
+                (chunk_stop - chunk_start, number_candidates), iteration_rng
+            )
+
+        is_distorted = iteration_rng.random(number_voters) < distortion_ratio
+        truncated_ballot_lengths = iteration_rng.integers(1, max(number_candidates, 2), size=number_voters)
+        ballot_lengths[iteration] = np.where(is_distorted, truncated_ballot_lengths, number_candidates)
+    return ballots, ballot_lengths
+
+
+def generate_profile_arrays_batch(
+    voters_model: VoterModelName,
+    number_voters: int,
+    number_candidates: int,
+    distortion_ratio: float,
+    iterations_count: int,
+    rng: Optional[np.random.Generator] = None
+) -> List[ProfileArrays]:
+    ballots, ballot_lengths = generate_ballots_batch(
+        voters_model, number_voters, number_candidates, distortion_ratio, iterations_count, rng
+    )
+    candidates = range(number_candidates)
+    return [
+        ProfileArrays.from_ballots(iteration_ballots, iteration_ballot_lengths, candidates)
+        for iteration_ballots, iteration_ballot_lengths in zip(ballots, ballot_lengths)
+    ]
+
+
+def generate_profile_arrays(
+    voters_model: VoterModelName,
+    number_voters: int,
+    number_candidates: int,
+    distortion_ratio: float,
+    voter_models_generator: VoterModelsGenerator = DEFAULT_VOTER_MODELS_GENERATOR,
+    rng: Optional[np.random.Generator] = None
+) -> ProfileArrays:
+    if voter_models_generator == 'compsoc':
+        return generate_compsoc_profile_arrays(voters_model, number_voters, number_candidates, distortion_ratio, rng)
+    return generate_profile_arrays_batch(
+        voters_model, number_voters, number_candidates, distortion_ratio, iterations_count=1, rng=rng
+    )[0]
+
+
+def generate_compsoc_profile_arrays(
+    voters_model: VoterModelName,
+    number_voters: int,
+    number_candidates: int,
+    distortion_ratio: float,
+    rng: Optional[np.random.Generator] = None
+) -> ProfileArrays:
+    validate_compsoc_voter_model(voters_model, number_candidates)
+    # compsoc's generators draw from the global random states (of `random` and `np.random`), which are seeded by
+    # `rng` when it's given
+    if rng is not None:
+        set_global_random_seed(int(rng.integers(2 ** 32)))
+    profile = get_profile_from_model(number_candidates, number_voters, voters_model=voters_model, verbose=False)
+    distorted_profile = generate_distorted_from_normal_profile(profile, distortion_ratio)
+    return ProfileArrays.from_pairs(distorted_profile.pairs, range(number_candidates))
+
+
+def validate_compsoc_voter_model(voters_model: VoterModelName, number_candidates: int):
+    if voters_model == 'gaussian' and number_candidates > COMPSOC_GAUSSIAN_MAX_CANDIDATES_COUNT:
+        raise ValueError(
+            f"compsoc's gaussian generator doesn't fit in memory beyond {COMPSOC_GAUSSIAN_MAX_CANDIDATES_COUNT} "
+            f"candidates (got {number_candidates}) - use the native generator instead"
+        )
+
+
+def generate_profiles_batch(
+    voters_model: VoterModelName,
+    number_voters: int,
+    number_candidates: int,
+    distortion_ratio: float,
+    iterations_count: int,
+    rng: Optional[np.random.Generator] = None
+) -> List[Profile]:
+    profiles_arrays = generate_profile_arrays_batch(
+        voters_model, number_voters, number_candidates, distortion_ratio, iterations_count, rng
+    )
+    return [
+        to_profile(profile_arrays, distorted=distortion_ratio > 0)
+        for profile_arrays in profiles_arrays
+    ]
+
+
+def to_profile(profile_arrays: ProfileArrays, distorted: bool) -> Profile:
+    # a compsoc view of the arrays - which are also served to the rules, instead of being rebuilt from the pairs
+    profile = Profile(
+        pairs=profile_arrays.to_pairs(), num_candidates=profile_arrays.number_candidates, distorted=distorted
+    )
+    get_profile_arrays.cache_set(profile_arrays, profile)
+    return profile
+
+
+def _generate_random_ballots(shape: Tuple[int, int], rng: np.random.Generator) -> np.ndarray:
+    return rng.random(shape).argsort(axis=1)
+
+
+def _generate_gaussian_ballots(shape: Tuple[int, int], rng: np.random.Generator) -> np.ndarray:
+    # the permutation index (as a fraction in [0, 1)) is decoded in the factorial number system. Only the leading
+    # candidates are decoded from it - deeper than that, the density of the index is flat, so the rest of the
+    # candidates follow in a uniformly random order
+    number_candidates = shape[1]
+    permutation_index_fractions = np.clip(
+        rng.normal(GAUSSIAN_PERMUTATION_INDEX_MEAN, GAUSSIAN_PERMUTATION_INDEX_STD, size=shape[0]),
+        0, np.nextafter(1, 0)
+    )
+    decoded_prefix_length = _calc_gaussian_decoded_prefix_length(number_candidates)
+
+    is_used = np.zeros(shape, dtype=bool)
+    ballots = np.empty(shape, dtype=np.int64)
+    for position in range(decoded_prefix_length):
+        radix = number_candidates - position
+        scaled_fractions = permutation_index_fractions * radix
+        digits = np.minimum(np.floor(scaled_fractions), radix - 1).astype(np.int64)
+        permutation_index_fractions = scaled_fractions - digits
+        # the digit-th unused candidate
+        candidates = (np.cumsum(~is_used, axis=1) > digits[:, None]).argmax(axis=1)
+        ballots[:, position] = candidates
+        np.put_along_axis(is_used, candidates[:, None], True, axis=1)
+
+    rest_keys = np.where(is_used, np.inf, rng.random(shape))
+    ballots[:, decoded_prefix_length:] = rest_keys.argsort(axis=1)[:, :number_candidates - decoded_prefix_length]
+    return ballots
+
+
+def _calc_gaussian_decoded_prefix_length(number_candidates: int) -> int:
+    prefixes_count = 1
+    for position in range(number_candidates):
+        prefixes_count *= number_candidates - position
+        if prefixes_count > GAUSSIAN_DECODED_PREFIXES_MAX_COUNT:
+            return position + 1
+    return number_candidates
+
+
+def _generate_multinomial_dirichlet_ballots(
+    shape: Tuple[int, int], rng: np.random.Generator, candidates_weights: np.ndarray
+) -> np.ndarray:
+    # drawing without replacement by weights is sorting by the (Gumbel-perturbed) log of the weights. Weights that
+    # underflow to zero are clipped, so such candidates are ranked last (in a random order) rather than failing
+    log_weights = np.log(np.maximum(candidates_weights, np.finfo(np.float64).tiny))
+    keys = log_weights + rng.gumbel(size=shape)
+    return (-keys).argsort(axis=1)
+
+
+def calc_voter_models_two_sample_p_values(
+    voters_model: VoterModelName,
+    first_profiles_arrays: List[ProfileArrays],
+    second_profiles_arrays: List[ProfileArrays]
+) -> Dict[str, float]:
+    """
+    Tests of whether two samples of profiles of `voters_model` (e.g. of compsoc's generator and of the native one)
+    have the same distribution of:
+    * ballot lengths, of first choices, and of the position of the first candidate (with its absence as a position
+      of its own) - by chi-squared tests, where every voter is a single observation. The first choices and positions
+      are only tested for models in `INDEPENDENT_VOTERS_VOTER_MODEL_NAMES`.
+    * the share of the most common first choice - by a Kolmogorov-Smirnov test, where every profile is a single
+      observation.
+    """
+    number_candidates = first_profiles_arrays[0].number_candidates
+    statistic_name_to_calc_counts = {
+        'ballot_length': lambda profile_arrays: np.bincount(
+            profile_arrays.ballot_lengths.astype(np.int64), weights=profile_arrays.frequencies,
+            minlength=number_candidates + 1
+        ),
+    }
+    if voters_model in INDEPENDENT_VOTERS_VOTER_MODEL_NAMES:
+        statistic_name_to_calc_counts['first_choice'] = lambda profile_arrays: profile_arrays.position_counts[:, 0]
+        statistic_name_to_calc_counts['first_candidate_position'] = lambda profile_arrays: np.bincount(
+            np.where(profile_arrays.present_mask[:, 0], profile_arrays.positions[:, 0], number_candidates),
+            weights=profile_arrays.frequencies, minlength=number_candidates + 1
+        )
+    statistic_name_to_p_value = {}
+    for statistic_name, calc_counts in statistic_name_to_calc_counts.items():
+        contingency_table = np.array([
+            np.sum([calc_counts(profile_arrays) for profile_arrays in profiles_arrays], axis=0)
+            for profiles_arrays in (first_profiles_arrays, second_profiles_arrays)
+        ])
+        contingency_table = contingency_table[:, contingency_table.sum(axis=0) > 0]
+        # a statistic that takes a single value (e.g. the ballot length without distortion) in both samples
+        statistic_name_to_p_value[statistic_name] = 1.0 if contingency_table.shape[1] < 2 \
+            else float(stats.chi2_contingency(contingency_table)[1])
+
+    top_first_choice_shares = [
+        [
+            profile_arrays.position_counts[:, 0].max() / profile_arrays.number_voters
+            for profile_arrays in profiles_arrays
+        ]
+        for profiles_arrays in (first_profiles_arrays, second_profiles_arrays)
+    ]
+    statistic_name_to_p_value['top_first_choice_share'] = float(stats.ks_2samp(*top_first_choice_shares).pvalue)
+    return statistic_name_to_p_value
+
+
+if __name__ == '__main__':
+    # the p-values of every native generator against compsoc's
+    for voters_model in VOTER_MODEL_NAMES:
+        for distortion_ratio in (0, 0.5, 0.9):
+            rng = np.random.default_rng(42)
+            compsoc_profiles_arrays = [
+                generate_compsoc_profile_arrays(voters_model, 200, 8, distortion_ratio, rng) for _ in range(200)
+            ]
+            native_profiles_arrays = generate_profile_arrays_batch(voters_model, 200, 8, distortion_ratio, 200, rng)
+            statistic_name_to_p_value = calc_voter_models_two_sample_p_values(
+                voters_model, compsoc_profiles_arrays, native_profiles_arrays
+            )
+            print(f"{voters_model} (distortion_ratio={distortion_ratio}): {statistic_name_to_p_value}")